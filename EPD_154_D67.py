@@ -3,8 +3,12 @@ MicroPython 1.54" Black/White GDEY0154D67 e-paper display driver
 https://www.good-display.com/product/388.html
 """
 from micropython import const
-from time import sleep_ms
 import ustruct
+from epd_core import EPDCore, Stream, compile_sequence, SEQ_WAIT, FILL_CHUNK
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
 
 # Display resolution
 EPD_WIDTH  = const(200)
@@ -37,40 +41,175 @@ SET_RAM_Y_ADDRESS_START_END_POSITION = const(0x45)
 SET_RAM_X_ADDRESS_COUNTER            = const(0x4E)
 SET_RAM_Y_ADDRESS_COUNTER            = const(0x4F)
 TERMINATE_FRAME_READ_WRITE           = const(0xFF) # aka NOOP
-BUSY = const(1)  # 1=busy, 0=idle
 NORMAL                             = const(0x1)
 INVERTED                           = const(0x2)
 UPDATE_FULL                        = const(0x0)
 UPDATE_PART                        = const(0x1)
 UPDATE_FAST                        = const(0x2)
+UPDATE_DIFF                        = const(0x3)
+# areas of BW RAM queued to be copied to RED RAM after a refresh
+OLD_SLOTS                          = const(8)
+# partial window cost model, in bytes worth of SPI and python overhead
+WINDOW_COST                        = const(24) # setting up a RAM window
+ROW_COST                           = const(2)  # each row of a window narrower than the panel
+MERGE_GAP                          = const(8)  # areas closer than this are always merged
+
+# cost of writing an (x, y, w, h) area through its own RAM window
+def area_cost(area, width=EPD_WIDTH):
+    x, y, w, h = area
+    cost = WINDOW_COST + h * (w // 8)
+    if w < width:
+        cost += h * ROW_COST
+    return cost
+
+# bounding box of two (x, y, w, h) areas
+def union_area(a, b):
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    return x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y
+
+def _near(a, b, gap):
+    return (a[0] <= b[0] + b[2] + gap and b[0] <= a[0] + a[2] + gap and
+            a[1] <= b[1] + b[3] + gap and b[1] <= a[1] + a[3] + gap)
+
+# merge overlapping, nearly adjacent or cheaper-together areas, then use the
+# bounding box instead if a single window costs less than the merged list
+def plan_areas(areas, width=EPD_WIDTH, gap=MERGE_GAP):
+    areas = list(areas)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(areas)):
+            for j in range(i + 1, len(areas)):
+                a = areas[i]
+                b = areas[j]
+                u = union_area(a, b)
+                if _near(a, b, gap) or area_cost(u, width) <= area_cost(a, width) + area_cost(b, width):
+                    areas[i] = u
+                    areas.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+    if len(areas) > 1:
+        box = areas[0]
+        cost = 0
+        for a in areas:
+            box = union_area(box, a)
+            cost += area_cost(a, width)
+        if area_cost(box, width) <= cost:
+            return [box]
+    return areas
+
+_SEQ_INIT_FULL = compile_sequence(
+    (SW_RESET, b'', SEQ_WAIT | 100),
+    (DISPLAY_UPDATE_CONTROL_2, b'\xE0', 0), # power on
+    (MASTER_ACTIVATION, b'', SEQ_WAIT | 100),
+    (DRIVER_OUTPUT_CONTROL, b'\xC7\x00\x00', 0),
+    (DATA_ENTRY_MODE_SETTING, b'\x01', 0),
+    (SET_RAM_X_ADDRESS_START_END_POSITION, b'\x00\x24', 0),
+    (SET_RAM_Y_ADDRESS_START_END_POSITION, b'\x00\x00\xC7\x00', 0),
+    (BORDER_WAVEFORM_CONTROL, b'\x05', 0),
+    (READ_TEMPERATURE_SENSOR, b'\x80', 0),
+    (SET_RAM_X_ADDRESS_COUNTER, b'\x00', 0),
+    (SET_RAM_Y_ADDRESS_COUNTER, b'\xC7\x00', 0),
+    (DATA_ENTRY_MODE_SETTING, b'\x03', 0),
+)
+
+_SEQ_INIT_PART = compile_sequence(
+    (SW_RESET, b'', SEQ_WAIT | 10),
+    (DISPLAY_UPDATE_CONTROL_2, b'\xE0', 0), # power on
+    (MASTER_ACTIVATION, b'', SEQ_WAIT | 100),
+    (DRIVER_OUTPUT_CONTROL, b'\xC7\x00\x00', 0),
+    (DATA_ENTRY_MODE_SETTING, b'\x01', 0),
+    (BORDER_WAVEFORM_CONTROL, b'\x05', 0),
+    (READ_TEMPERATURE_SENSOR, b'\x80', 0),
+    (DATA_ENTRY_MODE_SETTING, b'\x03', 0),
+)
+
+_SEQ_INIT_FAST = compile_sequence(
+    (SW_RESET, b'', SEQ_WAIT | 60),
+    (DISPLAY_UPDATE_CONTROL_2, b'\xE0', 0), # power on
+    (MASTER_ACTIVATION, b'', SEQ_WAIT | 100),
+    (READ_TEMPERATURE_SENSOR, b'\x80', 0),
+    (DISPLAY_UPDATE_CONTROL_2, b'\xB1', 0),
+    (MASTER_ACTIVATION, b'', SEQ_WAIT | 50),
+    (TEMPERATURE_SENSOR_CONTROL, b'\x5A\x00', 0),
+    (DISPLAY_UPDATE_CONTROL_2, b'\x91', 0),
+    (MASTER_ACTIVATION, b'', SEQ_WAIT | 50),
+    (DATA_ENTRY_MODE_SETTING, b'\x03', 0),
+)
+
+_SEQ_SLEEP = compile_sequence((DEEP_SLEEP_MODE, b'\x03', 0))
+_SEQ_SLEEP_RETAIN = compile_sequence((DEEP_SLEEP_MODE, b'\x01', 0))
+
+class EPD(EPDCore):
+    # controller profile, see epd_core. Without a busy pin refreshes are
+    # waited for 2200 ms (full), 1100 ms (fast) and 300 ms (partial), with
+    # one every wait lasts for as long as the panel is busy, up to
+    # busy_timeout
+    busy_level = 1
+    busy_timeout = 10000
+    reset_ms = (200, 20)
+    seq_power_on = compile_sequence((DISPLAY_UPDATE_CONTROL_2, b'\xE0', 0), (MASTER_ACTIVATION, b'', 0))
+    seq_power_off = compile_sequence((DISPLAY_UPDATE_CONTROL_2, b'\x83', 0), (MASTER_ACTIVATION, b'', 0))
+    power_ms = (100, 150)
+    seq_sleep = _SEQ_SLEEP
+
+    # update modes this driver supports
+    update_modes = (UPDATE_FULL, UPDATE_PART, UPDATE_FAST, UPDATE_DIFF)
+    # set_frame_memory only writes RAM, display_frame refreshes
+    refresh_on_write = False
 
-class EPD:
     def __init__(self, spi, cs = None, dc = None, rst= None, busy=None, refresh= UPDATE_FULL, orientation= NORMAL):
-        self.spi = spi
-        self.cs = cs
-        self.dc = dc
-        self.rst = rst
-        self.busy = busy
-        if cs:
-            self.cs.init(self.cs.OUT, value=0)
-        self.dc.init(self.dc.OUT, value=0)
-        self.rst.init(self.rst.OUT, value=1)
-        if busy:
-            self.busy.init(self.busy.IN)
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
+        EPDCore.__init__(self, spi, cs, dc, rst, busy)
+        # preallocated RAM window buffer, so that setting up a window and
+        # writing RAM does not allocate
+        self._win = bytearray(4)
+        self._win1 = memoryview(self._win)[:1]
+        self._win2 = memoryview(self._win)[:2]
+        # data entry mode and buffer of bytes rotated on the way to RAM
+        self._entry = bytearray(b'\x03')
+        self._rot_buf = bytearray(FILL_CHUNK)
+        self._fx = 0
+        self._fy = 0
         self._init_display_done = False
-        self._hibernating = True
-        self._power_is_on = False
+        # RED RAM does not hold the displayed image yet, partial refreshes
+        # are full ones until a refresh puts it there
         self._initial_refresh = True
-        self._part_update_counter = 0
+        self._shadow = None
+        # CRC32 of the full frame in BW RAM, None if unknown. RAM keeps it
+        # through resets and hibernate(retain=True), so the same frame is not
+        # sent again; apps sleeping the MCU can save it and set it back
+        self.ram_crc = None
+        # keep a copy of the frame in RAM in full update mode, so that a
+        # changed frame only sends the changed areas, costs 5000 bytes
+        self.keep_frame = False
+        self._dirty = []
+        self._refresh_area = None
+        # areas written to BW RAM since the last refresh, copied to RED RAM
+        # after it so RED RAM holds the displayed image, the old image
+        # partial updates compare against. Preallocated slots of x, y, w, h,
+        # image, i, stride, bw, rows so that queueing does not allocate
+        self._old = [[0, 0, 0, 0, None, 0, 0, 0, 0] for _ in range(OLD_SLOTS)]
+        self._old_n = 0
+        # too many areas to queue, RED RAM is lost until a full frame write
+        self._old_lost = False
+        # copy the written areas to RED RAM after each refresh, set by the
+        # first partial update or partial update mode. Full and fast
+        # refreshes do not read RED RAM, so until then the copy is skipped
+        # and the first partial refresh runs as a full one
+        self.keep_old = False
+        # x, y, w, h of the last image window
+        self._area = [0, 0, 0, 0]
         self.init = self.init_full
         self.set_frame_memory = self.set_frame_memory_full
         self.display_frame = self.display_frame_full
         self.update_mode = refresh
         self.set_update_mode(refresh)
         self.set_ram_area = self.set_ram_area_normal
-        self.orientation = NORMAL
+        if orientation != NORMAL:
+            self.set_orientation(orientation)
 
     def set_update_mode(self, mode):
         if mode == UPDATE_FULL:
@@ -78,6 +217,7 @@ class EPD:
             self.set_frame_memory = self.set_frame_memory_full
             self.display_frame = self.display_frame_full
         elif mode == UPDATE_PART:
+            self.keep_old = True
             self.init = self.init_part
             self.set_frame_memory = self.set_frame_memory_part
             self.display_frame = self.display_frame_part
@@ -85,179 +225,466 @@ class EPD:
             self.init = self.init_fast
             self.set_frame_memory = self.set_frame_memory_fast
             self.display_frame = self.display_frame_fast
+        elif mode == UPDATE_DIFF:
+            self.keep_old = True
+            self.init = self.init_part
+            self.set_frame_memory = self.set_frame_memory_diff
+            self.display_frame = self.display_frame_diff
+            if self.update_mode != UPDATE_DIFF:
+                self._shadow = None
+        self.update_mode = mode
             
-    def set_orientation(self, ori):
-        if ori == NORMAL:
+    # rotate the display 0, 90, 180 or 270 degrees clockwise, optionally
+    # mirrored left to right. The controller data entry mode and RAM window
+    # place the bytes, mirroring reverses the bits of each byte and 90 and
+    # 270 degrees transpose 8x8 pixel blocks on the way to RAM, so x, y, w
+    # and h of the image must then be multiples of 8
+    def set_rotation(self, rotation, mirror=False):
+        swap, fx, fy = self._set_view(rotation, mirror)
+        self._fx = fx
+        self._fy = fy
+        self._entry[0] = (0 if fx else 1) | (0 if fy else 2) | (4 if swap else 0)
+        self._use_rotate(swap or fx)
+        if not (swap or fx or fy):
             self.set_ram_area = self.set_ram_area_normal
-        else:
+        elif not swap and fx and fy:
             self.set_ram_area = self.set_ram_area_inverted
-        self.orientation = ori
-        
-    def _command(self, command, data=None):
-        if self.dc:
-            self.dc(0)
-        if self.cs:
-            self.cs(0)
-        self.spi.write(bytearray([command]))
-        if self.cs:
-            self.cs(1)
-        if data is not None:
-            self._data(data)
-
-    def _data(self, data):
-        if self.dc:
-            self.dc(1)
-        if self.cs:
-            self.cs(0)
-        self.spi.write(data)
-        if self.cs:
-            self.cs(1)
+        else:
+            self.set_ram_area = self.set_ram_area_rotated
+        self._shadow = None
+        self.ram_crc = None
+        if self._old_n:
+            self._forget_old()
 
-    def wait_until_idle(self, t= 2200):
-        while  t > 0:
-            if self.busy:
-                if self.busy.value() != BUSY:
-                    return
-            sleep_ms(50)
-            t = t - 50
-
-    def reset(self):
-        self.rst(0)
-        sleep_ms(200)
-        self.rst(1)
-        sleep_ms(20)
-       
     #Normal refresh initialization
     def init_full(self):
+        if self._init_mode == UPDATE_FULL:
+            return
         self.reset()
-        sleep_ms(10)
-        self._command(SW_RESET)
-        sleep_ms(100)
-        self.power_on()
-        self._command(DRIVER_OUTPUT_CONTROL,  b'\xC7\x00\x00')
-        self._command(DATA_ENTRY_MODE_SETTING,  b'\x01')
-        self._command(SET_RAM_X_ADDRESS_START_END_POSITION,  b'\x00\x24')
-        self._command(SET_RAM_Y_ADDRESS_START_END_POSITION,  b'\x00\x00\xC7\x00')
-        self._command(BORDER_WAVEFORM_CONTROL,  b'\x05')
-        self._command(READ_TEMPERATURE_SENSOR,  b'\x80')
-        self._command(SET_RAM_X_ADDRESS_COUNTER,  b'\x00')
-        self._command(SET_RAM_Y_ADDRESS_COUNTER,  b'\xC7\x00')
-        self._command(DATA_ENTRY_MODE_SETTING, b'\x03')
+        self._run_sequence(_SEQ_INIT_FULL)
+        self._power_is_on = True
         self._init_display_done = True
-        
+        self._init_mode = UPDATE_FULL
+
     #partial refresh initialization
     def init_part(self):
         if self._init_display_done:
+            # the next partial refresh loads its own waveform, a fast one
+            # loaded by init_fast is gone after it
+            self._init_mode = UPDATE_PART
             return
         self.reset()
-        sleep_ms(10)
-        self._command(SW_RESET)
-        sleep_ms(10)
-        self.power_on()
-        self._command(DRIVER_OUTPUT_CONTROL,  b'\xC7\x00\x00')
-        self._command(DATA_ENTRY_MODE_SETTING,  b'\x01')
-        self._command(BORDER_WAVEFORM_CONTROL,  b'\x05')
-        self._command(READ_TEMPERATURE_SENSOR,  b'\x80')
-        #self.set_ram_area(0, 0, EPD_WIDTH, EPD_HEIGHT)
-        self._command(DATA_ENTRY_MODE_SETTING, b'\x03')
+        self._run_sequence(_SEQ_INIT_PART)
+        self._power_is_on = True
         self._init_display_done = True
+        self._init_mode = UPDATE_PART
+
+    # full and partial refreshes load their waveform from OTP and replace
+    # the one init_fast loaded, the next fast update initialises again
+    def _drop_fast_lut(self):
+        if self._init_mode == UPDATE_FAST:
+            self._init_mode = None
 
     #Fast refresh initialization
     def init_fast(self):
+        if self._init_mode == UPDATE_FAST:
+            return
         self.reset()
-        sleep_ms(10)
-        self._command(SW_RESET)
-        sleep_ms(10)
-        self.wait_until_idle(50)
-        self.power_on()
-        self._command(READ_TEMPERATURE_SENSOR,  b'\x80')
-        self._command(DISPLAY_UPDATE_CONTROL_2,  b'\xB1')
-        self._command(MASTER_ACTIVATION)
-        self.wait_until_idle(50)
-        self._command(TEMPERATURE_SENSOR_CONTROL,  b'\x5A\x00')
-        self._command(DISPLAY_UPDATE_CONTROL_2,  b'\x91')
-        self._command(MASTER_ACTIVATION)
-        self.wait_until_idle(50)
-        self._command(DATA_ENTRY_MODE_SETTING, b'\x03')
+        self._run_sequence(_SEQ_INIT_FAST)
+        self._power_is_on = True
         self._init_display_done = True
-    
+        self._init_mode = UPDATE_FAST
+
     def set_ram_area_normal(self, x, y, w, h):
-        self._command(DATA_ENTRY_MODE_SETTING, b'\x03')
-        self._command(SET_RAM_X_ADDRESS_START_END_POSITION)
-        self._data(bytes([x // 8]))
-        self._data(bytes([(x + w - 1) // 8]))
-        self._command(SET_RAM_Y_ADDRESS_START_END_POSITION)
-        self._data(bytes([int(y % 256),0]))
-        self._data(bytes([int((y + h - 1) % 256),0]))
-        self._command(SET_RAM_X_ADDRESS_COUNTER)
-        self._data(bytes([x // 8]))
-        self._command(SET_RAM_Y_ADDRESS_COUNTER)
-        self._data(bytes([int(y % 256),0]))
-        
+        self._set_window(b'\x03', x // 8, (x + w - 1) // 8, y, y + h - 1)
+
     def set_ram_area_inverted(self, x, y, w, h):
-        self._command(DATA_ENTRY_MODE_SETTING, b'\x00')
-        self._command(SET_RAM_X_ADDRESS_START_END_POSITION)
-        self._data(bytes([MAX_X - (x // 8)]))
-        self._data(bytes([MAX_X - ((x + w - 1) // 8)]))
-        self._command(SET_RAM_Y_ADDRESS_START_END_POSITION)
-        self._data(bytes([MAX_Y - (int(y % 256)),0]))
-        self._data(bytes([MAX_Y - (int((y + h - 1) % 256)),0]))
-        self._command(SET_RAM_X_ADDRESS_COUNTER)
-        self._data(bytes([MAX_X - (x // 8)]))
-        self._command(SET_RAM_Y_ADDRESS_COUNTER)
-        self._data(bytes([MAX_Y - (int(y % 256)),0]))
-
-    def calc_coords(self, x, y, w, h):
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
+        self._set_window(b'\x00', MAX_X - (x // 8), MAX_X - ((x + w - 1) // 8), MAX_Y - y, MAX_Y - (y + h - 1))
+
+    # RAM window of an area in display coordinates for any rotation, the
+    # window starts where the data entry mode starts counting
+    def set_ram_area_rotated(self, x, y, w, h):
+        if self._swap:
+            x, y, w, h = y, x, h, w
+        xs = x // 8
+        xe = (x + w - 1) // 8
+        ys = y
+        ye = y + h - 1
+        if self._fx:
+            xs = MAX_X - xs
+            xe = MAX_X - xe
+        if self._fy:
+            ys = MAX_Y - ys
+            ye = MAX_Y - ye
+        self._set_window(self._entry, xs, xe, ys, ye)
+
+    # set data entry mode, RAM window and address counters to the window
+    # start, from the preallocated window buffer
+    def _set_window(self, mode, xs, xe, ys, ye):
+        win = self._win
+        self._command(DATA_ENTRY_MODE_SETTING, mode)
+        win[0] = xs
+        win[1] = xe
+        self._command(SET_RAM_X_ADDRESS_START_END_POSITION, self._win2)
+        win[0] = ys & 0xFF
+        win[1] = ys >> 8
+        win[2] = ye & 0xFF
+        win[3] = ye >> 8
+        self._command(SET_RAM_Y_ADDRESS_START_END_POSITION, win)
+        win[0] = xs
+        self._command(SET_RAM_X_ADDRESS_COUNTER, self._win1)
+        win[0] = ys & 0xFF
+        win[1] = ys >> 8
+        self._command(SET_RAM_Y_ADDRESS_COUNTER, self._win2)
+
+    # set the RAM window for an image placed at x, y, clipped to the panel
+    def _set_image_area(self, x, y, w, h):
         x = x & 0xF8
-        w = w & 0xF8
-        if (x + w >= self.width):
-            x_end = self.width - 1
-        else:
-            x_end = x + w - 1
-        if (y + h >= self.height):
-            y_end = self.height - 1
-        else:
-            y_end = y + h - 1
-        return x, y, x_end, y_end
-        
-    # put an image in the frame memory
+        if self._swap:
+            y = y & 0xF8
+        if x + w > self.width:
+            w = self.width - x
+        if y + h > self.height:
+            h = self.height - y
+        area = self._area
+        area[0] = x
+        area[1] = y
+        area[2] = w
+        area[3] = h
+        self.set_ram_area(x, y, w, h)
+
+    # put an image in the frame memory, a full frame already in RAM is not
+    # sent again and with keep_frame only its changed areas are
     def set_frame_memory_full(self, image, x, y, w, h):
         self.init()
-        x, y, x_end, y_end = self.calc_coords(x, y, w, h)
-        self.set_ram_area(x, y, x_end, y_end)
-        self._command(WRITE_RAM, image)
+        if crc32 is None or w < self.width or h < self.height or isinstance(image, Stream):
+            self._set_image_area(x, y, w, h)
+            self._command(WRITE_RAM)
+            self._write_image(image, w, h)
+            return
+        crc = crc32(image)
+        if crc == self.ram_crc:
+            return
+        shadow = self._shadow
+        if shadow is not None:
+            queued = self._dirty
+            self._dirty = []
+            for area in self.diff_rects(image):
+                self.add_dirty(*area)
+            for area in plan_areas(self._dirty, self.width):
+                self.write_area(image, *area)
+            self._dirty = queued
+            shadow[:] = image
+        else:
+            self._set_image_area(x, y, w, h)
+            self._command(WRITE_RAM)
+            self._write_image(image, w, h)
+            if self.keep_frame:
+                self._shadow = bytearray(image)
+        self.ram_crc = crc
 
     # put an image in the frame memory
     def set_frame_memory_part(self, image, x, y, w, h):
         self.init()
-        x, y, x_end, y_end = self.calc_coords(x, y, w, h)
         self._command(BORDER_WAVEFORM_CONTROL, b'\x80')
-        self.set_ram_area(x, y, x_end, y_end)
-        self._command(WRITE_RAM, image)
+        self._set_image_area(x, y, w, h)
+        self._command(WRITE_RAM)
+        self._write_image(image, w, h)
         
     # put an image in the frame memory
     def set_frame_memory_fast(self, image, x, y, w, h):
         self.init()
-        x, y, x_end, y_end = self.calc_coords(x, y, w, h)
-        self.set_ram_area(x, y, x_end, y_end)
-        self._command(WRITE_RAM, image)
-        self._command(WRITE_RED_RAM)
-        for i in range(len(image)):
-            self._data('\x00')
-
-    # replace the frame memory with the specified color
+        self._set_image_area(x, y, w, h)
+        self._command(WRITE_RAM)
+        self._write_image(image, w, h)
+
+    # put only the parts of a full frame image that changed since the last
+    # call in the frame memory, the first call after a mode or orientation
+    # change sends the whole frame. A partial window is written whole and
+    # patched into the kept frame; a stream, or a window off byte
+    # boundaries, drops it and the next full frame is sent whole
+    def set_frame_memory_diff(self, image, x, y, w, h):
+        if w < self.width or h < self.height or isinstance(image, Stream):
+            shadow = self._shadow
+            self.set_frame_memory_part(image, x, y, w, h)
+            if (shadow is not None and not isinstance(image, Stream) and not (x | w) & 7
+                    and not (self._swap and (y | h) & 7)
+                    and x + w <= self.width and y + h <= self.height):
+                stride = self.width // 8
+                bw = w // 8
+                i = y * stride + x // 8
+                mv = memoryview(image)
+                for j in range(0, bw * h, bw):
+                    shadow[i:i + bw] = mv[j:j + bw]
+                    i += stride
+                self._shadow = shadow
+            box = self._refresh_area
+            self._refresh_area = (x, y, w, h) if box is None else union_area(box, (x, y, w, h))
+            return
+        if self._shadow is None:
+            self._shadow = bytearray(image)
+            self.add_dirty(0, 0, self.width, self.height)
+        else:
+            for area in self.diff_rects(image):
+                self.add_dirty(*area)
+        self.write_dirty(image)
+
+    # find each band of consecutive changed rows of a full frame image against
+    # the shadow frame, returns a list of (x, y, w, h)
+    def diff_rects(self, image):
+        shadow = self._shadow
+        stride = self.width // 8
+        rects = []
+        top = -1
+        for y in range(self.height):
+            i = y * stride
+            if image[i:i + stride] != shadow[i:i + stride]:
+                if top < 0:
+                    top = y
+            elif top >= 0:
+                rects.append(self._diff_columns(image, top, y))
+                top = -1
+        if top >= 0:
+            rects.append(self._diff_columns(image, top, self.height))
+        return rects
+
+    def _diff_columns(self, image, top, bottom):
+        shadow = self._shadow
+        stride = self.width // 8
+        left = stride
+        right = 0
+        for i in range(top * stride, bottom * stride, stride):
+            for c in range(left):
+                if image[i + c] != shadow[i + c]:
+                    left = c
+                    break
+            for c in range(stride - 1, right - 1, -1):
+                if image[i + c] != shadow[i + c]:
+                    right = c + 1
+                    break
+        return left * 8, top, (right - left) * 8, bottom - top
+
+    # queue a changed area of the frame for the next write_dirty / flush,
+    # x and w are widened to byte boundaries, y and h too when rotated by
+    # 90 or 270 degrees
+    def add_dirty(self, x, y, w, h):
+        x_end = min(x + w, self.width)
+        y_end = min(y + h, self.height)
+        x = max(x, 0) & 0xF8
+        y = max(y, 0)
+        x_end = (x_end + 7) & 0xF8
+        if self._swap:
+            # rotated by 90 or 270 degrees rows go in blocks of 8 too
+            y = y & 0xF8
+            y_end = min((y_end + 7) & 0xF8, self.height)
+        if x_end > x and y_end > y:
+            self._dirty.append((x, y, x_end - x, y_end - y))
+
+    # write the queued areas of a full frame image to the frame memory,
+    # merged into as few windows as plan_areas finds worthwhile
+    def write_dirty(self, image):
+        areas = plan_areas(self._dirty, self.width)
+        self._dirty = []
+        if not areas:
+            return
+        self.init_part()
+        self._command(BORDER_WAVEFORM_CONTROL, b'\x80')
+        box = self._refresh_area
+        for area in areas:
+            self.write_area(image, *area)
+            if self._shadow is not None and self._shadow is not image:
+                self._copy_area(self._shadow, image, *area)
+            box = area if box is None else union_area(box, area)
+        self._refresh_area = box
+
+    # write the queued areas of a full frame image and show them with a
+    # single partial refresh
+    def flush(self, image):
+        self.write_dirty(image)
+        self.display_frame_diff()
+
+    # like flush, yielding to other uasyncio tasks while the panel refreshes
+    async def flush_async(self, image):
+        self.write_dirty(image)
+        await self.display_frame_async(UPDATE_DIFF)
+
+    # write the (x, y, w, h) area of a full frame image to the frame memory
+    # x and w must be multiples of 8
+    def write_area(self, image, x, y, w, h):
+        self.ram_crc = None
+        stride = self.width // 8
+        i = y * stride + x // 8
+        self.set_ram_area(x, y, w, h)
+        self._command(WRITE_RAM)
+        self._send_area(image, i, stride, w // 8, h)
+        self._keep_old(x, y, w, h, image, i, stride, w // 8, h)
+
+    # put an image read from a stream in the frame memory like
+    # set_frame_memory, see Stream for the sources. The image goes to RAM in
+    # bands of 8 rows and is never held whole in memory; in UPDATE_DIFF mode
+    # it is written and refreshed as a partial window
+    def set_frame_memory_stream(self, source, x, y, w, h):
+        self.set_frame_memory(Stream(source), x, y, w, h)
+
+    # send a w x h pixels image, or a Stream of one, as RAM data, returns
+    # the bytes sent. RAM no longer holds a known frame afterwards
+    def _write_image(self, image, w, h):
+        self.ram_crc = None
+        self._shadow = None
+        area = self._area
+        self._keep_old(area[0], area[1], area[2], area[3], image, 0, w // 8, w // 8, h)
+        if isinstance(image, Stream):
+            return self._stream_image(image.open(), w, h)
+        if self._rotate is None:
+            self._data(image)
+            return len(image)
+        self._send_area(image, 0, w // 8, w // 8, h)
+        return w // 8 * h
+
+    # bands of a streamed image go through the rotation too
+    def _send_band(self, band, bw, rows):
+        self._send_area(band, 0, bw, bw, rows)
+
+    # send the area of bw bytes by h rows starting at image[i], with rows
+    # stride bytes apart, as RAM data under one chip select. Mirrored
+    # rows are bit reversed and rotated ones transposed in 8x8 blocks
+    # through the rotation buffer
+    def _send_area(self, image, i, stride, bw, h):
+        mv = memoryview(image)
+        if self._rotate is None and bw == stride:
+            self._data(mv[i:i + h * stride])
+            return
+        spi = self.spi
+        if self.dc:
+            self.dc(1)
+        if self.cs:
+            self.cs(0)
+        if self._rotate is None:
+            for row in range(i, i + h * stride, stride):
+                spi.write(mv[row:row + bw])
+        else:
+            buf = self._rot_buf
+            n = 0
+            if self._swap:
+                transpose8 = self._rotate.transpose8
+                msb = not self._fx
+                for k in range(i, i + (h // 8) * 8 * stride, 8 * stride):
+                    for c in range(k, k + bw):
+                        transpose8(mv, c, stride, buf, n, 1, msb)
+                        n += 8
+                        if n == FILL_CHUNK:
+                            spi.write(buf)
+                            n = 0
+            else:
+                rev = self._rotate.REVERSE
+                for row in range(i, i + h * stride, stride):
+                    for c in range(row, row + bw):
+                        buf[n] = rev[mv[c]]
+                        n += 1
+                        if n == FILL_CHUNK:
+                            spi.write(buf)
+                            n = 0
+            if n:
+                spi.write(memoryview(buf)[:n])
+        if self.cs:
+            self.cs(1)
+
+    # queue an area of BW RAM, sent as bw bytes by h rows of image from
+    # image[i] or filled with the value i when image is None, to be written
+    # to RED RAM after the next refresh. A later write of the same area
+    # replaces it, a full frame replaces them all. Streams that cannot be
+    # read again and areas past the last slot lose RED RAM, partial
+    # refreshes are then full ones until the next full frame
+    def _keep_old(self, x, y, w, h, image, i, stride, bw, rows):
+        if not self.keep_old:
+            self._old_lost = True
+            return
+        old = self._old
+        n = self._old_n
+        if w >= self.width and h >= self.height:
+            n = 0
+            self._old_lost = False
+        k = 0
+        while k < n:
+            slot = old[k]
+            if slot[0] == x and slot[1] == y and slot[2] == w and slot[3] == h:
+                break
+            k += 1
+        if (isinstance(image, Stream) and not image.reopenable()) or k == OLD_SLOTS:
+            self._old_lost = True
+            return
+        slot = old[k]
+        slot[0] = x
+        slot[1] = y
+        slot[2] = w
+        slot[3] = h
+        slot[4] = image
+        slot[5] = i
+        slot[6] = stride
+        slot[7] = bw
+        slot[8] = rows
+        if k == n:
+            n += 1
+        self._old_n = n
+
+    # drop the queued areas, RED RAM is unknown until a full refresh
+    def _forget_old(self):
+        for k in range(self._old_n):
+            self._old[k][4] = None
+        self._old_n = 0
+        self._old_lost = False
+        self._initial_refresh = True
+
+    # after a refresh, write the areas written to BW RAM since the last one
+    # to RED RAM too
+    def _write_old(self):
+        self._initial_refresh = self._old_lost
+        for k in range(self._old_n):
+            slot = self._old[k]
+            image = slot[4]
+            slot[4] = None
+            self.set_ram_area(slot[0], slot[1], slot[2], slot[3])
+            self._command(WRITE_RED_RAM)
+            if image is None:
+                self._fill(slot[5], slot[7] * slot[8])
+            elif isinstance(image, Stream):
+                self._stream_image(image.open(), slot[7] * 8, slot[8])
+            else:
+                self._send_area(image, slot[5], slot[6], slot[7], slot[8])
+        self._old_n = 0
+
+    # after the wait for a refresh, idle when BUSY cleared. The controller
+    # ignores commands while it refreshes, so after a wait that timed out
+    # the areas are not copied to RED RAM: both RAMs are unknown and the
+    # next frame is sent whole
+    def _refreshed(self, idle):
+        if idle:
+            self._write_old()
+            return
+        self._forget_old()
+        self._shadow = None
+        self.ram_crc = None
+
+    def _copy_area(self, dst, src, x, y, w, h):
+        stride = self.width // 8
+        bw = w // 8
+        for i in range(y * stride + x // 8, (y + h) * stride, stride):
+            dst[i:i + bw] = src[i:i + bw]
+
+    # replace the frame memory with the specified color, a byte value or a
+    # one byte buffer
     def clear_frame_memory(self, color):
+        if not isinstance(color, int):
+            color = color[0]
+        self._shadow = None
+        self.ram_crc = None
         self.set_ram_area(0, 0, self.width, self.height)
         self._command(WRITE_RAM)
         # send the color data
-        for i in range(0, self.width // 8 * self.height):
-            self._data(color)
+        self._fill(color, self.width // 8 * self.height)
+        self._keep_old(0, 0, self.width, self.height, None, color, 0, self.width // 8, self.height)
 
     def refresh(self, x, y, w, h):
-        if (self._initial_refresh):
-            self._initial_refresh = False
-            return self.display_frame()
         w1 =  w + x if x < 0 else w # reduce
         h1 =  h + y if y < 0 else h # reduce
         x1 =  0 if x < 0 else x # limit
@@ -274,52 +701,236 @@ class EPD:
         self.set_ram_area(x1, y1, w1, h1)
         self.display_frame()
 
+    # partial refresh of the areas written since the last refresh, if any
+    def display_frame_diff(self):
+        if self._take_refresh_area():
+            self.display_frame_part()
+
+    # set the RAM window to the areas written since the last refresh,
+    # returns False if there is nothing to refresh
+    def _take_refresh_area(self):
+        if self._refresh_area is None:
+            return False
+        x, y, w, h = self._refresh_area
+        self._refresh_area = None
+        self.set_ram_area(x, y, w, h)
+        return True
+
+    # draw the current frame memory like display_frame, yielding to other
+    # uasyncio tasks while the panel is busy, mode defaults to the update mode
+    async def display_frame_async(self, mode=None):
+        if mode is None:
+            mode = self.update_mode
+        if mode == UPDATE_DIFF:
+            if not self._take_refresh_area():
+                return
+            mode = UPDATE_PART
+        if mode == UPDATE_PART:
+            self.keep_old = True
+            if self._initial_refresh:
+                mode = UPDATE_FULL
+        if mode == UPDATE_FULL:
+            self._command(DISPLAY_UPDATE_CONTROL_2, b'\xF7')
+        elif mode == UPDATE_FAST:
+            self._command(DISPLAY_UPDATE_CONTROL_2, b'\xC7')
+        else:
+            self._command(DISPLAY_UPDATE_CONTROL_2, b'\xFF')
+        if mode != UPDATE_FAST:
+            self._drop_fast_lut()
+        self._command(MASTER_ACTIVATION)
+        if mode == UPDATE_FULL:
+            idle = await self.wait_idle_async(2200, UPDATE_FULL)
+            self._part_update_counter = 0
+        elif mode == UPDATE_FAST:
+            idle = await self.wait_idle_async(1100, UPDATE_FAST)
+            self._part_update_counter = 0
+            if self._power_is_on:
+                self._command(DISPLAY_UPDATE_CONTROL_2, b'\x83')
+                self._command(MASTER_ACTIVATION)
+                await self.wait_idle_async(150)
+            self._power_is_on = False
+            self._using_partial_mode = False
+        else:
+            idle = await self.wait_idle_async(300, UPDATE_PART)
+            self._part_update_counter += 1
+        self._refreshed(idle)
+
     # draw the current frame memory and switch to the next memory area
     def display_frame_full(self):
+        self._drop_fast_lut()
         self._command(DISPLAY_UPDATE_CONTROL_2, b'\xF7')
         self._command(MASTER_ACTIVATION)
-        self._command(TERMINATE_FRAME_READ_WRITE)
-        self.wait_until_idle(2200)
+        idle = self.wait_until_idle(2200, UPDATE_FULL)
+        self._part_update_counter = 0
+        self._refreshed(idle)
     
     # draw fast the current frame memory
     def display_frame_fast(self):
         self._command(DISPLAY_UPDATE_CONTROL_2, b'\xC7')
         self._command(MASTER_ACTIVATION)
-        self._command(TERMINATE_FRAME_READ_WRITE)
-        self.wait_until_idle(1100)
+        idle = self.wait_until_idle(1100, UPDATE_FAST)
+        self._part_update_counter = 0
         self.power_off()
+        self._refreshed(idle)
         
+    # partial refresh, a full one while RED RAM does not hold the old image
     def display_frame_part(self):
+        self.keep_old = True
+        if self._initial_refresh:
+            return self.display_frame_full()
+        self._drop_fast_lut()
         self._command(DISPLAY_UPDATE_CONTROL_2, b'\xFF')
         self._command(MASTER_ACTIVATION)
-        self._command(TERMINATE_FRAME_READ_WRITE)
-        self.wait_until_idle(300)
+        idle = self.wait_until_idle(300, UPDATE_PART)
+        self._part_update_counter += 1
+        self._refreshed(idle)
      
-    def power_on(self):
-        if (self._power_is_on is False):
-            self._command(DISPLAY_UPDATE_CONTROL_2,b'\xE0')
-            self._command(MASTER_ACTIVATION)
-            self.wait_until_idle(100)
-        self._power_is_on = True
-
-    def power_off(self):
-        if (self._power_is_on):
-            self._command(DISPLAY_UPDATE_CONTROL_2, b'\x83')
-            self._command(MASTER_ACTIVATION)
-            self.wait_until_idle(150)
-        self._power_is_on = False
-        self._using_partial_mode = False
-        
-    # to wake call reset() or init()
-    def hibernate(self):
-        self.power_off()
-        if self.rst.value():
-            self._command(DEEP_SLEEP_MODE, b'\x01')     #enter deep sleep
-            self._hibernating = True;
+    # to wake call reset() or init(). Deep sleep mode 1 keeps the RAM, the
+    # next frame is then only sent if it differs from the one in RAM. Mode 2
+    # (retain=False) draws less current but loses the RAM
+    def hibernate(self, retain=True):
+        if self._deep_sleep(_SEQ_SLEEP_RETAIN if retain else _SEQ_SLEEP):
             self._init_display_done = False
-            
-    # to wake call reset() or init()
-    def sleep(self):
-        self.hibernate()
-        self.wait_until_idle(10)
-      
+            self.ram_retained = retain
+            if not retain:
+                self.ram_generation += 1
+                self._shadow = None
+                self.ram_crc = None
+                self._forget_old()
+
+# a ticker in a band of the display, moved step pixels per call of step()
+# with a partial refresh of the band only
+#
+#     ticker = Ticker(epd, 0, 176, 200, 16, step=8)
+#     ticker.set_text(font, 'news of the day')
+#     ticker.start()
+#     while True:
+#         ticker.step()
+#
+# The content comes from a tape that wraps around, columns of an image
+# length pixels wide, or with vertical=True rows of an image length rows
+# high. The SSD1681 cannot move pixels around in RAM, so a scrolling
+# ticker shifts its band, one buffer of w // 8 * h bytes, with epd_bitmap,
+# copies the exposed strip of the tape into it and rewrites the band's RAM
+# window. With sweep=True the band stays and a cursor moves across it
+# instead, each step writes only the step wide strip at the cursor through
+# its own RAM window, like a chart recorder. x and w are multiples of 8, so
+# is step when sweeping horizontally; rotated by 90 or 270 degrees y and h
+# must be too. Other writes must not cover the band while it runs. Its
+# refreshes are partial, so create it, or set a partial update mode, before
+# the frame around the band is shown for RED RAM to hold that frame
+class Ticker:
+    def __init__(self, epd, x, y, w, h, step=8, vertical=False, sweep=False):
+        import epd_bitmap
+        self._bitmap = epd_bitmap
+        self.epd = epd
+        epd.keep_old = True
+        self.x = x & 0xF8
+        self.y = y
+        self.w = w & 0xF8
+        self.h = h
+        self.step_size = step
+        self.vertical = vertical
+        self.sweep = sweep
+        self._bw = self.w // 8
+        self._band = bytearray(b'\xff' * (self._bw * h))
+        if not sweep:
+            self._strip = self._band
+        elif vertical:
+            self._strip = bytearray(self._bw * step)
+        else:
+            self._strip = bytearray(step // 8 * h)
+        self._tape = None
+        self._length = 0
+        self._stride = 0
+        self._pos = 0
+        self._cursor = 0
+
+    # content of the ticker: an image of length columns of h rows, rows of
+    # (length + 7) // 8 bytes, or vertical, length rows of w // 8 bytes
+    def set_tape(self, image, length):
+        self._tape = image
+        self._length = length
+        self._stride = self._bw if self.vertical else (length + 7) // 8
+        self._pos = 0
+
+    # text drawn with an epd_text font as the tape, on one line followed by
+    # gap blank pixels, or vertical wrapped to w followed by gap blank rows
+    def set_text(self, font, text, invert=False, gap=None):
+        if gap is None:
+            gap = 2 * font.height
+        if self.vertical:
+            tape = bytearray()
+            for line in font.wrap(text, self.w):
+                tape += font.render(line, self.w, invert)
+            tape += (b'\x00' if invert else b'\xff') * (self._bw * gap)
+            self.set_tape(tape, len(tape) // self._bw)
+            return
+        length = (font.width(text) + gap + 7) & ~7
+        stride = length // 8
+        tape = bytearray((b'\x00' if invert else b'\xff') * (stride * self.h))
+        band = font.render(text, length, invert)
+        n = min(font.height, self.h) * stride
+        tape[:n] = band[:n]
+        self.set_tape(tape, length)
+
+    # copy n columns, or rows, of the tape from the tape position into
+    # buf at d, wrapping around the end of the tape
+    def _take(self, buf, stride, d, n):
+        tape = self._tape
+        while n > 0:
+            k = min(n, self._length - self._pos)
+            if self.vertical:
+                s = self._pos * stride
+                buf[d * stride:(d + k) * stride] = tape[s:s + k * stride]
+            else:
+                self._bitmap.blit(buf, stride, d, 0, tape, self._stride, k, self.h, self._pos)
+            self._pos = (self._pos + k) % self._length
+            d += k
+            n -= k
+
+    # write the w x h image to its window through the driver and refresh
+    # the window
+    def _show(self, image, x, y, w, h):
+        epd = self.epd
+        epd.set_frame_memory_part(image, x, y, w, h)
+        epd.set_ram_area(x, y, w, h)
+        epd.display_frame_part()
+
+    # draw the band from the start of the tape and refresh it
+    def start(self):
+        self._pos = 0
+        self._cursor = 0
+        band = self._band
+        self._take(band, self._bw, 0, self.h if self.vertical else self.w)
+        self._show(band, self.x, self.y, self.w, self.h)
+
+    # move the ticker one step
+    def step(self):
+        n = self.step_size
+        if self.sweep:
+            # the last strip before the cursor wraps is cut to the band
+            c = self._cursor
+            strip = memoryview(self._strip)
+            if self.vertical:
+                n = min(n, self.h - c)
+                strip = strip[:self._bw * n]
+                self._take(strip, self._bw, 0, n)
+                self._show(strip, self.x, self.y + c, self.w, n)
+                self._cursor = (c + n) % self.h
+            else:
+                n = min(n, self.w - c)
+                strip = strip[:n // 8 * self.h]
+                self._take(strip, n // 8, 0, n)
+                self._show(strip, self.x + c, self.y, n, self.h)
+                self._cursor = (c + n) % self.w
+            return
+        band = self._band
+        bm = self._bitmap
+        if self.vertical:
+            bm.scroll_v(band, self._bw, self.h, -n)
+            self._take(band, self._bw, self.h - n, n)
+        else:
+            bm.scroll_h(band, self._bw, self.h, -n)
+            self._take(band, self._bw, self.w - n, n)
+        self._show(band, self.x, self.y, self.w, self.h)
@@ -27,6 +27,7 @@ SOFTWARE.
 
 from micropython import const
 from time import sleep_ms
+from epd_core import EPDCore, Stream, compile_sequence, sleep_ms_async
 import ustruct
 
 
@@ -104,178 +105,227 @@ EPD_ARRAY = const(5000)
 MAX_X     = const(24)
 MAX_Y     = const(199)
 
-BUSY = const(0)  # 0=busy, 1=idle
-
 NORMAL                             = const(0x1)
 INVERTED                           = const(0x2)
 
 UPDATE_FULL                        = const(0x0)
 UPDATE_PART                        = const(0x1)
+_SEQ_INIT = compile_sequence(
+    (0x00, b'\xff\x0e', 0),
+    (0x01, b'\x03\x09\x39\x39', 0), # power setting
+    (0x4D, b'\x55', 0),
+    (0xaa, b'\x0f', 0),
+    (0xE9, b'\x02', 0),
+    (0xb6, b'\x11', 0),
+    (0xF3, b'\x0a', 0),
+    (0x06, b'\xc7\x0c\x0c', 0), # boost soft start
+    (0x61, b'\xc8\x00\xc8', 0), #resolution setting// 200
+    (0x60, b'\x00', 0), #// Tcon setting
+    (0x82, b'\x12', 0), # VCOM DC setting
+    (0x30, b'\x3C', 0), # PLL control  // default 50Hz
+    (0X50, b'\x97', 0), # VCOM and data interval
+    (0XE3, b'\x00', 0), # power saving register // default
+)
+
+_SEQ_LUT_FULL = compile_sequence(
+    (0x20, _lut_20_vcomDC, 0),
+    (0x21, _lut_21_ww, 0),
+    (0x22, _lut_22_bw, 0),
+    (0x23, _lut_23_wb, 0),
+    (0x24, _lut_24_bb, 0),
+)
+
+_SEQ_LUT_PART = compile_sequence(
+    (0x20, _lut_20_vcomDC_partial, 0),
+    (0x21, _lut_21_ww_partial, 0),
+    (0x22, _lut_22_bw_partial, 0),
+    (0x23, _lut_23_wb_partial, 0),
+    (0x24, _lut_24_bb_partial, 0),
+)
+
+class EPD(EPDCore):
+    # controller profile, see epd_core. Without a busy pin refreshes are
+    # waited for 1500 ms (full) and 400 ms (partial), with one every wait
+    # lasts for as long as the panel is busy, up to busy_timeout
+    busy_level = 0
+    busy_timeout = 10000
+    reset_ms = (100, 100)
+    seq_power_on = compile_sequence((0x04, b'', 10))
+    seq_power_off = compile_sequence((0x02, b'', 10))
+    power_ms = (100, 100)
+    seq_sleep = compile_sequence((0x07, b'\xA5', 0))
+    sleep_wait = (300, 200)
+
+    # update modes this driver supports
+    update_modes = (UPDATE_FULL, UPDATE_PART)
+    # set_frame_memory writes RAM and refreshes
+    refresh_on_write = True
 
-class EPD:
     def __init__(self, spi, cs = None, dc = None, rst= None, busy=None, refresh= UPDATE_FULL, orientation= NORMAL):
-        self.spi = spi
-        self.cs = cs
-        self.dc = dc
-        self.rst = rst
-        self.busy = busy
-        if cs:
-            self.cs.init(self.cs.OUT, value=0)
-        self.dc.init(self.dc.OUT, value=0)
-        self.rst.init(self.rst.OUT, value=1)
-        if busy:
-            self.busy.init(self.busy.IN)
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        self._hibernating = True
-        self._power_is_on = False
-        self._initial_refresh = True
-        self._part_update_counter = 0
+        EPDCore.__init__(self, spi, cs, dc, rst, busy)
+        # preallocated partial window buffer, so that setting up a window
+        # and writing RAM does not allocate
+        self._win = bytearray(7)
+        # panel setting, its UD and SHL bits flip the scan directions, and
+        # buffer of 8 rows transposed on the way to RAM
+        self._psr = bytearray(b'\xff\x0e')
+        self._rot_buf = bytearray(EPD_WIDTH)
         self.set_frame_memory = self.set_frame_memory_full
         self.display_frame = self.display_frame_full
         self.update_mode = refresh
         self.set_update_mode(refresh)
         self.set_ram_area = self.set_ram_area_normal
-        self.orientation = NORMAL
         self.initial_refresh = True
-        self._using_partial_mode = False
+        if orientation != NORMAL:
+            self.set_orientation(orientation)
 
-    # set display update mode
+    # rotate the display 0, 90, 180 or 270 degrees clockwise, optionally
+    # mirrored left to right. Flips are done by the panel setting scan
+    # directions, 90 and 270 degrees also transpose 8x8 pixel blocks on the
+    # way to RAM, so x, y, w and h of the image must then be multiples of 8
+    def set_rotation(self, rotation, mirror=False):
+        swap, fx, fy = self._set_view(rotation, mirror)
+        self._use_rotate(swap)
+        self._psr[0] = 0xFF & ~(0x04 if fx else 0) & ~(0x08 if fy else 0)
+        if not self._hibernating:
+            self._command(0x00, self._psr)
+
+    # set display update mode, the panel is powered off when the mode changes
     def set_update_mode(self, mode):
-        if mode == self.update_mode:
-            return
         if mode == UPDATE_FULL:
             self.set_frame_memory = self.set_frame_memory_full
             self.display_frame = self.display_frame_full
         elif mode == UPDATE_PART:
             self.set_frame_memory = self.set_frame_memory_part
             self.display_frame = self.display_frame_part
-        self.update_mode = mode
-        self.power_off()
-        
-    # send command and data(if any) to display
-    def _command(self, command, data=None):
-        if self.dc:
-            self.dc(0)
-        if self.cs:
-            self.cs(0)
-        self.spi.write(bytearray([command]))
-        if self.cs:
-            self.cs(1)
-        if data is not None:
-            self._data(data)
-            
-    # send data to display
-    def _data(self, data):
-        if self.dc:
-            self.dc(1)
-        if self.cs:
-            self.cs(0)
-        self.spi.write(data)
-        if self.cs:
-            self.cs(1)
-
-    # wait for busy state or specified time
-    def wait_until_idle(self, t= 2200):
-        if self.busy:
-            while self.busy.value() == BUSY:
-                sleep_ms(10)
-        else:
-            while  t > 0:
-                if self.busy:
-                    if self.busy.value() != BUSY:
-                        return
-                sleep_ms(50)
-                t = t - 50
-
-    # hard reset display
-    def reset(self):
-        self.rst(0)
-        sleep_ms(100)
-        self.rst(1)
-        sleep_ms(100)
-        self._hibernating = False
+        if mode != self.update_mode:
+            self.update_mode = mode
+            self.power_off()
         
     #Normal refresh initialization
     def init(self):
         self.reset()
-        self._command(0x00, b'\xff\x0e');
-        self._command(0x01, b'\x03\x09\x39\x39'); # power setting
-        self._command(0x4D, b'\x55');
-        self._command(0xaa, b'\x0f');
-        self._command(0xE9, b'\x02');
-        self._command(0xb6, b'\x11');
-        self._command(0xF3, b'\x0a');
-        self._command(0x06, b'\xc7\x0c\x0c') # boost soft start
-        self._command(0x61, b'\xc8\x00\xc8')  #resolution setting// 200
-        self._command(0x60, b'\x00') #// Tcon setting
-        self._command(0x82, b'\x12') # VCOM DC setting
-        self._command(0x30, b'\x3C'); # PLL control  // default 50Hz
-        self._command(0X50, b'\x97'); # VCOM and data interval
-        self._command(0XE3, b'\x00'); # power saving register // default
+        self._run_sequence(_SEQ_INIT)
+        if self._psr[0] != 0xFF:
+            self._command(0x00, self._psr)
+        self._init_mode = None
 
+    # full refresh initialization, reset and LUT upload are skipped when the
+    # full LUTs are still loaded
     def init_full(self):
-        self.init()
-        self._command(0x20);
-        self._data(_lut_20_vcomDC)
-        self._command(0x21);
-        self._data(_lut_21_ww);
-        self._command(0x22);
-        self._data(_lut_22_bw)
-        self._command(0x23);
-        self._data(_lut_23_wb)
-        self._command(0x24);
-        self._data(_lut_24_bb)
+        if self._init_mode != UPDATE_FULL or self._hibernating:
+            self.init()
+            self._run_sequence(_SEQ_LUT_FULL)
+            self._init_mode = UPDATE_FULL
         self.power_on()
         self._using_partial_mode = False
 
+    # partial refresh initialization, reset and LUT upload are skipped when
+    # the partial LUTs are still loaded
     def init_part(self):
-        self.init()
-        self._command(0x20);
-        self._data(_lut_20_vcomDC_partial)
-        self._command(0x21);
-        self._data(_lut_21_ww_partial)
-        self._command(0x22);
-        self._data(_lut_22_bw_partial)
-        self._command(0x23);
-        self._data(_lut_23_wb_partial)
-        self._command(0x24);
-        self._data(_lut_24_bb_partial)
+        if self._init_mode != UPDATE_PART or self._hibernating:
+            self.init()
+            self._run_sequence(_SEQ_LUT_PART)
+            self._init_mode = UPDATE_PART
         self.power_on()
         self._using_partial_mode = True
-    
-    # set image pos on display Ram
+
+    # set the partial window to the (x, y, w, h) area of RAM, x and w widened
+    # to byte boundaries, clipped to the panel
     def set_ram_area_normal(self, x, y, w, h):
-        xe = (x + w - 1) | 0x0007; # byte boundary inclusive (last byte)
-        ye = y + h - 1;
-        x =  x & 0xFFF8; # byte boundary
-        self._command(0x90); # partial window
-        self._data(bytes([x % 256,xe % 256]));
-        self._data(bytes([0,y % 256]));
-        self._data(bytes([0,ye % 256]));
-        self._data('b\x00'); # don't see any difference
-
-    # calc display coordinates
-    def calc_coords(self, x, y, w, h):
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        x = x & 0xF8
-        w = w & 0xF8
-        if (x + w >= self.width):
-            x_end = self.width - 1
-        else:
-            x_end = x + w - 1
-        if (y + h >= self.height):
-            y_end = self.height - 1
+        xe = min(x + w - 1, EPD_WIDTH - 1) | 0x0007; # byte boundary inclusive (last byte)
+        ye = min(y + h, EPD_HEIGHT) - 1;
+        win = self._win
+        win[0] = x & 0xF8 # byte boundary
+        win[1] = xe & 0xFF
+        win[2] = y >> 8
+        win[3] = y & 0xFF
+        win[4] = ye >> 8
+        win[5] = ye & 0xFF
+        win[6] = 0x00 # PT_SCAN, don't see any difference
+        self._command(0x90, win); # partial window
+
+    # put an image read from a stream in the frame memory like
+    # set_frame_memory, see Stream for the sources. The image goes to RAM in
+    # bands of 8 rows and is never held whole in memory. It is sent twice, as
+    # new and as old data, so the source must be a function returning the
+    # stream, or a seekable one; not in 90 or 270 degrees rotations
+    def set_frame_memory_stream(self, source, x, y, w, h):
+        image = Stream(source)
+        if not image.reopenable():
+            raise ValueError('stream must be seekable or a function returning it')
+        if self._swap:
+            raise ValueError('streams cannot be rotated by 90 or 270 degrees')
+        self.set_frame_memory(image, x, y, w, h)
+
+    # send a w x h pixels image, or a Stream of one, after a data
+    # transmission command, rotated by 90 or 270 degrees the image is
+    # transposed in bands of 8 RAM rows
+    def _write_image(self, command, image, w, h):
+        if isinstance(image, Stream):
+            self._command(command)
+            self._stream_image(image.open(), w, h)
+            return
+        if not self._swap:
+            self._command(command, image)
+            return
+        self._command(command)
+        transpose8 = self._rotate.transpose8
+        mv = memoryview(image)
+        stride = w // 8
+        bw = h // 8
+        buf = self._rot_buf
+        band = memoryview(buf)[:8 * bw]
+        if self.dc:
+            self.dc(1)
+        if self.cs:
+            self.cs(0)
+        for c in range(stride):
+            for k in range(bw):
+                transpose8(mv, 8 * k * stride + c, stride, buf, k, bw, True)
+            self.spi.write(band)
+        if self.cs:
+            self.cs(1)
+
+    # RAM area of an image placed at x, y
+    def _image_area(self, x, y, w, h):
+        if self._swap:
+            return y, x, h, w
+        return x, y, w, h
+
+    # send an image after a data transmission command, through a partial
+    # window unless it covers the panel
+    def _write_window(self, command, image, x, y, w, h):
+        if x or y or w < self.width or h < self.height:
+            self._command(0x91) # partial in
+            self.set_ram_area(*self._image_area(x, y, w, h))
+            self._write_image(command, image, w, h)
+            self._command(0x92) # partial out
         else:
-            y_end = y + h - 1
-        return x, y, x_end, y_end
-        
+            self._write_image(command, image, w, h)
+
+    # rows of the (x, y, w, h) area of a full frame image
+    def _area_rows(self, image, x, y, w, h):
+        mv = memoryview(image)
+        stride = self.width // 8
+        bw = w // 8
+        for i in range(y * stride + x // 8, (y + h) * stride, stride):
+            yield mv[i:i + bw]
+
+    # write the (x, y, w, h) area of a full frame image and refresh it, only
+    # the bytes of the area are sent. x and w must be multiples of 8, not in
+    # 90 or 270 degrees rotations
+    def write_area(self, image, x, y, w, h):
+        if self._swap:
+            raise ValueError('areas cannot be rotated by 90 or 270 degrees')
+        self.set_frame_memory(Stream(lambda: self._area_rows(image, x, y, w, h)), x, y, w, h)
+
     # put an image in the frame memory for full refresh
     def set_frame_memory_full(self, image, x, y, w, h):
         self.init_full()
-        self._command(0x13, image)
+        self._write_window(0x13, image, x, y, w, h)
         self.display_frame_full()
-        self._command(0x10, image)
+        self._write_window(0x10, image, x, y, w, h)
         self.power_off()
 
     # put an image in part of the frame memory
@@ -286,71 +336,67 @@ class EPD:
         if self._using_partial_mode == False:
             self.init_part()
             self.clear_frame_memory()
-        x, y, x_end, y_end = self.calc_coords(x, y, w, h)
         self._command(0x91); # partial in
-        self._command(0x13, image)
-        self.set_ram_area(x, y, x_end, y_end)
+        self.set_ram_area(*self._image_area(x, y, w, h))
+        self._write_image(0x13, image, w, h)
         self.display_frame_part()
-        self._command(0x10, image)
+        self._write_image(0x10, image, w, h)
         self._command(0x92); # partial out
         
+    # put an image in the frame memory like set_frame_memory, yielding to
+    # other uasyncio tasks while the panel refreshes
+    async def set_frame_memory_async(self, image, x, y, w, h):
+        if self.update_mode == UPDATE_FULL or self._hibernating:
+            self.init_full()
+            self._write_window(0x13, image, x, y, w, h)
+            await self.display_frame_async()
+            self._write_window(0x10, image, x, y, w, h)
+            self.power_off()
+            return
+        if self._using_partial_mode == False:
+            self.init_part()
+            self.clear_frame_memory()
+        self._command(0x91); # partial in
+        self.set_ram_area(*self._image_area(x, y, w, h))
+        self._write_image(0x13, image, w, h)
+        await self.display_frame_async()
+        self._write_image(0x10, image, w, h)
+        self._command(0x92); # partial out
+
     # replace the frame memory with the specified color
     def clear_frame_memory(self):
         self._command(0x91); # partial in
         self.set_ram_area(0, 0, self.width, self.height)
         self._command(0x13)
         # send the color data
-        for i in range(5000):
-            self._data(bytes([0xFF]))
+        self._fill(0xFF, EPD_ARRAY)
         self.display_frame_part()
         self._command(0x10)
-        for i in range(5000):
-            self._data(bytes([0xFF]))
+        self._fill(0xFF, EPD_ARRAY)
         self._command(0x92); # partial out
 
     # draw the current frame memory
     def display_frame_full(self):
         self._command(0x12)
         sleep_ms(10)
-        self.wait_until_idle(1500)
+        self.wait_until_idle(1500, UPDATE_FULL)
+        self._part_update_counter = 0
 
     # draw part of the current frame memory
     def display_frame_part(self):
         self._command(0x12)
         sleep_ms(10)
-        self.wait_until_idle(400)
+        self.wait_until_idle(400, UPDATE_PART)
+        self._part_update_counter += 1
      
-    # power on display
-    def power_on(self):
-        if (self._power_is_on is False):
-            self._command(0x04)
-            sleep_ms(10)
-            self.wait_until_idle(100)
-            self._power_is_on = True
-
-    # power off display
-    def power_off(self):
-        if (self._power_is_on):
-            self._command(0x02)
-            sleep_ms(10)
-            self.wait_until_idle(100)
-            self._power_is_on = False
-            self._using_partial_mode = False
-
-    # hibernate display - low power state
-    # require active reset Pin to wake
-    # to wake call reset() or init()
-    def hibernate(self):
-        self.power_off()
-        if self.rst.value():
-            self._command(0x07, b'\xA5')     #enter deep sleep
-            sleep_ms(300)
-            self.wait_until_idle(200)
-            self._hibernating = True;
-            
-    # to wake call reset() or init()
-    def sleep(self):
-        self.hibernate()
-        self.wait_until_idle(10)
-        
-    
\ No newline at end of file
+    # draw the current frame memory like display_frame, yielding to other
+    # uasyncio tasks while the panel is busy
+    async def display_frame_async(self):
+        self._command(0x12)
+        await sleep_ms_async(10)
+        if self._using_partial_mode:
+            await self.wait_idle_async(400, UPDATE_PART)
+            self._part_update_counter += 1
+        else:
+            await self.wait_idle_async(1500, UPDATE_FULL)
+            self._part_update_counter = 0
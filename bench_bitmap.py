@@ -0,0 +1,175 @@
+"""
+Benchmarks of epd_bitmap against naive python loops
+
+For each operation on a 200x200 frame it runs the naive loop, pixel by
+pixel or byte by byte as one would write it inline, and epd_bitmap, checks
+that both give the same frame and prints the time of each and the speedup.
+The kernels are the viper ones of epd_viper on MicroPython ports with a
+native emitter, the python fallback otherwise.
+
+CPython:      python bench_bitmap.py [repeat]
+MicroPython:  import bench_bitmap; bench_bitmap.main()
+"""
+import sys
+import time
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+if not MICROPYTHON:
+    import emulator
+    emulator.install()
+
+import epd_bitmap
+
+WIDTH = 200
+HEIGHT = 200
+STRIDE = WIDTH // 8
+
+if MICROPYTHON:
+    def _us():
+        return time.ticks_us()
+else:
+    def _us():
+        return int(time.perf_counter() * 1000000)
+
+def _pixel(buf, stride, x, y):
+    return buf[y * stride + (x >> 3)] >> (7 - (x & 7)) & 1
+
+def _set_pixel(buf, stride, x, y, v):
+    i = y * stride + (x >> 3)
+    bit = 0x80 >> (x & 7)
+    buf[i] = buf[i] | bit if v else buf[i] & ~bit & 0xFF
+
+def _frame(seed):
+    buf = bytearray(STRIDE * HEIGHT)
+    v = seed
+    for i in range(len(buf)):
+        v = (v * 1103515245 + 12345) & 0x7FFFFFFF
+        buf[i] = v >> 16 & 0xFF
+    return buf
+
+# naive versions
+
+def _naive_invert(buf):
+    for i in range(len(buf)):
+        buf[i] = buf[i] ^ 0xFF
+
+def _naive_blit(dst, dx, dy, src, sstride, w, h):
+    for y in range(h):
+        for x in range(w):
+            _set_pixel(dst, STRIDE, dx + x, dy + y, _pixel(src, sstride, x, y))
+
+def _naive_scroll_h(buf, dx):
+    for y in range(HEIGHT):
+        if dx > 0:
+            for x in range(WIDTH - 1, -1, -1):
+                _set_pixel(buf, STRIDE, x, y, _pixel(buf, STRIDE, x - dx, y) if x >= dx else 1)
+        else:
+            for x in range(WIDTH):
+                _set_pixel(buf, STRIDE, x, y, _pixel(buf, STRIDE, x - dx, y) if x - dx < WIDTH else 1)
+
+def _naive_scroll_v(buf, dy):
+    for y in range(HEIGHT - 1, -1, -1):
+        for c in range(STRIDE):
+            buf[y * STRIDE + c] = buf[(y - dy) * STRIDE + c] if y >= dy else 0xFF
+
+def _naive_xor_diff(a, b, out):
+    box = None
+    for y in range(HEIGHT):
+        for c in range(STRIDE):
+            v = a[y * STRIDE + c] ^ b[y * STRIDE + c]
+            out[y * STRIDE + c] = v
+            if v:
+                if box is None:
+                    box = [c, y, c + 1, y + 1]
+                box[0] = min(box[0], c)
+                box[2] = max(box[2], c + 1)
+                box[3] = y + 1
+    if box is None:
+        return None
+    return box[0] * 8, box[1], (box[2] - box[0]) * 8, box[3] - box[1]
+
+def _naive_diff_rows(a, b):
+    rows = [y for y in range(HEIGHT) for c in range(STRIDE) if a[y * STRIDE + c] != b[y * STRIDE + c]]
+    return (rows[0], rows[-1] + 1) if rows else None
+
+# cases: name, setup returning the state, naive(state), fast(state), result
+# (state) compared between both
+
+_ICON = None
+
+def _icon():
+    global _ICON
+    if _ICON is None:
+        _ICON = _frame(7)[:6 * 48]
+    return _ICON
+
+def _one(frame):
+    return bytearray(frame)
+
+def _two(frame):
+    b = bytearray(frame)
+    for y in range(60, 100):
+        for c in range(5, 12):
+            b[y * STRIDE + c] ^= 0x5A
+    return bytearray(frame), b, bytearray(len(frame))
+
+CASES = (
+    ('invert', _one,
+        lambda s: _naive_invert(s),
+        lambda s: epd_bitmap.invert(s),
+        lambda s: bytes(s)),
+    ('blit aligned', _one,
+        lambda s: _naive_blit(s, 48, 40, _icon(), 6, 48, 48),
+        lambda s: epd_bitmap.blit(s, STRIDE, 48, 40, _icon(), 6, 48, 48),
+        lambda s: bytes(s)),
+    ('blit unaligned', _one,
+        lambda s: _naive_blit(s, 51, 40, _icon(), 6, 45, 48),
+        lambda s: epd_bitmap.blit(s, STRIDE, 51, 40, _icon(), 6, 45, 48),
+        lambda s: bytes(s)),
+    ('scroll_h 3', _one,
+        lambda s: _naive_scroll_h(s, 3),
+        lambda s: epd_bitmap.scroll_h(s, STRIDE, HEIGHT, 3),
+        lambda s: bytes(s)),
+    ('scroll_h -8', _one,
+        lambda s: _naive_scroll_h(s, -8),
+        lambda s: epd_bitmap.scroll_h(s, STRIDE, HEIGHT, -8),
+        lambda s: bytes(s)),
+    ('scroll_v 16', _one,
+        lambda s: _naive_scroll_v(s, 16),
+        lambda s: epd_bitmap.scroll_v(s, STRIDE, HEIGHT, 16),
+        lambda s: bytes(s)),
+    ('xor_diff', _two,
+        lambda s: s.append(_naive_xor_diff(s[0], s[1], s[2])),
+        lambda s: s.append(epd_bitmap.xor_diff(s[0], s[1], STRIDE, HEIGHT, s[2])),
+        lambda s: (bytes(s[2]), s[3])),
+    ('diff_rows', _two,
+        lambda s: s.append(_naive_diff_rows(s[0], s[1])),
+        lambda s: s.append(epd_bitmap.diff_rows(s[0], s[1], STRIDE, HEIGHT)),
+        lambda s: s[3]),
+)
+
+def _time(setup, op, frame, repeat):
+    best = None
+    for i in range(repeat):
+        state = setup(frame)
+        if isinstance(state, tuple):
+            state = list(state)
+        t = _us()
+        op(state)
+        t = _us() - t
+        best = t if best is None else min(best, t)
+    return best, state
+
+def main(repeat=3):
+    frame = _frame(1)
+    print('kernels:', 'viper' if epd_bitmap.VIPER else 'python')
+    print('{:<16}{:>12}{:>12}{:>10}'.format('op', 'naive_ms', 'fast_ms', 'speedup'))
+    for name, setup, naive, fast, result in CASES:
+        slow, a = _time(setup, naive, frame, repeat)
+        quick, b = _time(setup, fast, frame, repeat)
+        if result(a) != result(b):
+            raise AssertionError(name + ': results differ')
+        print('{:<16}{:>12.2f}{:>12.2f}{:>10.1f}'.format(name, slow / 1000, quick / 1000, slow / max(quick, 1)))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,239 @@
+"""
+Benchmarks of the EPD drivers through their public API
+
+For each scenario and update mode it reports, over all update steps of the
+scenario: SPI bytes, SPI writes, CS and DC toggles and commands sent to the
+emulated controller, bytes allocated and python CPU time of the driver, and
+modelled panel busy time and update time (simulated time from the first
+write to the end of the last refresh).
+
+CPython:      python bench_epaper.py [d67|m09]
+MicroPython:  import bench_epaper; bench_epaper.main('d67')
+
+Wire counters and modelled times come from emulator.Panel. CPU time and
+allocations are measured in a second run against a bare SPI stand-in so the
+controller model does not count against the driver. Allocations are exact
+on MicroPython (gc.mem_alloc with the gc disabled), on CPython they are the
+tracemalloc peak, a rough indicator only.
+"""
+import sys
+import time
+import emulator
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+if not MICROPYTHON:
+    emulator.install()
+
+import EPD_154_D67
+import EPD_154_M09
+from emulator.machine import Pin, SPI
+
+emulator.patch(EPD_154_D67)
+emulator.patch(EPD_154_M09)
+
+WIDTH = EPD_154_D67.EPD_WIDTH
+HEIGHT = EPD_154_D67.EPD_HEIGHT
+STRIDE = WIDTH // 8
+
+if MICROPYTHON:
+    import gc
+
+    def _cpu_us():
+        return time.ticks_us()
+
+    def _alloc_start():
+        gc.collect()
+        gc.disable()
+        return gc.mem_alloc()
+
+    def _alloc_stop(start):
+        n = gc.mem_alloc() - start
+        gc.enable()
+        return n
+else:
+    import tracemalloc
+
+    def _cpu_us():
+        return int(time.perf_counter() * 1000000)
+
+    def _alloc_start():
+        tracemalloc.start()
+        return 0
+
+    def _alloc_stop(start):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+DRIVERS = {
+    'd67': (EPD_154_D67, emulator.SSD1681, (
+        ('full', EPD_154_D67.UPDATE_FULL),
+        ('part', EPD_154_D67.UPDATE_PART),
+        ('fast', EPD_154_D67.UPDATE_FAST),
+        ('diff', EPD_154_D67.UPDATE_DIFF),
+    )),
+    'm09': (EPD_154_M09, emulator.UC8151, (
+        ('full', EPD_154_M09.UPDATE_FULL),
+        ('part', EPD_154_M09.UPDATE_PART),
+    )),
+}
+
+def _show(epd, buf):
+    epd.set_frame_memory(buf, 0, 0, WIDTH, HEIGHT)
+    if not epd.refresh_on_write:
+        epd.display_frame()
+
+# fill a byte aligned rectangle of a full frame
+def _fill_rect(buf, x, y, w, h, value):
+    for row in range(y, y + h):
+        i = row * STRIDE + x // 8
+        for c in range(w // 8):
+            buf[i + c] = value
+
+_cat_image = None
+
+# cat.py splash, decompressed once outside the measurements
+def _cat():
+    global _cat_image
+    if _cat_image is None:
+        import cat
+        _cat_image = cat.image()
+    return _cat_image
+
+# scenarios: (setup, step, steps), setup draws and shows the starting frame
+# untimed, each step changes the frame and updates the panel
+
+def _full_setup(epd, buf):
+    pass
+
+def _full_step(epd, buf, i):
+    for y in range(HEIGHT):
+        for c in range(STRIDE):
+            buf[y * STRIDE + c] = 0xAA if (y // 8 + c) & 1 else 0xFF
+    _show(epd, buf)
+
+def _clock_setup(epd, buf):
+    _fill_rect(buf, 0, 0, WIDTH, 8, 0x00)
+    _show(epd, buf)
+
+# a 48x24 clock, one digit bar moves per tick
+def _clock_step(epd, buf, i):
+    _fill_rect(buf, 64, 80, 48, 24, 0xFF)
+    _fill_rect(buf, 64 + 8 * (i % 6), 80, 8, 24, 0x00)
+    _show(epd, buf)
+
+def _scroll_setup(epd, buf):
+    for y in range(176, 192):
+        for c in range(STRIDE):
+            buf[y * STRIDE + c] = (c * 37 + y) & 0xFF
+    _show(epd, buf)
+
+# a 16 row ticker at the bottom moves one byte to the left per step
+def _scroll_step(epd, buf, i):
+    for y in range(176, 192):
+        j = y * STRIDE
+        first = buf[j]
+        buf[j:j + STRIDE - 1] = buf[j + 1:j + STRIDE]
+        buf[j + STRIDE - 1] = first
+    _show(epd, buf)
+
+def _slides_setup(epd, buf):
+    pass
+
+# cat.py splash and its negative, alternating
+def _slides_step(epd, buf, i):
+    image = _cat()
+    if i & 1:
+        for j in range(len(buf)):
+            buf[j] = image[j] ^ 0xFF
+    else:
+        buf[:] = image
+    _show(epd, buf)
+
+def _clear_setup(epd, buf):
+    buf[:] = _cat()
+    _show(epd, buf)
+
+def _clear_step(epd, buf, i):
+    for j in range(len(buf)):
+        buf[j] = 0xFF
+    if epd.update_mode == EPD_154_D67.UPDATE_DIFF and isinstance(epd, EPD_154_D67.EPD):
+        # the diff mode clears by showing a white frame
+        _show(epd, buf)
+    elif isinstance(epd, EPD_154_D67.EPD):
+        epd.clear_frame_memory(0xFF)
+        epd.display_frame()
+    else:
+        # setup left the M09 powered off, clear refreshes through the
+        # partial LUTs
+        epd.init_part()
+        epd.clear_frame_memory()
+
+SCENARIOS = (
+    ('full_frame', _full_setup, _full_step, 1),
+    ('clock_tick', _clock_setup, _clock_step, 10),
+    ('scroll_text', _scroll_setup, _scroll_step, 10),
+    ('slideshow', _slides_setup, _slides_step, 4),
+    ('clear', _clear_setup, _clear_step, 1),
+)
+
+def _make(module, mode, panel=None):
+    if panel is None:
+        spi, cs, dc, rst, busy = SPI(1), Pin('cs'), Pin('dc'), Pin('rst'), None
+    else:
+        spi, cs, dc, rst, busy = panel.spi, panel.cs, panel.dc, panel.rst, panel.busy
+    epd = module.EPD(spi, cs=cs, dc=dc, rst=rst, busy=busy)
+    epd.set_update_mode(mode)
+    return epd
+
+# run one scenario in one update mode, returns a dict of results
+def run(module, controller, mode, scenario):
+    name, setup, step, steps = scenario
+    # wire counters and modelled time against the emulated panel
+    panel = emulator.Panel(controller())
+    epd = _make(module, mode, panel)
+    buf = bytearray(b'\xff' * (STRIDE * HEIGHT))
+    setup(epd, buf)
+    panel.reset_stats()
+    start = emulator.clock.ticks_ms()
+    for i in range(steps):
+        step(epd, buf, i)
+    result = panel.stats()
+    result['update_ms'] = emulator.clock.ticks_ms() - start
+    # every step must reach the panel, or the scenario measures nothing
+    assert sum(result['refreshes'].values()) >= steps, name
+    assert not result['writes_while_busy'], name
+    # python time and allocations against a bare SPI
+    epd = _make(module, mode)
+    buf = bytearray(b'\xff' * (STRIDE * HEIGHT))
+    setup(epd, buf)
+    alloc = _alloc_start()
+    cpu = _cpu_us()
+    for i in range(steps):
+        step(epd, buf, i)
+    cpu = _cpu_us() - cpu
+    result['alloc'] = _alloc_stop(alloc)
+    result['cpu_ms'] = cpu / 1000
+    result['steps'] = steps
+    return result
+
+COLUMNS = ('steps', 'bytes', 'writes', 'cs_toggles', 'dc_toggles', 'commands', 'alloc', 'cpu_ms', 'busy_ms', 'update_ms')
+
+def main(*drivers):
+    if not drivers:
+        drivers = ('d67', 'm09')
+    header = '{:<8}{:<13}{:<6}'.format('driver', 'scenario', 'mode') + ''.join('{:>11}'.format(c) for c in COLUMNS)
+    print(header)
+    for driver in drivers:
+        module, controller, modes = DRIVERS[driver]
+        for scenario in SCENARIOS:
+            for mode_name, mode in modes:
+                r = run(module, controller, mode, scenario)
+                row = '{:<8}{:<13}{:<6}'.format(driver, scenario[0], mode_name)
+                for c in COLUMNS:
+                    v = r[c]
+                    row += '{:>11.1f}'.format(v) if isinstance(v, float) else '{:>11}'.format(v)
+                print(row)
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -1,5 +1,5 @@
 # 200x200 1 bpp image zlib compressed
-#decompress on import
+# decompressed on use, or streamed to the display
 
 import deflate, io
 comp_cat = bytearray(b'\x18\x95c\x18\xe9\x00\x08F:\x00\x82\x91\x0e\x80`\xa4\x03 \x18\x94\x80i\xd5\x02'
@@ -29,6 +29,22 @@ comp_cat = bytearray(b'\x18\x95c\x18\xe9\x00\x08F:\x00\x82\x91\x0e\x80`\xa4\x03
                      b'\x00\xd9\x84\n\xea \x06b\x883\xc8\x81%0\xac```\x01K\\\xc0\x94\x80\xb8\xcd\x01\x87\x04'
                      b'\x07\x0e\xf1\x91\x0e\x80`\xa4\x03 \x18\xe9\x00\x08F:\x00\x82\x81\x05')
 
-ddio = deflate.DeflateIO(io.BytesIO(comp_cat), deflate.AUTO)
-bg_cat = ddio.read(5000)
-ddio.close()
+# the image as a stream, for set_frame_memory_stream(cat.stream, ...)
+def stream():
+    return deflate.DeflateIO(io.BytesIO(comp_cat), deflate.AUTO)
+
+# the decompressed image, 5000 bytes
+def image():
+    ddio = stream()
+    data = ddio.read(5000)
+    ddio.close()
+    return data
+
+# bg_cat is decompressed on first use and kept, later uses get the same
+# 5000 bytes
+def __getattr__(name):
+    if name == 'bg_cat':
+        data = image()
+        globals()['bg_cat'] = data
+        return data
+    raise AttributeError(name)
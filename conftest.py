@@ -0,0 +1,2 @@
+# test_epaper.py is a demo for a board with a panel wired, not a host test
+collect_ignore = ['test_epaper.py']
@@ -0,0 +1,45 @@
+"""
+Host-side emulator of the 1.54" e-paper panels, runs EPD_154_D67 and
+EPD_154_M09 under CPython without hardware
+
+    import emulator
+    emulator.install()
+    import EPD_154_D67
+    panel = emulator.Panel(emulator.SSD1681())
+    e = EPD_154_D67.EPD(panel.spi, cs=panel.cs, dc=panel.dc, rst=panel.rst, busy=panel.busy)
+    ...
+    panel.save_png('frame.png')
+    print(panel.stats())
+
+Time is simulated: sleeps and SPI transfers advance emulator.clock, and the
+BUSY pin follows the modelled refresh durations, so runs take no wall time.
+"""
+import sys
+from . import clock
+from .panel import Controller, Panel
+from .ssd1681 import SSD1681
+from .uc8151 import UC8151
+
+_TIME_NAMES = ('sleep_ms', 'sleep_us', 'ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add')
+
+# make the MicroPython modules the drivers import available under CPython:
+# machine, micropython, ustruct, uasyncio, deflate and the MicroPython
+# additions to time, all running on the simulated clock
+def install():
+    import struct
+    import time
+    from . import deflate, machine, micropython, uasyncio
+    sys.modules.setdefault('machine', machine)
+    sys.modules.setdefault('micropython', micropython)
+    sys.modules.setdefault('ustruct', struct)
+    sys.modules.setdefault('uasyncio', uasyncio)
+    sys.modules.setdefault('deflate', deflate)
+    for name in _TIME_NAMES:
+        setattr(time, name, getattr(clock, name))
+
+# point the time functions a module imported at the simulated clock, for
+# running on MicroPython where the time module cannot be patched
+def patch(module):
+    for name in _TIME_NAMES:
+        if hasattr(module, name):
+            setattr(module, name, getattr(clock, name))
@@ -0,0 +1,26 @@
+# simulated time of the emulator in microseconds, advanced by sleeps and by
+# SPI transfers instead of the wall clock
+
+_now = 0
+
+def advance(us):
+    global _now
+    _now += int(us)
+
+def ticks_us():
+    return _now
+
+def ticks_ms():
+    return _now // 1000
+
+def ticks_diff(a, b):
+    return a - b
+
+def ticks_add(a, b):
+    return a + b
+
+def sleep_us(us):
+    advance(us)
+
+def sleep_ms(ms):
+    advance(ms * 1000)
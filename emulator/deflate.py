@@ -0,0 +1,44 @@
+# stand-in for the MicroPython deflate module under CPython, decompression only
+import zlib
+
+AUTO = 0
+RAW = 1
+ZLIB = 2
+GZIP = 3
+
+class DeflateIO:
+    def __init__(self, stream, format=AUTO, wbits=0, close=False):
+        self._stream = stream
+        self._close = close
+        if format == RAW:
+            wbits = -15
+        elif format == ZLIB:
+            wbits = 15
+        elif format == GZIP:
+            wbits = 31
+        else:
+            wbits = 47 # zlib or gzip header, detected
+        self._z = zlib.decompressobj(wbits)
+        self._buf = b''
+
+    def read(self, n=-1):
+        while n < 0 or len(self._buf) < n:
+            chunk = self._stream.read(256)
+            if not chunk:
+                self._buf += self._z.flush()
+                break
+            self._buf += self._z.decompress(chunk)
+        if n < 0:
+            n = len(self._buf)
+        data = self._buf[:n]
+        self._buf = self._buf[n:]
+        return data
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._close:
+            self._stream.close()
@@ -0,0 +1,74 @@
+# stand-ins for machine.Pin and machine.SPI, wired to an emulated controller
+# by emulator.Panel
+from . import clock
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id=None, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = None
+        self._value = 0
+        self._handler = None
+        # called with the new level on every change of an output pin
+        self.on_change = None
+        # called to read the level of an input pin driven by the emulator
+        self.source = None
+        self.init(mode, pull, value=value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            if self.source is not None:
+                return self.source()
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self._value = value
+            if self.on_change is not None:
+                self.on_change(value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._handler = handler
+
+class SPI:
+    def __init__(self, id=1, baudrate=10000000, polarity=0, phase=0, bits=8, firstbit=0, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        # receives every written buffer, see emulator.Panel
+        self.device = None
+
+    def init(self, baudrate=None, **kw):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        clock.advance(len(buf) * 8 * 1000000 // self.baudrate)
+        if self.device is not None:
+            self.device.transfer(buf)
+
+    def deinit(self):
+        pass
+
+def idle():
+    pass
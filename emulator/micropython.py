@@ -0,0 +1,11 @@
+# stand-in for the micropython module under CPython
+
+def const(value):
+    return value
+
+# code emitters have no meaning under CPython, functions run as plain python
+def native(fn):
+    return fn
+
+def viper(fn):
+    return fn
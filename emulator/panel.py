@@ -0,0 +1,185 @@
+# a panel is a controller model plus the SPI bus and pins a driver talks to
+from . import clock
+from .machine import Pin, SPI
+
+# base of the controller models, decodes the command stream into commands
+# with their parameters and RAM writes, and models the busy time
+class Controller:
+    width = 200
+    height = 200
+    busy_level = 1 # level of the BUSY pin while busy
+    # commands whose data goes to RAM instead of a parameter list
+    ram_commands = ()
+    # parameter count of the commands executed as soon as it is reached,
+    # other commands are executed when the next command starts
+    param_count = {}
+
+    def __init__(self):
+        self.stride = self.width // 8
+        # displayed image, MONO_HLSB with 1 = white
+        self.image = bytearray(b'\xff' * (self.stride * self.height))
+        self.busy_until = 0
+        self.busy_ms = 0
+        self.command = None
+        self.params = bytearray()
+        self.refreshes = {}
+        self.commands = 0
+        # commands and data sent while busy, which a controller ignores
+        self.writes_while_busy = 0
+
+    def busy(self):
+        return clock.ticks_us() < self.busy_until
+
+    def start_busy(self, ms):
+        start = max(self.busy_until, clock.ticks_us())
+        self.busy_until = start + ms * 1000
+        self.busy_ms += ms
+
+    def count_refresh(self, kind):
+        self.refreshes[kind] = self.refreshes.get(kind, 0) + 1
+
+    def write_command(self, command):
+        if self.busy():
+            self.writes_while_busy += 1
+        self.finish()
+        self.commands += 1
+        self.command = command
+        self.params = bytearray()
+        if command in self.ram_commands:
+            self.start_ram(command)
+        elif self.param_count.get(command, -1) == 0:
+            self.finish()
+
+    def write_data(self, buf):
+        if self.busy():
+            self.writes_while_busy += 1
+        if self.command is None:
+            return
+        if self.command in self.ram_commands:
+            self.write_ram(buf)
+            return
+        self.params.extend(buf)
+        if len(self.params) >= self.param_count.get(self.command, 0x10000):
+            self.finish()
+
+    # execute the pending command with the parameters received so far
+    def finish(self):
+        if self.command is None:
+            return
+        command = self.command
+        self.command = None
+        if command not in self.ram_commands:
+            self.execute(command, bytes(self.params))
+
+    def hw_reset(self):
+        self.command = None
+
+    def start_ram(self, command):
+        pass
+
+    def write_ram(self, buf):
+        pass
+
+    def execute(self, command, params):
+        pass
+
+# a controller with its SPI bus and CS, DC, RST and BUSY pins, counting the
+# traffic a driver generates
+class Panel:
+    def __init__(self, controller, baudrate=10000000):
+        self.controller = controller
+        self.spi = SPI(1, baudrate=baudrate)
+        self.spi.device = self
+        self.cs = Pin('cs')
+        self.dc = Pin('dc')
+        self.rst = Pin('rst', value=1)
+        self.busy = Pin('busy')
+        self.cs.on_change = self._cs_changed
+        self.dc.on_change = self._dc_changed
+        self.rst.on_change = self._rst_changed
+        self.busy.source = self._busy_level
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.bytes = 0
+        self.writes = 0
+        self.cs_toggles = 0
+        self.dc_toggles = 0
+        self.controller.busy_ms = 0
+        self.controller.commands = 0
+        self.controller.refreshes = {}
+        self.controller.writes_while_busy = 0
+
+    # counters since the last reset_stats
+    def stats(self):
+        return {
+            'bytes': self.bytes,
+            'writes': self.writes,
+            'cs_toggles': self.cs_toggles,
+            'dc_toggles': self.dc_toggles,
+            'commands': self.controller.commands,
+            'busy_ms': self.controller.busy_ms,
+            'writes_while_busy': self.controller.writes_while_busy,
+            'refreshes': dict(self.controller.refreshes),
+        }
+
+    def _selected(self):
+        # a driver without a CS pin leaves it unconfigured, tied low
+        return self.cs.mode is None or not self.cs.value()
+
+    def _cs_changed(self, value):
+        self.cs_toggles += 1
+
+    def _dc_changed(self, value):
+        self.dc_toggles += 1
+
+    def _rst_changed(self, value):
+        if not value:
+            self.controller.hw_reset()
+
+    def _busy_level(self):
+        level = self.controller.busy_level
+        return level if self.controller.busy() else 1 - level
+
+    def transfer(self, buf):
+        self.bytes += len(buf)
+        self.writes += 1
+        if not self._selected():
+            return
+        if self.dc.value():
+            self.controller.write_data(buf)
+        else:
+            for command in bytes(buf):
+                self.controller.write_command(command)
+
+    # the displayed image, MONO_HLSB with 1 = white
+    def image(self):
+        return bytes(self.controller.image)
+
+    # color of the displayed pixel at x, y, 1 = white
+    def pixel(self, x, y):
+        return (self.controller.image[y * self.controller.stride + x // 8] >> (7 - x % 8)) & 1
+
+    def save_pbm(self, path):
+        c = self.controller
+        with open(path, 'wb') as f:
+            f.write(b'P4\n%d %d\n' % (c.width, c.height))
+            # PBM uses 1 for black
+            f.write(bytes(b ^ 0xFF for b in c.image))
+
+    def save_png(self, path):
+        import struct
+        import zlib
+        c = self.controller
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+        rows = bytearray()
+        for y in range(c.height):
+            rows.append(0) # filter type none
+            rows.extend(c.image[y * c.stride:(y + 1) * c.stride])
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            # 1 bit grayscale, 0 = black as in the panel image
+            f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', c.width, c.height, 1, 0, 0, 0, 0)))
+            f.write(chunk(b'IDAT', zlib.compress(bytes(rows))))
+            f.write(chunk(b'IEND', b''))
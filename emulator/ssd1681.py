@@ -0,0 +1,157 @@
+# SSD1681 model, the controller of the GDEY0154D67 panel (EPD_154_D67)
+from .panel import Controller
+
+class SSD1681(Controller):
+    busy_level = 1
+    ram_commands = (0x24, 0x26)
+    param_count = {
+        0x01: 3, 0x0C: 4, 0x10: 1, 0x11: 1, 0x12: 0, 0x18: 1, 0x1A: 2,
+        0x20: 0, 0x21: 2, 0x22: 1, 0x2C: 1, 0x3A: 1, 0x3B: 1, 0x3C: 1,
+        0x44: 2, 0x45: 4, 0x4E: 1, 0x4F: 2, 0xFF: 0,
+    }
+    # modelled durations in ms
+    reset_ms = 2
+    power_on_ms = 60
+    power_off_ms = 40
+    temperature_ms = 5
+    lut_ms = 10
+    full_ms = 1800
+    fast_ms = 900
+    part_ms = 280
+
+    def __init__(self):
+        Controller.__init__(self)
+        size = self.stride * self.height
+        self.bw = bytearray(b'\xff' * size)
+        self.red = bytearray(size)
+        self.analog = False
+        self.deep_sleep = 0
+        self.reset_registers()
+
+    def reset_registers(self):
+        self.entry = 0x03
+        self.xs = 0
+        self.xe = self.stride - 1
+        self.ys = 0
+        self.ye = self.height - 1
+        self.x = 0
+        self.y = 0
+        self.update_control = 0xFF
+        self.gate_flip = False
+        self.temperature_forced = False
+        self.lut = 'full'
+
+    def hw_reset(self):
+        Controller.hw_reset(self)
+        self.deep_sleep = 0
+        self.analog = False
+        self.reset_registers()
+
+    def write_command(self, command):
+        if not self.deep_sleep:
+            Controller.write_command(self, command)
+
+    def write_data(self, buf):
+        if not self.deep_sleep:
+            Controller.write_data(self, buf)
+
+    def start_ram(self, command):
+        self.ram = self.red if command == 0x26 else self.bw
+
+    def write_ram(self, buf):
+        ram = self.ram
+        stride = self.stride
+        for b in bytes(buf):
+            if 0 <= self.x < stride and 0 <= self.y < self.height:
+                ram[self.y * stride + self.x] = b
+            self.advance()
+
+    # move the address counters per the data entry mode, wrapping at the
+    # window end like the controller
+    def advance(self):
+        if self.entry & 0x04:
+            if self.y == self.ye:
+                self.y = self.ys
+                self.x = self.xs if self.x == self.xe else self.x + (1 if self.entry & 0x01 else -1)
+            else:
+                self.y += 1 if self.entry & 0x02 else -1
+        else:
+            if self.x == self.xe:
+                self.x = self.xs
+                self.y = self.ys if self.y == self.ye else self.y + (1 if self.entry & 0x02 else -1)
+            else:
+                self.x += 1 if self.entry & 0x01 else -1
+
+    def execute(self, command, p):
+        if command == 0x01 and len(p) == 3:
+            self.gate_flip = bool(p[2] & 0x01)
+        elif command == 0x10 and p:
+            self.deep_sleep = p[0] & 0x03
+            if self.deep_sleep == 0x03:
+                # mode 2 does not retain RAM
+                self.bw[:] = bytes(len(self.bw))
+                self.red[:] = bytes(len(self.red))
+        elif command == 0x11 and p:
+            self.entry = p[0] & 0x07
+        elif command == 0x12:
+            self.reset_registers()
+            self.analog = False
+            self.start_busy(self.reset_ms)
+        elif command == 0x1A:
+            self.temperature_forced = True
+        elif command == 0x22 and p:
+            self.update_control = p[0]
+        elif command == 0x20:
+            self.activate(self.update_control)
+        elif command == 0x44 and len(p) == 2:
+            self.xs = p[0] & 0x3F
+            self.xe = p[1] & 0x3F
+        elif command == 0x45 and len(p) == 4:
+            self.ys = p[0] | (p[1] & 0x01) << 8
+            self.ye = p[2] | (p[3] & 0x01) << 8
+        elif command == 0x4E and p:
+            self.x = p[0] & 0x3F
+        elif command == 0x4F and len(p) == 2:
+            self.y = p[0] | (p[1] & 0x01) << 8
+
+    # master activation, runs the steps enabled in display update control 2
+    def activate(self, ctrl):
+        ms = 0
+        if ctrl & 0x40 and not self.analog:
+            self.analog = True
+            ms += self.power_on_ms
+        if ctrl & 0x20:
+            ms += self.temperature_ms
+            self.temperature_forced = False
+        if ctrl & 0x10:
+            ms += self.lut_ms
+            # a LUT loaded for a forced temperature is the fast waveform
+            self.lut = 'fast' if self.temperature_forced else 'full'
+        if ctrl & 0x04:
+            if ctrl & 0x08:
+                ms += self.part_ms
+                self.display(True)
+                self.count_refresh('part')
+            else:
+                ms += self.fast_ms if self.lut == 'fast' else self.full_ms
+                self.display(False)
+                self.count_refresh(self.lut)
+        if ctrl & 0x02 and self.analog:
+            self.analog = False
+            ms += self.power_off_ms
+        self.start_busy(ms)
+
+    # display mode 1 drives every pixel to the BW RAM, display mode 2 only
+    # drives the pixels where BW RAM differs from the old image in RED RAM
+    def display(self, differential):
+        stride = self.stride
+        for y in range(self.height):
+            row = (self.height - 1 - y) if self.gate_flip else y
+            for i in range(stride):
+                new = self.bw[row * stride + i]
+                j = y * stride + i
+                if differential:
+                    changed = new ^ self.red[row * stride + i]
+                    self.image[j] = (self.image[j] & ~changed | new & changed) & 0xFF
+                else:
+                    self.image[j] = new
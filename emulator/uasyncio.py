@@ -0,0 +1,13 @@
+# asyncio with sleeps that advance the simulated clock, so awaited refreshes
+# take no wall clock time
+from asyncio import *
+import asyncio as _asyncio
+from . import clock
+
+async def sleep(t):
+    clock.advance(t * 1000000)
+    await _asyncio.sleep(0)
+
+async def sleep_ms(ms):
+    clock.advance(ms * 1000)
+    await _asyncio.sleep(0)
@@ -0,0 +1,135 @@
+# UC8151 style model, the controller of the GDEW0154M09 panel (EPD_154_M09)
+from .panel import Controller
+
+def _reverse(b):
+    r = 0
+    for i in range(8):
+        r = r << 1 | (b >> i) & 1
+    return r
+
+class UC8151(Controller):
+    busy_level = 0
+    ram_commands = (0x10, 0x13)
+    param_count = {
+        0x00: 2, 0x01: 4, 0x02: 0, 0x04: 0, 0x06: 3, 0x07: 1, 0x12: 0,
+        0x30: 1, 0x50: 1, 0x60: 1, 0x61: 3, 0x82: 1, 0x90: 7, 0x91: 0,
+        0x92: 0, 0xE3: 1,
+    }
+    # modelled durations in ms
+    power_on_ms = 40
+    power_off_ms = 20
+    full_ms = 1400
+    part_ms = 350
+
+    def __init__(self):
+        Controller.__init__(self)
+        size = self.stride * self.height
+        self.old = bytearray(b'\xff' * size)
+        self.new = bytearray(b'\xff' * size)
+        self.deep_sleep = False
+        self.reset_registers()
+
+    def reset_registers(self):
+        self.panel_setting = 0xFF
+        self.power = False
+        self.partial = False
+        self.hrst = 0
+        self.hred = self.width - 1
+        self.vrst = 0
+        self.vred = self.height - 1
+
+    def hw_reset(self):
+        Controller.hw_reset(self)
+        self.deep_sleep = False
+        self.reset_registers()
+
+    def write_command(self, command):
+        if not self.deep_sleep:
+            Controller.write_command(self, command)
+
+    def write_data(self, buf):
+        if not self.deep_sleep:
+            Controller.write_data(self, buf)
+
+    # data transmission fills the partial window while in partial mode,
+    # otherwise the whole frame
+    def start_ram(self, command):
+        self.ram = self.old if command == 0x10 else self.new
+        if self.partial:
+            self.x0 = self.hrst // 8
+            self.x1 = self.hred // 8
+            self.y0 = self.vrst
+            self.y1 = self.vred
+        else:
+            self.x0 = 0
+            self.x1 = self.stride - 1
+            self.y0 = 0
+            self.y1 = self.height - 1
+        self.x = self.x0
+        self.y = self.y0
+
+    def write_ram(self, buf):
+        ram = self.ram
+        stride = self.stride
+        for b in bytes(buf):
+            if self.y <= self.y1 and self.x < stride and self.y < self.height:
+                ram[self.y * stride + self.x] = b
+            if self.x == self.x1:
+                self.x = self.x0
+                self.y += 1
+            else:
+                self.x += 1
+
+    def execute(self, command, p):
+        if command == 0x00 and p:
+            self.panel_setting = p[0]
+        elif command == 0x02:
+            if self.power:
+                self.start_busy(self.power_off_ms)
+            self.power = False
+        elif command == 0x04:
+            if not self.power:
+                self.start_busy(self.power_on_ms)
+            self.power = True
+        elif command == 0x07 and p and p[0] == 0xA5:
+            self.deep_sleep = True
+            # deep sleep does not retain RAM
+            self.old[:] = bytes(len(self.old))
+            self.new[:] = bytes(len(self.new))
+        elif command == 0x12:
+            self.refresh()
+        elif command == 0x90 and len(p) >= 6:
+            self.hrst = p[0] & 0xF8
+            self.hred = p[1] | 0x07
+            self.vrst = (p[2] & 0x01) << 8 | p[3]
+            self.vred = (p[4] & 0x01) << 8 | p[5]
+        elif command == 0x91:
+            self.partial = True
+        elif command == 0x92:
+            self.partial = False
+
+    # display refresh drives the pixels of the window, or the whole frame,
+    # to the new data, a refresh without power on does nothing
+    def refresh(self):
+        if not self.power:
+            return
+        if self.partial:
+            x0, x1, y0, y1 = self.hrst // 8, self.hred // 8, self.vrst, self.vred
+            self.start_busy(self.part_ms)
+            self.count_refresh('part')
+        else:
+            x0, x1, y0, y1 = 0, self.stride - 1, 0, self.height - 1
+            self.start_busy(self.full_ms)
+            self.count_refresh('full')
+        flip_x = not self.panel_setting & 0x04 # SHL
+        flip_y = not self.panel_setting & 0x08 # UD
+        stride = self.stride
+        for y in range(y0, min(y1, self.height - 1) + 1):
+            for x in range(x0, min(x1, stride - 1) + 1):
+                b = self.new[y * stride + x]
+                px = x
+                py = self.height - 1 - y if flip_y else y
+                if flip_x:
+                    b = _reverse(b)
+                    px = stride - 1 - x
+                self.image[py * stride + px] = b
@@ -0,0 +1,164 @@
+"""
+Compressed screen assets, as written by epd_pack.py
+
+    import epd_asset
+    a = epd_asset.Asset('/screens/menu.epa')      # or the bytes of one
+    a.show(epd)                                   # whole image, streamed
+    a.show_tile(epd, 7)                           # just one tile
+
+An asset is a 1 bpp MONO_HLSB image (1 = white) cut into tiles, each tile
+compressed on its own so it can be decoded alone:
+
+    0   4  magic b'EPA1'
+    4   2  width
+    6   2  height
+    8   2  tile width, a multiple of 8
+    10  2  tile height
+    12  2  tile count, row by row
+    14  7  per tile: data offset (4), data length (2), codec (1)
+    ... tile data
+
+Integers are little endian. Codecs are CODEC_RAW, CODEC_RLE (control byte
+n < 128: n + 1 literal bytes follow, n >= 128: the next byte repeated
+n - 126 times) and CODEC_DEFLATE (raw deflate, 512 byte window). Tiles on
+the right and bottom edges may be smaller.
+"""
+from micropython import const
+import ustruct
+
+CODEC_RAW = const(0)
+CODEC_RLE = const(1)
+CODEC_DEFLATE = const(2)
+
+MAGIC = b'EPA1'
+HEADER_SIZE = const(14)
+ENTRY_SIZE = const(7)
+DEFLATE_WBITS = const(9)
+
+# decode RLE data into buf, returns the bytes written
+def rle_decode(data, buf):
+    i = 0
+    n = 0
+    end = len(data)
+    size = len(buf)
+    while i < end and n < size:
+        c = data[i]
+        if c < 128:
+            k = min(c + 1, size - n)
+            buf[n:n + k] = data[i + 1:i + 1 + k]
+            i += c + 2
+        else:
+            k = min(c - 126, size - n)
+            v = data[i + 1]
+            for j in range(n, n + k):
+                buf[j] = v
+            i += 2
+        n += k
+    return n
+
+class Asset:
+    # source is the asset bytes or an open binary file, a path is opened
+    def __init__(self, source):
+        if isinstance(source, str):
+            source = open(source, 'rb')
+        self._file = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._data = memoryview(source)
+            header = self._data[:HEADER_SIZE]
+        else:
+            self._file = source
+            self._data = None
+            source.seek(0)
+            header = source.read(HEADER_SIZE)
+        if bytes(header[:4]) != MAGIC:
+            raise ValueError('not an EPA1 asset')
+        self.width, self.height, self.tile_w, self.tile_h, self.count = ustruct.unpack_from('<HHHHH', header, 4)
+        self.cols = (self.width + self.tile_w - 1) // self.tile_w
+        self.rows = (self.height + self.tile_h - 1) // self.tile_h
+        if self._file:
+            self._index = self._file.read(self.count * ENTRY_SIZE)
+        else:
+            self._index = self._data[HEADER_SIZE:HEADER_SIZE + self.count * ENTRY_SIZE]
+        self._band = None
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+    # (x, y, w, h) of tile i in the image
+    def tile_rect(self, i):
+        x = (i % self.cols) * self.tile_w
+        y = (i // self.cols) * self.tile_h
+        return x, y, min(self.tile_w, self.width - x), min(self.tile_h, self.height - y)
+
+    # index of the tile at pixel x, y
+    def tile_at(self, x, y):
+        return (y // self.tile_h) * self.cols + x // self.tile_w
+
+    # compressed data and codec of tile i
+    def _tile_data(self, i):
+        offset, length, codec = ustruct.unpack_from('<IHB', self._index, i * ENTRY_SIZE)
+        if self._file:
+            self._file.seek(offset)
+            return self._file.read(length), codec
+        return self._data[offset:offset + length], codec
+
+    # decode tile i into buf, a new buffer if none is given, returns the
+    # buffer, rows of (w + 7) // 8 bytes
+    def tile(self, i, buf=None):
+        x, y, w, h = self.tile_rect(i)
+        size = (w + 7) // 8 * h
+        if buf is None:
+            buf = bytearray(size)
+        out = memoryview(buf)[:size]
+        data, codec = self._tile_data(i)
+        if codec == CODEC_RLE:
+            rle_decode(data, out)
+        elif codec == CODEC_DEFLATE:
+            import deflate
+            import io
+            d = deflate.DeflateIO(io.BytesIO(data), deflate.RAW, DEFLATE_WBITS)
+            n = 0
+            while n < size:
+                k = d.readinto(out[n:])
+                if not k:
+                    break
+                n += k
+            d.close()
+        else:
+            out[:] = data[:size]
+        return buf
+
+    # generator of the image in bands of one tile row, for
+    # set_frame_memory_stream. Decodes each tile of the band into a band
+    # buffer, the only image memory used
+    def stream(self):
+        stride = (self.width + 7) // 8
+        tbw = self.tile_w // 8
+        if self._band is None:
+            self._band = bytearray(stride * self.tile_h)
+            self._tile_buf = bytearray(tbw * self.tile_h)
+        band = self._band
+        tile = self._tile_buf
+        for r in range(self.rows):
+            for c in range(self.cols):
+                i = r * self.cols + c
+                x, y, w, h = self.tile_rect(i)
+                self.tile(i, tile)
+                bw = (w + 7) // 8
+                for row in range(h):
+                    band[row * stride + x // 8:row * stride + x // 8 + bw] = tile[row * bw:(row + 1) * bw]
+            yield memoryview(band)[:stride * h]
+
+    # show the whole image at x, y with set_frame_memory_stream
+    def show(self, epd, x=0, y=0):
+        epd.set_frame_memory_stream(self.stream, x, y, self.width, self.height)
+        if not epd.refresh_on_write:
+            epd.display_frame()
+
+    # show tile i at its place in the image, offset by x, y
+    def show_tile(self, epd, i, x=0, y=0):
+        tx, ty, w, h = self.tile_rect(i)
+        epd.set_frame_memory(self.tile(i), x + tx, y + ty, w, h)
+        if not epd.refresh_on_write:
+            epd.display_frame()
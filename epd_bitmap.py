@@ -0,0 +1,267 @@
+"""
+Operations on MONO_HLSB frames for the EPD drivers
+
+    import epd_bitmap as bm
+    bm.blit(frame, 25, 13, 40, icon, 3, 24, 24, op=bm.AND)  # ink an icon
+    bm.scroll_h(ticker, 25, 16, -2)                        # 2 pixels left
+    box = bm.xor_diff(frame, old, 25, 200)                 # changed area
+    bm.invert(frame)
+
+Buffers are rows of stride bytes, bit 7 of a byte the leftmost pixel. On
+MicroPython the hot loops run as viper code from epd_viper, elsewhere, or
+on ports without a native emitter, as the python below. The functions share
+one parameter array and are not reentrant.
+"""
+from micropython import const
+from array import array
+import sys
+
+COPY = const(0)
+AND = const(1) # black pixels of the source ink the destination
+OR = const(2)
+XOR = const(3)
+
+_p = array('i', [0] * 12)
+
+# python kernels, same arguments and results as the ones of epd_viper
+
+_INVERSE = None
+if hasattr(bytes, 'translate'):
+    _INVERSE = bytes(255 - v for v in range(256))
+
+def _py_invert(buf, start, end):
+    if _INVERSE is not None and hasattr(buf, 'translate'):
+        buf[start:end] = buf[start:end].translate(_INVERSE)
+        return
+    for i in range(start, end):
+        buf[i] ^= 0xFF
+
+def _py_diff_rows(a, b, p):
+    stride = p[0]
+    top = 0
+    bottom = p[1]
+    i = 0
+    while top < bottom and a[i:i + stride] == b[i:i + stride]:
+        top += 1
+        i += stride
+    if top == bottom:
+        p[2] = -1
+        return -1
+    i = (bottom - 1) * stride
+    while a[i:i + stride] == b[i:i + stride]:
+        bottom -= 1
+        i -= stride
+    p[2] = top
+    p[3] = bottom
+    return top
+
+def _py_xor_diff(a, b, out, p):
+    stride = p[0]
+    write = p[2]
+    top = -1
+    bottom = 0
+    left = stride
+    right = 0
+    for y in range(p[1]):
+        i = y * stride
+        if a[i:i + stride] == b[i:i + stride]:
+            if write:
+                out[i:i + stride] = bytes(stride)
+            continue
+        if top < 0:
+            top = y
+        bottom = y + 1
+        for c in range(stride):
+            v = a[i + c] ^ b[i + c]
+            if write:
+                out[i + c] = v
+            if v:
+                if c < left:
+                    left = c
+                if c >= right:
+                    right = c + 1
+    p[3] = top
+    p[4] = bottom
+    p[5] = left
+    p[6] = right
+    return top
+
+def _py_blit(dst, src, p):
+    dx, dy, dstride, sx, sy, sstride, w, h, op = p[0], p[1], p[2], p[3], p[4], p[5], p[6], p[7], p[8]
+    first = dx >> 3
+    last = (dx + w - 1) >> 3
+    for row in range(h):
+        drow = (dy + row) * dstride
+        srow = (sy + row) * sstride
+        for c in range(first, last + 1):
+            x0 = c << 3
+            m = 0xFF
+            if x0 < dx:
+                m = 0xFF >> (dx - x0)
+            if x0 + 8 > dx + w:
+                m &= 0xFF << (x0 + 8 - dx - w)
+            sb = sx + x0 - dx
+            bi = sb >> 3
+            v = 0
+            if 0 <= bi < sstride:
+                v = src[srow + bi] << 8
+            if 0 <= bi + 1 < sstride:
+                v |= src[srow + bi + 1]
+            v = (v << (sb & 7)) >> 8 & m
+            i = drow + c
+            if op == COPY:
+                dst[i] = (dst[i] & (m ^ 0xFF)) | v
+            elif op == AND:
+                dst[i] &= v | (m ^ 0xFF)
+            elif op == OR:
+                dst[i] |= v
+            else:
+                dst[i] ^= v
+
+def _py_scroll_h(buf, p):
+    stride, height, dx, fill = p[0], p[1], p[2], p[3]
+    n = abs(dx)
+    k = n >> 3
+    r = n & 7
+    pad = bytes([fill]) * min(k, stride)
+    for base in range(0, height * stride, stride):
+        # whole bytes by slices, then the bits left
+        if dx >= 0:
+            buf[base + k:base + stride] = buf[base:base + stride - k]
+            buf[base:base + len(pad)] = pad
+            if r:
+                for i in range(base + stride - 1, base, -1):
+                    buf[i] = ((buf[i - 1] << 8) | buf[i]) >> r & 0xFF
+                buf[base] = ((fill << 8) | buf[base]) >> r & 0xFF
+        else:
+            buf[base:base + stride - k] = buf[base + k:base + stride]
+            buf[base + stride - len(pad):base + stride] = pad
+            if r:
+                for i in range(base, base + stride - 1):
+                    buf[i] = ((buf[i] << 8) | buf[i + 1]) << r >> 8 & 0xFF
+                i = base + stride - 1
+                buf[i] = ((buf[i] << 8) | fill) << r >> 8 & 0xFF
+
+def _py_scroll_v(buf, p):
+    stride, height, dy, fill = p[0], p[1], p[2], p[3]
+    size = height * stride
+    shift = min(abs(dy), height) * stride
+    if dy >= 0:
+        buf[shift:size] = buf[0:size - shift]
+        buf[0:shift] = bytes([fill]) * shift
+    else:
+        buf[0:size - shift] = buf[shift:size]
+        buf[size - shift:size] = bytes([fill]) * shift
+
+VIPER = False
+if sys.implementation.name == 'micropython':
+    try:
+        import epd_viper
+        VIPER = True
+    except (ImportError, SyntaxError):
+        # no native code emitter on this port
+        pass
+
+if VIPER:
+    _invert = epd_viper.invert
+    _diff_rows = epd_viper.diff_rows
+    _xor_diff = epd_viper.xor_diff
+    _blit = epd_viper.blit
+    _scroll_h = epd_viper.scroll_h
+    _scroll_v = epd_viper.scroll_v
+else:
+    _invert = _py_invert
+    _diff_rows = _py_diff_rows
+    _xor_diff = _py_xor_diff
+    _blit = _py_blit
+    _scroll_h = _py_scroll_h
+    _scroll_v = _py_scroll_v
+
+# invert the pixels of buf, or of its bytes from start to end
+def invert(buf, start=0, end=None):
+    _invert(buf, start, len(buf) if end is None else end)
+
+# (top, bottom) of the rows of two frames that differ, bottom exclusive,
+# None if they are equal
+def diff_rows(a, b, stride, height):
+    p = _p
+    p[0] = stride
+    p[1] = height
+    if _diff_rows(a, b, p) < 0:
+        return None
+    return p[2], p[3]
+
+# the (x, y, w, h) box of the pixels that differ between two frames, x and
+# w in whole bytes, None if they are equal. With out, a buffer of the same
+# size, out receives a ^ b
+def xor_diff(a, b, stride, height, out=None):
+    p = _p
+    p[0] = stride
+    p[1] = height
+    p[2] = 1 if out is not None else 0
+    if _xor_diff(a, b, a if out is None else out, p) < 0:
+        return None
+    return p[5] * 8, p[3], (p[6] - p[5]) * 8, p[4] - p[3]
+
+# combine w x h pixels of src, rows of sstride bytes, from sx, sy into dst,
+# rows of dstride bytes, at dx, dy with op COPY, AND, OR or XOR. Any bit
+# alignment, clipped to dst; byte aligned copies go row by row as slices
+def blit(dst, dstride, dx, dy, src, sstride, w, h, sx=0, sy=0, op=COPY):
+    if dx < 0:
+        sx -= dx
+        w += dx
+        dx = 0
+    if dy < 0:
+        sy -= dy
+        h += dy
+        dy = 0
+    w = min(w, dstride * 8 - dx, sstride * 8 - sx)
+    h = min(h, len(dst) // dstride - dy, len(src) // sstride - sy)
+    if w <= 0 or h <= 0:
+        return
+    if op == COPY and not (dx | sx | w) & 7:
+        d = memoryview(dst)
+        s = memoryview(src)
+        bw = w >> 3
+        di = dy * dstride + (dx >> 3)
+        si = sy * sstride + (sx >> 3)
+        for row in range(h):
+            d[di:di + bw] = s[si:si + bw]
+            di += dstride
+            si += sstride
+        return
+    p = _p
+    p[0] = dx
+    p[1] = dy
+    p[2] = dstride
+    p[3] = sx
+    p[4] = sy
+    p[5] = sstride
+    p[6] = w
+    p[7] = h
+    p[8] = op
+    _blit(dst, src, p)
+
+# move the pixels of every row dx to the right, to the left when negative,
+# the uncovered pixels white, or black with fill=0
+def scroll_h(buf, stride, height, dx, fill=0xFF):
+    if not dx:
+        return
+    p = _p
+    p[0] = stride
+    p[1] = height
+    p[2] = max(-8 * stride, min(dx, 8 * stride))
+    p[3] = fill
+    _scroll_h(buf, p)
+
+# move the rows dy rows down, up when negative, the uncovered rows white,
+# or black with fill=0
+def scroll_v(buf, stride, height, dy, fill=0xFF):
+    if not dy:
+        return
+    p = _p
+    p[0] = stride
+    p[1] = height
+    p[2] = max(-height, min(dy, height))
+    p[3] = fill
+    _scroll_v(buf, p)
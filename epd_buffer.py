@@ -0,0 +1,128 @@
+"""
+Double buffered frames for the EPD drivers
+
+    frames = epd_buffer.DoubleBuffer(epd)
+    fb = frames.back_fb                  # framebuf.FrameBuffer, MONO_HLSB
+    fb.text('12:34', 80, 90, 0)
+    frames.mark(80, 90, 40, 8)           # area drawn since the last present
+    frames.present()
+
+The two frame buffers are allocated once. present() swaps them without
+copying, the frame just drawn becomes the front buffer and goes to the
+display as a memoryview, while the app draws the next frame into the other
+one. With keep=True (the default) the rows presented are copied into the
+new back buffer so it holds the shown frame again, apps that redraw the
+whole frame every time can pass keep=False and skip the copy.
+
+In UPDATE_PART mode of EPD_154_D67 only the marked rows are sent, through
+set_frame_memory_part and refresh, other modes send the whole frame.
+"""
+from micropython import const
+try:
+    import framebuf
+except ImportError:
+    framebuf = None
+
+UPDATE_PART = const(1)
+
+class DoubleBuffer:
+    def __init__(self, epd, keep=True):
+        self.epd = epd
+        self.width = epd.width
+        self.height = epd.height
+        self.stride = self.width // 8
+        self.keep = keep
+        size = self.stride * self.height
+        self._bufs = (bytearray(b'\xff' * size), bytearray(b'\xff' * size))
+        self._mvs = (memoryview(self._bufs[0]), memoryview(self._bufs[1]))
+        if framebuf:
+            self._fbs = tuple(framebuf.FrameBuffer(b, self.width, self.height, framebuf.MONO_HLSB) for b in self._bufs)
+        else:
+            self._fbs = (None, None)
+        self._back = 0
+        self._rows = None # (top, bottom) rows marked in the back buffer
+        self._shown = False
+
+    # buffer the app draws into
+    @property
+    def back(self):
+        return self._bufs[self._back]
+
+    @property
+    def back_fb(self):
+        return self._fbs[self._back]
+
+    # buffer last presented
+    @property
+    def front(self):
+        return self._bufs[self._back ^ 1]
+
+    # record an area drawn in the back buffer
+    def mark(self, x, y, w, h):
+        top = max(y, 0)
+        bottom = min(y + h, self.height)
+        if bottom <= top:
+            return
+        if self._rows is not None:
+            top = min(top, self._rows[0])
+            bottom = max(bottom, self._rows[1])
+        self._rows = (top, bottom)
+
+    # swap front and back buffers, returns the rows (top, bottom) to send,
+    # the whole frame if nothing was marked or nothing was shown yet
+    def swap(self):
+        rows = self._rows
+        if rows is None or not self._shown:
+            rows = (0, self.height)
+        self._rows = None
+        self._back ^= 1
+        if self.keep:
+            i = rows[0] * self.stride
+            j = rows[1] * self.stride
+            self._mvs[self._back][i:j] = self._mvs[self._back ^ 1][i:j]
+        return rows
+
+    # the marked rows of the front buffer as a zero copy image and window
+    def _window(self, rows):
+        top, bottom = rows
+        mv = self._mvs[self._back ^ 1]
+        return mv[top * self.stride:bottom * self.stride], top, bottom - top
+
+    def _partial(self):
+        epd = self.epd
+        return self._shown and epd.update_mode == UPDATE_PART and not epd.refresh_on_write
+
+    # swap and show the new front buffer
+    def present(self):
+        epd = self.epd
+        partial = self._partial()
+        rows = self.swap()
+        self._shown = True
+        if partial:
+            image, y, h = self._window(rows)
+            epd.set_frame_memory_part(image, 0, y, self.width, h)
+            epd.refresh(0, y, self.width, h)
+            return
+        epd.set_frame_memory(self._mvs[self._back ^ 1], 0, 0, self.width, self.height)
+        if not epd.refresh_on_write:
+            epd.display_frame()
+
+    # like present, the app can draw into the back buffer while the panel
+    # refreshes
+    async def present_async(self):
+        epd = self.epd
+        partial = self._partial()
+        rows = self.swap()
+        self._shown = True
+        if partial:
+            image, y, h = self._window(rows)
+            epd.set_frame_memory_part(image, 0, y, self.width, h)
+            epd.set_ram_area(0, y, self.width, h)
+            await epd.display_frame_async()
+            return
+        front = self._mvs[self._back ^ 1]
+        if epd.refresh_on_write:
+            await epd.set_frame_memory_async(front, 0, 0, self.width, self.height)
+        else:
+            epd.set_frame_memory(front, 0, 0, self.width, self.height)
+            await epd.display_frame_async()
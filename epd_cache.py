@@ -0,0 +1,168 @@
+"""
+Decoded tile cache and panel RAM shadow for the EPD drivers
+
+    tiles = epd_cache.TileCache(epd, budget=8192)
+    tiles.show_asset(menu)                       # epd_asset.Asset
+    tiles.place('wifi', 176, 0, 24, 24, wifi_icon)
+    tiles.place('splash', 0, 0, 200, 200, cat.image)
+    tiles.display()
+
+Tiles are identified by a key, any hashable value, and decoded by a
+function returning their image bytes the first time they are needed. The
+decoded images are kept in RAM up to budget bytes, the least recently used
+are dropped first; images larger than the budget are never kept.
+
+The cache also remembers which tile each area of panel RAM holds. Placing a
+tile where the same tile already is skips decoding and writing it, so a
+screen shown again only sends the tiles that differ. Writes to the display
+that bypass the cache must be reported with invalidate(), the shadow is
+dropped by itself when the display rotates or hibernates losing its RAM.
+"""
+from micropython import const
+
+# update modes of EPD_154_D67 that refresh a window
+UPDATE_PART = const(1)
+UPDATE_DIFF = const(3)
+
+# bounding box of two (x, y, w, h) areas
+def union_area(a, b):
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    return x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y
+
+# show an (x, y, w, h) area written to panel RAM, None shows nothing. Only
+# the area is refreshed in the partial update mode of D67, M09 refreshes
+# on each write
+def refresh_area(epd, box):
+    if box is None or epd.refresh_on_write:
+        return
+    if epd.update_mode == UPDATE_PART:
+        epd.refresh(*box)
+    else:
+        epd.display_frame()
+
+# write the w x h image read from source, a function returning an iterable
+# of byte chunks, to panel RAM at x, y. The image is streamed, except on M09
+# rotated by 90 or 270 degrees which cannot stream and gets it whole
+def write_rows(epd, source, x, y, w, h):
+    if epd.refresh_on_write and epd._swap:
+        image = bytearray()
+        for chunk in source():
+            image += chunk
+        epd.set_frame_memory(image, x, y, w, h)
+    else:
+        epd.set_frame_memory_stream(source, x, y, w, h)
+
+class TileCache:
+    def __init__(self, epd, budget=8192):
+        self.epd = epd
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._tiles = {}   # key: [image, last use]
+        self._tick = 0
+        self._placed = {}  # (x, y, w, h): key of the tile in panel RAM
+        self._view = None  # rotation and mirroring the shadow is valid for
+        self._ram = None   # epd.ram_generation the shadow is valid for
+        self._box = None   # area written since the last display()
+
+    # decoded image of a tile, decode() is called on a miss
+    def get(self, key, decode):
+        self._tick += 1
+        entry = self._tiles.get(key)
+        if entry is not None:
+            entry[1] = self._tick
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        image = decode()
+        size = len(image)
+        if size <= self.budget:
+            self._evict(self.budget - size)
+            self._tiles[key] = [image, self._tick]
+            self.used += size
+        return image
+
+    # drop least recently used tiles until at most limit bytes are kept
+    def _evict(self, limit):
+        tiles = self._tiles
+        while self.used > limit:
+            oldest = None
+            for key in tiles:
+                if oldest is None or tiles[key][1] < tiles[oldest][1]:
+                    oldest = key
+            self.used -= len(tiles.pop(oldest)[0])
+
+    # remove a tile from the cache, or every tile if key is None
+    def forget(self, key=None):
+        if key is None:
+            self._tiles = {}
+            self.used = 0
+        elif key in self._tiles:
+            self.used -= len(self._tiles.pop(key)[0])
+
+    # forget what panel RAM holds in an area, the whole panel by default
+    def invalidate(self, x=0, y=0, w=None, h=None):
+        if w is None and h is None and not x and not y:
+            self._placed = {}
+            return
+        if w is None:
+            w = self.epd.width - x
+        if h is None:
+            h = self.epd.height - y
+        self._drop(x, y, w, h)
+
+    # forget the tiles of panel RAM overlapping an area
+    def _drop(self, x, y, w, h):
+        placed = self._placed
+        for area in [a for a in placed if a[0] < x + w and x < a[0] + a[2] and a[1] < y + h and y < a[1] + a[3]]:
+            del placed[area]
+
+    # drop the shadow when panel RAM may have changed behind our back
+    def _check_view(self):
+        epd = self.epd
+        view = (epd.rotation, epd.mirror)
+        if epd.ram_generation != self._ram or view != self._view:
+            self._placed = {}
+            self._view = view
+            self._ram = epd.ram_generation
+
+    # write a tile to panel RAM at x, y unless it is already there, returns
+    # True if it was written. D67 needs display() afterwards, M09 refreshes
+    # on each write
+    def place(self, key, x, y, w, h, decode):
+        self._check_view()
+        area = (x, y, w, h)
+        if self._placed.get(area) == key:
+            self.skipped += 1
+            return False
+        image = self.get(key, decode)
+        self._drop(x, y, w, h)
+        self.epd.set_frame_memory(image, x, y, w, h)
+        # the write may have reset the controller
+        if self.epd.ram_generation != self._ram:
+            self._placed = {}
+            self._ram = self.epd.ram_generation
+        self._placed[area] = key
+        self._box = area if self._box is None else union_area(self._box, area)
+        return True
+
+    # place every tile of an epd_asset.Asset with its top left corner at
+    # x, y and show them, returns the number of tiles written
+    def show_asset(self, asset, x=0, y=0):
+        n = 0
+        for i in range(asset.count):
+            tx, ty, w, h = asset.tile_rect(i)
+            if self.place((asset, i), x + tx, y + ty, w, h, lambda i=i: asset.tile(i)):
+                n += 1
+        self.display()
+        return n
+
+    # refresh the display if tiles were written since the last call, only
+    # their area in the partial update modes of D67
+    def display(self):
+        box = self._box
+        self._box = None
+        refresh_area(self.epd, box)
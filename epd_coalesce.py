@@ -0,0 +1,132 @@
+"""
+Frame coalescing for the EPD drivers (EPD_154_D67 and EPD_154_M09)
+
+    frames = epd_coalesce.Coalescer(epd, max_rate=0.5)
+    asyncio.create_task(frames.run())
+    ...
+    frames.submit(buf, 0, 40, 200, 16)   # returns at once
+
+Producers submit full frames with the area they changed. Nothing blocks:
+a submission replaces any frame still pending (latest wins) and its area is
+merged into the pending dirty area. The run() task sends the pending frame
+when the panel is free and at most max_rate times a second, so a burst of
+submissions while the panel refreshes costs one more refresh, not one each.
+
+Loops without uasyncio call poll() instead, which sends the pending frame
+if the rate allows and returns whether it did.
+
+On D67 in UPDATE_PART or UPDATE_DIFF mode only the dirty area is written
+and refreshed, other modes and M09 write and refresh the whole frame.
+"""
+from micropython import const
+from time import ticks_ms, ticks_diff
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# update modes of EPD_154_D67 that can refresh just the dirty area
+UPDATE_PART = const(1)
+UPDATE_DIFF = const(3)
+
+class Coalescer:
+    # max_rate: frames sent per second at most, 0 for no limit
+    def __init__(self, epd, max_rate=1):
+        self.epd = epd
+        self.min_interval = int(1000 / max_rate) if max_rate else 0
+        self.submitted = 0
+        self.sent = 0
+        self._image = None
+        self._area = None
+        self._last = None
+        self._event = asyncio.Event()
+
+    # frames submitted but never sent because a later one replaced them
+    @property
+    def dropped(self):
+        return self.submitted - self.sent - (self._image is not None)
+
+    @property
+    def pending(self):
+        return self._image is not None
+
+    # queue a full frame whose (x, y, w, h) area changed, the whole frame if
+    # no area is given
+    def submit(self, image, x=0, y=0, w=None, h=None):
+        epd = self.epd
+        if w is None:
+            w = epd.width - x
+        if h is None:
+            h = epd.height - y
+        area = (x, y, w, h)
+        if self._image is not None and self._area is not None:
+            a = self._area
+            x0 = min(a[0], x)
+            y0 = min(a[1], y)
+            area = (x0, y0, max(a[0] + a[2], x + w) - x0, max(a[1] + a[3], y + h) - y0)
+        self._image = image
+        self._area = area
+        self.submitted += 1
+        self._event.set()
+
+    # ms to wait before the next frame may be sent
+    def _delay(self):
+        if self._last is None:
+            return 0
+        return max(0, self.min_interval - ticks_diff(ticks_ms(), self._last))
+
+    # take the pending frame, queueing its dirty area on the display when
+    # only that area needs to be sent, the first frame is always sent whole
+    def _take(self):
+        image = self._image
+        x, y, w, h = self._area
+        first = self._last is None
+        self._image = None
+        self._area = None
+        self._last = ticks_ms()
+        self.sent += 1
+        epd = self.epd
+        if (not first and hasattr(epd, 'flush') and epd.update_mode in (UPDATE_PART, UPDATE_DIFF)
+                and (w < epd.width or h < epd.height)):
+            epd.add_dirty(x, y, w, h)
+            return image, True
+        return image, False
+
+    # send the pending frame if there is one and the rate allows it,
+    # returns True if a frame was sent
+    def poll(self):
+        if self._image is None or self._delay():
+            return False
+        image, dirty = self._take()
+        epd = self.epd
+        if dirty:
+            epd.flush(image)
+        else:
+            epd.set_frame_memory(image, 0, 0, epd.width, epd.height)
+            if not epd.refresh_on_write:
+                epd.display_frame()
+        return True
+
+    # send the pending frame, waiting for the rate limit without blocking
+    async def flush(self):
+        if self._image is None:
+            return
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        image, dirty = self._take()
+        epd = self.epd
+        if dirty:
+            await epd.flush_async(image)
+        elif epd.refresh_on_write:
+            await epd.set_frame_memory_async(image, 0, 0, epd.width, epd.height)
+        else:
+            epd.set_frame_memory(image, 0, 0, epd.width, epd.height)
+            await epd.display_frame_async()
+
+    # uasyncio task sending submitted frames
+    async def run(self):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            await self.flush()
@@ -0,0 +1,426 @@
+"""
+Shared core of the 1.54" EPD drivers (EPD_154_D67 and EPD_154_M09)
+
+EPDCore holds what does not depend on the controller: the SPI transport
+(commands, data, fills and compiled command sequences under one chip
+select), busy waits that learn each update mode's refresh time, resets,
+power state, window math, rotation bookkeeping and streamed images.
+
+A driver subclasses it with a controller profile, class attributes read by
+the core:
+
+    busy_level     level of the BUSY pin while the controller is busy
+    busy_timeout   least ms a wait polls the BUSY pin, waits of refreshes
+                   only until their duration is learned, 0 for the time
+                   the driver passes
+    reset_ms       (low, settle) times of a hardware reset
+    seq_power_on   compiled sequences switching the panel power on and
+    seq_power_off  off, then waited for up to power_ms (on, off)
+    seq_sleep      compiled sequence entering deep sleep, then slept for
+    sleep_wait     (delay, wait) ms and waited for idle up to wait ms
+
+and its own init sequences, LUTs and RAM layout. A panel variant of an
+existing controller is a subclass replacing these tables.
+"""
+from micropython import const
+from time import sleep_ms, ticks_ms, ticks_diff
+
+# Display resolution
+EPD_WIDTH  = const(200)
+EPD_HEIGHT = const(200)
+EPD_ARRAY = const(5000)
+MAX_X     = const(24)
+MAX_Y     = const(199)
+
+FILL_CHUNK = const(128) # bytes per write when filling RAM with one value
+
+NORMAL                             = const(0x1)
+INVERTED                           = const(0x2)
+UPDATE_FULL                        = const(0x0)
+UPDATE_PART                        = const(0x1)
+# (swap, flip x, flip y) of the panel RAM for a rotation of 0, 90, 180 and
+# 270 degrees clockwise, mirroring toggles flip x
+ROTATIONS = ((0, 0, 0), (1, 1, 0), (0, 1, 1), (1, 0, 1))
+
+# command sequences are records of command, flags, payload length and
+# payload, flags SEQ_WAIT | t wait for idle up to t ms after the command,
+# other non zero flags sleep that many ms
+SEQ_WAIT                           = const(0x80)
+SEQ_TIME                           = const(0x7F)
+
+# compile (command, payload, flags) records into a command sequence
+def compile_sequence(*records):
+    seq = bytearray()
+    for command, data, flags in records:
+        seq.append(command)
+        seq.append(flags)
+        seq.append(len(data))
+        seq.extend(data)
+    return bytes(seq)
+
+# an image read from a stream by set_frame_memory_stream: a file,
+# deflate.DeflateIO or anything with readinto, an iterable of byte chunks
+# such as a generator of rows, or a function returning one of these
+class Stream:
+    def __init__(self, source):
+        self.source = source
+        self.start = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.start = 0
+        elif not callable(source) and hasattr(source, 'seek'):
+            self.start = source.tell()
+        self.opened = False
+
+    # whether the image can be read more than once
+    def reopenable(self):
+        return callable(self.source) or self.start is not None
+
+    # readinto of the image, from its start
+    def open(self):
+        source = self.source
+        if callable(source):
+            source = source()
+        elif self.opened and hasattr(source, 'seek'):
+            source.seek(self.start)
+        self.opened = True
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = (source,)
+        if hasattr(source, 'readinto'):
+            return source.readinto
+        return ChunkReader(source).readinto
+
+# readinto over an iterable of byte chunks
+class ChunkReader:
+    def __init__(self, chunks):
+        self._it = iter(chunks)
+        self._chunk = b''
+        self._pos = 0
+
+    def readinto(self, buf):
+        n = 0
+        while n < len(buf):
+            if self._pos >= len(self._chunk):
+                try:
+                    self._chunk = next(self._it)
+                except StopIteration:
+                    break
+                self._pos = 0
+            k = min(len(buf) - n, len(self._chunk) - self._pos)
+            buf[n:n + k] = self._chunk[self._pos:self._pos + k]
+            self._pos += k
+            n += k
+        return n
+
+# fill buf from readinto, returns the bytes read, fewer only at the end of
+# the stream
+def read_full(readinto, buf):
+    n = 0
+    while n < len(buf):
+        k = readinto(buf[n:])
+        if not k:
+            break
+        n += k
+    return n
+
+# uasyncio sleep, imported on first use so the drivers run without it
+async def sleep_ms_async(ms):
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    await asyncio.sleep(ms / 1000)
+
+class EPDCore:
+    width = EPD_WIDTH
+    height = EPD_HEIGHT
+    busy_level = 1
+    busy_timeout = 0
+    reset_ms = (200, 20)
+    seq_power_on = b''
+    seq_power_off = b''
+    power_ms = (100, 150)
+    seq_sleep = b''
+    sleep_wait = (0, 0)
+
+    def __init__(self, spi, cs=None, dc=None, rst=None, busy=None):
+        self.spi = spi
+        self.cs = cs
+        self.dc = dc
+        self.rst = rst
+        self.busy = busy
+        if cs:
+            self.cs.init(self.cs.OUT, value=0)
+        self.dc.init(self.dc.OUT, value=0)
+        self.rst.init(self.rst.OUT, value=1)
+        if busy:
+            self.busy.init(self.busy.IN)
+        # preallocated command and fill buffers, so that commands and RAM
+        # writes do not allocate
+        self._cmd = bytearray(1)
+        self._fill_buf = bytearray(FILL_CHUNK)
+        self._fill_value = 0
+        # band of 8 rows of a streamed image
+        self._band = bytearray(self.width)
+        self._rotate = None
+        self._swap = 0
+        self.rotation = 0
+        self.mirror = False
+        self.orientation = NORMAL
+        self._hibernating = True
+        self._init_mode = None
+        self._power_is_on = False
+        self._using_partial_mode = False
+        self._initial_refresh = True
+        self._part_update_counter = 0
+        # whether RAM survived the last hibernate
+        self.ram_retained = False
+        # counts the times controller RAM was lost, by a deep sleep that does
+        # not retain it or a hardware reset. Code remembering what RAM holds
+        # compares it with the value it saw when writing
+        self.ram_generation = 0
+        # learned refresh duration in ms of each update mode, 0 until measured
+        # with a busy pin, can be preset for panels without one
+        self.busy_time = [0, 0, 0]
+
+    # send command and data(if any) to display
+    def _command(self, command, data=None):
+        if self.dc:
+            self.dc(0)
+        if self.cs:
+            self.cs(0)
+        self._cmd[0] = command
+        self.spi.write(self._cmd)
+        if self.cs:
+            self.cs(1)
+        if data is not None:
+            self._data(data)
+
+    # send data to display
+    def _data(self, data):
+        if self.dc:
+            self.dc(1)
+        if self.cs:
+            self.cs(0)
+        self.spi.write(data)
+        if self.cs:
+            self.cs(1)
+
+    # send count bytes of value as data in FILL_CHUNK sized writes from the
+    # reusable fill buffer, under a single chip select
+    def _fill(self, value, count):
+        buf = self._fill_buf
+        if self._fill_value != value:
+            for i in range(FILL_CHUNK):
+                buf[i] = value
+            self._fill_value = value
+        if self.dc:
+            self.dc(1)
+        if self.cs:
+            self.cs(0)
+        while count >= FILL_CHUNK:
+            self.spi.write(buf)
+            count -= FILL_CHUNK
+        if count:
+            self.spi.write(memoryview(buf)[:count])
+        if self.cs:
+            self.cs(1)
+
+    # play a compiled command sequence in one loop, chip select stays low
+    # except while sleeping or waiting for idle
+    def _run_sequence(self, seq):
+        mv = memoryview(seq)
+        spi = self.spi
+        cmd = self._cmd
+        dc = self.dc
+        cs = self.cs
+        n = len(seq)
+        i = 0
+        if cs:
+            cs(0)
+        while i < n:
+            cmd[0] = seq[i]
+            flags = seq[i + 1]
+            length = seq[i + 2]
+            i += 3
+            dc(0)
+            spi.write(cmd)
+            if length:
+                dc(1)
+                spi.write(mv[i:i + length])
+                i += length
+            if flags:
+                if cs:
+                    cs(1)
+                if flags & SEQ_WAIT:
+                    self.wait_until_idle(flags & SEQ_TIME)
+                else:
+                    sleep_ms(flags)
+                if cs:
+                    cs(0)
+        if cs:
+            cs(1)
+
+    # wait for idle state, polling the busy pin every millisecond, or for the
+    # specified time when no busy pin is wired. Waits for a refresh pass the
+    # update mode so the measured duration is learned in busy_time: later
+    # waits sleep through most of it before polling, time out at twice it
+    # and, without a busy pin, wait exactly that long. A wait timing out
+    # learns the time it waited, so the next one waits longer. Returns False
+    # when it timed out with the panel still busy
+    def wait_until_idle(self, t= 2200, mode= None):
+        t = self._busy_timeout(t, mode)
+        if not self.busy:
+            sleep_ms(t)
+            return True
+        start = ticks_ms()
+        if mode is not None and self.busy_time[mode]:
+            sleep_ms(self.busy_time[mode] * 3 // 4)
+        while self.busy.value() == self.busy_level:
+            if ticks_diff(ticks_ms(), start) >= t:
+                self._busy_learn(mode, t)
+                return False
+            sleep_ms(1)
+        self._busy_learn(mode, ticks_diff(ticks_ms(), start))
+        return True
+
+    # wait for idle state or specified time without blocking other uasyncio
+    # tasks, a timed wait when no busy pin is wired
+    async def wait_idle_async(self, t= 2200, mode= None):
+        t = self._busy_timeout(t, mode)
+        if not self.busy:
+            await sleep_ms_async(t)
+            return True
+        start = ticks_ms()
+        if mode is not None and self.busy_time[mode]:
+            await sleep_ms_async(self.busy_time[mode] * 3 // 4)
+        while self.busy.value() == self.busy_level:
+            if ticks_diff(ticks_ms(), start) >= t:
+                self._busy_learn(mode, t)
+                return False
+            await sleep_ms_async(1)
+        self._busy_learn(mode, ticks_diff(ticks_ms(), start))
+        return True
+
+    def _busy_timeout(self, t, mode):
+        if mode is None or not self.busy_time[mode]:
+            return max(t, self.busy_timeout) if self.busy else t
+        if self.busy:
+            return self.busy_time[mode] * 2
+        return self.busy_time[mode]
+
+    def _busy_learn(self, mode, elapsed):
+        if mode is None:
+            return
+        if self.busy_time[mode]:
+            self.busy_time[mode] = (self.busy_time[mode] * 3 + elapsed) // 4
+        else:
+            self.busy_time[mode] = elapsed
+
+    # hard reset display
+    def reset(self):
+        self.rst(0)
+        sleep_ms(self.reset_ms[0])
+        self.rst(1)
+        sleep_ms(self.reset_ms[1])
+        if not (self._hibernating and self.ram_retained):
+            self.ram_generation += 1
+        self._hibernating = False
+
+    def power_on(self):
+        if (self._power_is_on is False):
+            self._run_sequence(self.seq_power_on)
+            self.wait_until_idle(self.power_ms[0])
+        self._power_is_on = True
+
+    def power_off(self):
+        if (self._power_is_on):
+            self._run_sequence(self.seq_power_off)
+            self.wait_until_idle(self.power_ms[1])
+        self._power_is_on = False
+        self._using_partial_mode = False
+
+    # power off and enter deep sleep through seq, returns False when the
+    # reset pin is held low and the controller cannot be woken again
+    def _deep_sleep(self, seq):
+        self.power_off()
+        if not self.rst.value():
+            return False
+        self._run_sequence(seq)
+        delay, wait = self.sleep_wait
+        if delay:
+            sleep_ms(delay)
+        if wait:
+            self.wait_until_idle(wait)
+        self._hibernating = True
+        self._init_mode = None
+        return True
+
+    # to wake call reset() or init()
+    def hibernate(self):
+        if self._deep_sleep(self.seq_sleep):
+            self.ram_generation += 1
+
+    # to wake call reset() or init()
+    def sleep(self):
+        self.hibernate()
+        # BUSY may stay asserted in deep sleep, nothing to poll
+        sleep_ms(10)
+
+    # NORMAL or INVERTED (rotated by 180 degrees)
+    def set_orientation(self, ori):
+        self.set_rotation(180 if ori == INVERTED else 0)
+
+    # record a rotation of 0, 90, 180 or 270 degrees clockwise, optionally
+    # mirrored, returns (swap, flip x, flip y) of the panel RAM for it
+    def _set_view(self, rotation, mirror):
+        swap, fx, fy = ROTATIONS[(rotation // 90) & 3]
+        if mirror:
+            fx ^= 1
+        self._swap = swap
+        self.rotation = (rotation // 90 & 3) * 90
+        self.mirror = mirror
+        self.orientation = INVERTED if self.rotation == 180 and not mirror else NORMAL
+        return swap, fx, fy
+
+    # load the epd_rotate tables when the image data has to be reordered
+    def _use_rotate(self, needed):
+        if needed:
+            import epd_rotate
+            self._rotate = epd_rotate
+        else:
+            self._rotate = None
+
+    # calc display coordinates
+    def calc_coords(self, x, y, w, h):
+        # x point must be the multiple of 8 or the last 3 bits will be ignored
+        x = x & 0xF8
+        w = w & 0xF8
+        if (x + w >= self.width):
+            x_end = self.width - 1
+        else:
+            x_end = x + w - 1
+        if (y + h >= self.height):
+            y_end = self.height - 1
+        else:
+            y_end = y + h - 1
+        return x, y, x_end, y_end
+
+    # send a w x h pixels image from readinto in bands of 8 rows, stops at
+    # the end of the stream, returns the bytes sent
+    def _stream_image(self, readinto, w, h):
+        bw = w // 8
+        band = memoryview(self._band)
+        sent = 0
+        for row in range(0, h, 8):
+            n = read_full(readinto, band[:min(8, h - row) * bw])
+            rows = n // bw
+            if rows:
+                self._send_band(band, bw, rows)
+                sent += rows * bw
+            if n < 8 * bw:
+                break
+        return sent
+
+    # send rows of bw bytes from the start of band as RAM data
+    def _send_band(self, band, bw, rows):
+        self._data(band[:bw * rows])
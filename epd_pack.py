@@ -0,0 +1,386 @@
+"""
+Pack PNG or PBM images into compressed screen assets for epd_asset (host
+side, CPython)
+
+    python epd_pack.py menu.png menu.epa
+    python epd_pack.py --tile 40x40 --codec auto *.png -o screens/
+    python epd_pack.py --py cat.png cat_asset.py      # a module to freeze
+    python epd_pack.py --font 6x8 --py sheet.pbm font6x8.py   # epd_text font
+
+Images are thresholded to 1 bpp, dark pixels black. Each tile is stored
+with the smallest of the codecs allowed by --codec, so tiles of flat
+background cost a few bytes and detailed ones are deflated. PNG is read
+with Pillow when installed, otherwise by the decoder below, which handles
+non interlaced 1 to 8 bit grayscale, RGB, palette and alpha images.
+
+With --font the image is a glyph sheet of WxH cells, left to right and
+top to bottom from character --first (32), packed into an epd_text font;
+--proportional trims each glyph to its inked columns.
+"""
+import struct
+import sys
+import zlib
+
+CODEC_RAW = 0
+CODEC_RLE = 1
+CODEC_DEFLATE = 2
+CODECS = {'raw': (CODEC_RAW,), 'rle': (CODEC_RLE,), 'deflate': (CODEC_DEFLATE,),
+          'auto': (CODEC_RAW, CODEC_RLE, CODEC_DEFLATE)}
+MAGIC = b'EPA1'
+FONT_MAGIC = b'EPF1'
+DEFLATE_WBITS = 9
+
+# an image as width, height and MONO_HLSB rows, 1 = white
+class Bitmap:
+    def __init__(self, width, height, data=None):
+        self.width = width
+        self.height = height
+        self.stride = (width + 7) // 8
+        self.data = bytearray(b'\xff' * (self.stride * height)) if data is None else bytearray(data)
+
+    # bytes of the (x, y, w, h) area, rows of (w + 7) // 8 bytes, x a
+    # multiple of 8
+    def area(self, x, y, w, h):
+        bw = (w + 7) // 8
+        out = bytearray()
+        for row in range(y, y + h):
+            i = row * self.stride + x // 8
+            out += self.data[i:i + bw]
+        # clear the padding bits past the image edge to white
+        if w % 8:
+            mask = 0xFF >> (w % 8)
+            for i in range(bw - 1, len(out), bw):
+                out[i] |= mask
+        return bytes(out)
+
+    # whether pixel x, y is black
+    def ink(self, x, y):
+        return not (self.data[y * self.stride + x // 8] >> (7 - x % 8)) & 1
+
+def _from_gray(width, height, gray, threshold, invert):
+    bitmap = Bitmap(width, height)
+    for y in range(height):
+        for x in range(width):
+            dark = gray[y * width + x] < threshold
+            if dark != invert:
+                bitmap.data[y * bitmap.stride + x // 8] &= ~(0x80 >> (x % 8))
+    return bitmap
+
+def read_pbm(path, invert=False):
+    with open(path, 'rb') as f:
+        data = f.read()
+    tokens = []
+    i = 0
+    # magic, width and height, skipping comments
+    while len(tokens) < 3:
+        while data[i:i + 1].isspace():
+            i += 1
+        if data[i:i + 1] == b'#':
+            while data[i:i + 1] not in (b'\n', b''):
+                i += 1
+            continue
+        j = i
+        while not data[j:j + 1].isspace():
+            j += 1
+        tokens.append(data[i:j])
+        i = j
+    magic, width, height = tokens[0], int(tokens[1]), int(tokens[2])
+    i += 1
+    bitmap = Bitmap(width, height)
+    if magic == b'P4':
+        # PBM is 1 for black, MONO_HLSB 1 for white
+        rows = data[i:i + bitmap.stride * height]
+        bitmap.data = bytearray(b ^ 0xFF for b in rows)
+    elif magic == b'P1':
+        bits = [c for c in data[i:] if c in b'01']
+        gray = bytes(0 if c == ord('1') else 255 for c in bits[:width * height])
+        return _from_gray(width, height, gray, 128, invert)
+    else:
+        raise ValueError('%s: not a PBM image' % path)
+    if invert:
+        bitmap.data = bytearray(b ^ 0xFF for b in bitmap.data)
+    return bitmap
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa = abs(p - a)
+    pb = abs(p - b)
+    pc = abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+# gray levels of a PNG without Pillow
+def _png_gray(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('%s: not a PNG image' % path)
+    i = 8
+    idat = b''
+    palette = None
+    while i < len(data):
+        length, kind = struct.unpack('>I4s', data[i:i + 8])
+        chunk = data[i + 8:i + 8 + length]
+        if kind == b'IHDR':
+            width, height, depth, color, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'PLTE':
+            palette = [sum(chunk[j:j + 3]) // 3 for j in range(0, len(chunk), 3)]
+        elif kind == b'IDAT':
+            idat += chunk
+        i += 12 + length
+    if interlace:
+        raise ValueError('%s: interlaced PNG, install Pillow' % path)
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color]
+    if depth == 16:
+        raise ValueError('%s: 16 bit PNG, install Pillow' % path)
+    bpp = max(1, channels * depth // 8)
+    row_bytes = (width * channels * depth + 7) // 8
+    raw = zlib.decompress(idat)
+    prev = bytearray(row_bytes)
+    gray = bytearray(width * height)
+    pos = 0
+    for y in range(height):
+        kind = raw[pos]
+        row = bytearray(raw[pos + 1:pos + 1 + row_bytes])
+        pos += 1 + row_bytes
+        for x in range(row_bytes):
+            a = row[x - bpp] if x >= bpp else 0
+            b = prev[x]
+            c = prev[x - bpp] if x >= bpp else 0
+            if kind == 1:
+                row[x] = (row[x] + a) & 0xFF
+            elif kind == 2:
+                row[x] = (row[x] + b) & 0xFF
+            elif kind == 3:
+                row[x] = (row[x] + (a + b) // 2) & 0xFF
+            elif kind == 4:
+                row[x] = (row[x] + _paeth(a, b, c)) & 0xFF
+        prev = row
+        for x in range(width):
+            if depth < 8:
+                per = 8 // depth
+                v = (row[x // per] >> ((per - 1 - x % per) * depth)) & ((1 << depth) - 1)
+                level = palette[v] if color == 3 else v * 255 // ((1 << depth) - 1)
+            else:
+                p = row[x * channels:(x + 1) * channels]
+                if color == 3:
+                    level = palette[p[0]]
+                elif color in (2, 6):
+                    level = sum(p[:3]) // 3
+                else:
+                    level = p[0]
+                if color in (4, 6):
+                    # blend with a white background
+                    alpha = p[-1]
+                    level = (level * alpha + 255 * (255 - alpha)) // 255
+            gray[y * width + x] = level
+    return width, height, gray
+
+def read_png(path, threshold=128, invert=False):
+    try:
+        from PIL import Image
+    except ImportError:
+        width, height, gray = _png_gray(path)
+    else:
+        img = Image.open(path).convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img).convert('L')
+        width, height = img.size
+        gray = img.tobytes()
+    return _from_gray(width, height, gray, threshold, invert)
+
+def read_image(path, threshold=128, invert=False):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic in (b'P1', b'P4'):
+        return read_pbm(path, invert)
+    return read_png(path, threshold, invert)
+
+def rle_encode(data):
+    out = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        # repeat run
+        j = i + 1
+        while j < n and j - i < 129 and data[j] == data[i]:
+            j += 1
+        if j - i >= 2:
+            out += bytes((j - i + 126, data[i]))
+            i = j
+            continue
+        # literal run up to the next repeat of 2 or more
+        j = i + 1
+        while j < n and j - i < 128 and not (j + 1 < n and data[j] == data[j + 1]):
+            j += 1
+        out.append(j - i - 1)
+        out += data[i:j]
+        i = j
+    return bytes(out)
+
+def deflate_encode(data):
+    c = zlib.compressobj(9, zlib.DEFLATED, -DEFLATE_WBITS)
+    return c.compress(data) + c.flush()
+
+def encode_tile(data, codecs):
+    best = None
+    for codec in codecs:
+        if codec == CODEC_RLE:
+            packed = rle_encode(data)
+        elif codec == CODEC_DEFLATE:
+            packed = deflate_encode(data)
+        else:
+            packed = data
+        if best is None or len(packed) < len(best[1]):
+            best = (codec, packed)
+    return best
+
+# the asset bytes of a bitmap, tiles of tile_w x tile_h, tile_w a multiple
+# of 8
+def pack(bitmap, tile_w=None, tile_h=40, codec='auto'):
+    if tile_w is None:
+        tile_w = bitmap.stride * 8
+    if tile_w % 8:
+        raise ValueError('tile width must be a multiple of 8')
+    codecs = CODECS[codec]
+    cols = (bitmap.width + tile_w - 1) // tile_w
+    rows = (bitmap.height + tile_h - 1) // tile_h
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            x = c * tile_w
+            y = r * tile_h
+            w = min(tile_w, bitmap.width - x)
+            h = min(tile_h, bitmap.height - y)
+            tiles.append(encode_tile(bitmap.area(x, y, w, h), codecs))
+    count = len(tiles)
+    out = bytearray(MAGIC + struct.pack('<HHHHH', bitmap.width, bitmap.height, tile_w, tile_h, count))
+    offset = len(out) + 7 * count
+    for codec_id, packed in tiles:
+        out += struct.pack('<IHB', offset, len(packed), codec_id)
+        offset += len(packed)
+    for codec_id, packed in tiles:
+        out += packed
+    return bytes(out)
+
+# the epd_text font bytes of a glyph sheet of cell_w x cell_h cells for
+# the characters from first on, every cell of the sheet is a glyph
+def pack_font(bitmap, cell_w, cell_h, first=32, proportional=False):
+    cols = bitmap.width // cell_w
+    count = cols * (bitmap.height // cell_h)
+    if not 0 < count <= 256 - first:
+        raise ValueError('sheet holds %d glyphs from %d' % (count, first))
+    glyphs = []
+    for g in range(count):
+        x0 = (g % cols) * cell_w
+        y0 = (g // cols) * cell_h
+        used = [c for c in range(cell_w) if any(bitmap.ink(x0 + c, y0 + r) for r in range(cell_h))]
+        if not proportional:
+            left, right = 0, cell_w
+        elif used:
+            left, right = used[0], used[-1] + 1
+        else:
+            # blank glyphs such as space keep half a cell
+            left, right = 0, max(1, cell_w // 2)
+        glyphs.append((x0 + left, y0, right - left))
+    width = sum(w for x, y, w in glyphs)
+    stride = (width + 7) // 8
+    atlas = bytearray(stride * cell_h)
+    offsets = [0]
+    for x0, y0, w in glyphs:
+        ax = offsets[-1]
+        for r in range(cell_h):
+            for c in range(w):
+                if bitmap.ink(x0 + c, y0 + r):
+                    atlas[r * stride + (ax + c) // 8] |= 0x80 >> ((ax + c) % 8)
+        offsets.append(ax + w)
+    spacing = 1 if proportional else 0
+    out = bytearray(FONT_MAGIC + struct.pack('<BBBBH', cell_h, first, first + count - 1, spacing, width))
+    for o in offsets:
+        out += struct.pack('<H', o)
+    return bytes(out + atlas)
+
+# a python module holding the asset, for freezing into the firmware
+def to_module(name, asset):
+    loader = 'epd_text.Font' if asset[:4] == FONT_MAGIC else 'epd_asset.Asset'
+    lines = ['# packed by epd_pack.py, load with %s(%s)' % (loader, name), '%s = (' % name]
+    for i in range(0, len(asset), 32):
+        lines.append('    %r' % asset[i:i + 32])
+    lines.append(')')
+    return '\n'.join(lines) + '\n'
+
+def _usage():
+    print(__doc__.strip())
+    print('\noptions: --tile WxH (default: image width x 40), --codec auto|raw|rle|deflate,\n'
+          '         --threshold 0-255, --invert, --py (write a python module), -o DIR,\n'
+          '         --font WxH (pack a glyph sheet), --first N, --proportional')
+    sys.exit(2)
+
+def main(argv):
+    tile_w = None
+    tile_h = 40
+    codec = 'auto'
+    threshold = 128
+    invert = False
+    module = False
+    out_dir = None
+    font = None
+    first = 32
+    proportional = False
+    paths = []
+    args = iter(argv)
+    for a in args:
+        if a == '--tile':
+            w, h = next(args).split('x')
+            tile_w, tile_h = int(w), int(h)
+        elif a == '--codec':
+            codec = next(args)
+        elif a == '--threshold':
+            threshold = int(next(args))
+        elif a == '--invert':
+            invert = True
+        elif a == '--py':
+            module = True
+        elif a == '-o':
+            out_dir = next(args)
+        elif a == '--font':
+            w, h = next(args).split('x')
+            font = (int(w), int(h))
+        elif a == '--first':
+            first = int(next(args))
+        elif a == '--proportional':
+            proportional = True
+        elif a.startswith('-'):
+            _usage()
+        else:
+            paths.append(a)
+    if codec not in CODECS or not paths:
+        _usage()
+    if out_dir is None:
+        if len(paths) != 2:
+            _usage()
+        jobs = [(paths[0], paths[1])]
+    else:
+        import os
+        ext = '.py' if module else '.epf' if font else '.epa'
+        jobs = [(p, os.path.join(out_dir, os.path.splitext(os.path.basename(p))[0] + ext)) for p in paths]
+    for src, dst in jobs:
+        bitmap = read_image(src, threshold, invert)
+        if font:
+            asset = pack_font(bitmap, font[0], font[1], first, proportional)
+        else:
+            asset = pack(bitmap, tile_w, tile_h, codec)
+        if module:
+            import os
+            name = os.path.splitext(os.path.basename(dst))[0].replace('-', '_')
+            with open(dst, 'w') as f:
+                f.write(to_module(name, asset))
+        else:
+            with open(dst, 'wb') as f:
+                f.write(asset)
+        print('%s: %dx%d, %d bytes -> %s, %d bytes' % (src, bitmap.width, bitmap.height,
+              len(bitmap.data), dst, len(asset)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
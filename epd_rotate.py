@@ -0,0 +1,62 @@
+"""
+Byte tables for rotated and mirrored frames of the EPD drivers
+
+Frames are MONO_HLSB, a byte holds 8 horizontal pixels, bit 7 the leftmost.
+Mirroring a row reverses the bits of each byte (REVERSE), rotating by 90 or
+270 degrees turns each 8x8 pixel block, 8 bytes one above the other, into 8
+bytes side by side (transpose8). The drivers import this module only when
+a rotation or mirroring that needs it is selected.
+"""
+
+# each byte value with its bits in reverse order
+REVERSE = bytes(int('{:08b}'.format(v)[::-1], 2) for v in range(256))
+
+# bit 7 - j of a byte moved to bit 8 * j of a packed word, for j in 0..2,
+# 3..5 and 6..7. Three tables keep the packed words, and the block rows
+# shifted into them, within small ints
+def _spread(first, last):
+    table = []
+    for v in range(256):
+        word = 0
+        for j in range(first, last + 1):
+            word |= ((v >> (7 - j)) & 1) << (8 * (j - first))
+        table.append(word)
+    return tuple(table)
+
+_T0 = _spread(0, 2)
+_T1 = _spread(3, 5)
+_T2 = _spread(6, 7)
+
+# transpose the 8x8 pixel block of the bytes src[i], src[i + stride], ...
+# src[i + 7 * stride] into dst[j], dst[j + dstride], ... dst[j + 7 * dstride].
+# Output byte t holds pixel column t of the block, with block row r in bit
+# 7 - r when msb is true (row 0 leftmost) or in bit r (row 0 rightmost)
+def transpose8(src, i, stride, dst, j, dstride, msb):
+    t0 = _T0
+    t1 = _T1
+    t2 = _T2
+    a0 = 0
+    a1 = 0
+    a2 = 0
+    for r in range(8):
+        v = src[i]
+        i += stride
+        s = 7 - r if msb else r
+        a0 |= t0[v] << s
+        a1 |= t1[v] << s
+        a2 |= t2[v] << s
+    dst[j] = a0 & 0xFF
+    j += dstride
+    dst[j] = (a0 >> 8) & 0xFF
+    j += dstride
+    dst[j] = a0 >> 16
+    j += dstride
+    dst[j] = a1 & 0xFF
+    j += dstride
+    dst[j] = (a1 >> 8) & 0xFF
+    j += dstride
+    dst[j] = a1 >> 16
+    j += dstride
+    dst[j] = a2 & 0xFF
+    j += dstride
+    dst[j] = a2 >> 8
@@ -0,0 +1,149 @@
+"""
+Ghosting aware refresh scheduling for the EPD drivers (EPD_154_D67 and
+EPD_154_M09)
+
+    sched = epd_scheduler.Scheduler(epd, budget=2.0)
+    mode = sched.show(buf)   # a full 200x200 frame
+
+The scheduler keeps the last frame it showed and, per 40x40 tile of the
+panel, a ghosting score: the pixels changed by partial refreshes since the
+tile was last cleaned. A new frame goes out as a partial refresh when no
+tile it changes would exceed the budget, otherwise as a fast refresh (D67)
+which cuts the scores to a residue, or as a full refresh which clears them.
+The budget is in tile rewrites, 2.0 allows every pixel of a tile to change
+twice between cleaning refreshes.
+"""
+from micropython import const
+
+# update modes, the same values in both drivers
+UPDATE_FULL = const(0)
+UPDATE_PART = const(1)
+UPDATE_FAST = const(2)
+
+TILE = const(40) # tile size in pixels, a multiple of 8
+TILE_PIXELS = const(1600)
+
+# set bits of each byte value
+_POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+class Scheduler:
+    # budget: ghosting score allowed per tile, in tile rewrites
+    # max_fast: fast refreshes allowed before a full one, 0 never uses fast
+    # fast_residue: a fast refresh divides the scores by this
+    # max_part: partial refreshes allowed in a row, 0 for no limit
+    def __init__(self, epd, budget=2.0, max_fast=4, fast_residue=4, max_part=0):
+        self.epd = epd
+        self.width = epd.width
+        self.height = epd.height
+        self.limit = int(budget * TILE_PIXELS)
+        self.max_fast = max_fast if UPDATE_FAST in epd.update_modes else 0
+        self.fast_residue = fast_residue
+        self.max_part = max_part
+        self.cols = (self.width + TILE - 1) // TILE
+        self.rows = (self.height + TILE - 1) // TILE
+        self.ghost = [0] * (self.cols * self.rows)
+        self._changed = [0] * (self.cols * self.rows)
+        self.fast_since_full = 0
+        self._last = None
+        # partial refreshes follow full and fast ones, the old image in D67
+        # RED RAM must follow all of them
+        if hasattr(epd, 'keep_old'):
+            epd.keep_old = True
+
+    # forget the shown frame, the next frame gets a full refresh
+    def invalidate(self):
+        self._last = None
+
+    # count the changed pixels of each tile into _changed, returns the total
+    def _count_changes(self, image):
+        last = self._last
+        changed = self._changed
+        stride = self.width // 8
+        tile_bytes = TILE // 8
+        cols = self.cols
+        pop = _POPCOUNT
+        for t in range(len(changed)):
+            changed[t] = 0
+        total = 0
+        for y in range(self.height):
+            row = y * stride
+            base = (y // TILE) * cols
+            for i in range(stride):
+                d = image[row + i] ^ last[row + i]
+                if d:
+                    n = pop[d]
+                    changed[base + i // tile_bytes] += n
+                    total += n
+        return total
+
+    # update mode for the next frame, None if it does not change anything
+    def choose(self, image):
+        if self._last is None:
+            return UPDATE_FULL
+        if not self._count_changes(image):
+            return None
+        counter = self.epd._part_update_counter
+        if not self.max_part or counter < self.max_part:
+            ghost = self.ghost
+            limit = self.limit
+            for t, n in enumerate(self._changed):
+                if n and ghost[t] + n > limit:
+                    break
+            else:
+                return UPDATE_PART
+        if self.fast_since_full < self.max_fast:
+            return UPDATE_FAST
+        return UPDATE_FULL
+
+    # record a refresh in the ghosting scores
+    def _account(self, mode, image):
+        ghost = self.ghost
+        if mode == UPDATE_PART:
+            for t, n in enumerate(self._changed):
+                ghost[t] += n
+        elif mode == UPDATE_FAST:
+            self.fast_since_full += 1
+            for t in range(len(ghost)):
+                ghost[t] //= self.fast_residue
+        else:
+            self.fast_since_full = 0
+            for t in range(len(ghost)):
+                ghost[t] = 0
+        if self._last is None:
+            self._last = bytearray(image)
+        else:
+            self._last[:] = image
+
+    def _prepare(self, image):
+        mode = self.choose(image)
+        if mode is not None and self.epd.update_mode != mode:
+            self.epd.set_update_mode(mode)
+        return mode
+
+    # show a full frame with the cheapest mode within the budget, returns
+    # the mode used or None if the frame did not change
+    def show(self, image):
+        mode = self._prepare(image)
+        if mode is None:
+            return None
+        epd = self.epd
+        epd.set_frame_memory(image, 0, 0, self.width, self.height)
+        if not epd.refresh_on_write:
+            epd.display_frame()
+        self._account(mode, image)
+        return mode
+
+    # show like show(), yielding to other uasyncio tasks while the panel
+    # refreshes
+    async def show_async(self, image):
+        mode = self._prepare(image)
+        if mode is None:
+            return None
+        epd = self.epd
+        if epd.refresh_on_write:
+            await epd.set_frame_memory_async(image, 0, 0, self.width, self.height)
+        else:
+            epd.set_frame_memory(image, 0, 0, self.width, self.height)
+            await epd.display_frame_async()
+        self._account(mode, image)
+        return mode
@@ -0,0 +1,196 @@
+"""
+Optional profiling of the EPD drivers (EPD_154_D67 and EPD_154_M09)
+
+    import epd_stats
+    stats = epd_stats.instrument(epd)
+    epd.set_frame_memory(buf, 0, 0, 200, 200)
+    epd.display_frame()
+    print(stats.as_dict())
+    epd_stats.uninstrument(epd)
+
+instrument() wraps the SPI bus and the init, wait and refresh methods of one
+EPD instance. The driver classes are not touched, a display that is not
+instrumented runs the same code as without this module.
+
+Times are in microseconds; init time includes the waits done while
+initializing, refresh waits count as wait time. The hook, if given, is
+called as hook(event, value): 'init' and 'wait' with the time spent, 'full',
+'part' and 'fast' with the time of that refresh and 'spi' with the number
+of bytes written.
+"""
+from time import ticks_us, ticks_diff
+
+# wrapped methods, the init methods of a driver may call each other
+_INIT = ('init', 'init_full', 'init_part', 'init_fast')
+_WAIT = ('wait_until_idle', 'wait_idle_async')
+_REFRESH = (
+    ('display_frame_full', 'full'),
+    ('display_frame_part', 'part'),
+    ('display_frame_fast', 'fast'),
+)
+# refresh kind of each D67 update mode, UPDATE_DIFF refreshes partially
+_D67_KINDS = ('full', 'part', 'fast', 'part')
+
+class Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.init_us = 0
+        self.spi_us = 0
+        self.wait_us = 0
+        self.inits = 0 # hardware resets, init calls with nothing to do don't count
+        self.bytes = 0
+        self.writes = 0
+        self.full = 0
+        self.part = 0
+        self.fast = 0
+        # partial refreshes since the last full or fast refresh
+        self.part_since_full = 0
+
+    def as_dict(self):
+        return {
+            'init_us': self.init_us,
+            'spi_us': self.spi_us,
+            'wait_us': self.wait_us,
+            'inits': self.inits,
+            'bytes': self.bytes,
+            'writes': self.writes,
+            'full': self.full,
+            'part': self.part,
+            'fast': self.fast,
+            'part_since_full': self.part_since_full,
+        }
+
+# SPI bus proxy counting the bytes written and the time spent writing
+class _SPI:
+    def __init__(self, spi, stats, hook):
+        self.spi = spi
+        self.stats = stats
+        self.hook = hook
+
+    def write(self, buf):
+        t = ticks_us()
+        self.spi.write(buf)
+        stats = self.stats
+        stats.spi_us += ticks_diff(ticks_us(), t)
+        stats.bytes += len(buf)
+        stats.writes += 1
+        if self.hook:
+            self.hook('spi', len(buf))
+
+    def __getattr__(self, name):
+        return getattr(self.spi, name)
+
+def _wrap_init(fn, stats, hook, depth):
+    def init(*args):
+        if depth[0]:
+            return fn(*args)
+        depth[0] = 1
+        t = ticks_us()
+        try:
+            return fn(*args)
+        finally:
+            depth[0] = 0
+            us = ticks_diff(ticks_us(), t)
+            stats.init_us += us
+            if hook:
+                hook('init', us)
+    return init
+
+def _wrap_reset(fn, stats):
+    def reset(*args):
+        stats.inits += 1
+        return fn(*args)
+    return reset
+
+def _count_wait(stats, hook, us):
+    stats.wait_us += us
+    if hook:
+        hook('wait', us)
+
+def _wrap_wait(fn, stats, hook):
+    def wait(*args):
+        t = ticks_us()
+        idle = fn(*args)
+        _count_wait(stats, hook, ticks_diff(ticks_us(), t))
+        return idle
+    return wait
+
+def _wrap_wait_async(fn, stats, hook):
+    async def wait(*args):
+        t = ticks_us()
+        idle = await fn(*args)
+        _count_wait(stats, hook, ticks_diff(ticks_us(), t))
+        return idle
+    return wait
+
+def _count_refresh(epd, stats, hook, kind, us):
+    setattr(stats, kind, getattr(stats, kind) + 1)
+    stats.part_since_full = epd._part_update_counter
+    if hook:
+        hook(kind, us)
+
+# a refresh running another one, like a D67 partial refresh that has to
+# be a full one, is counted once as the inner kind
+def _wrap_refresh(epd, fn, stats, hook, kind):
+    def refresh(*args):
+        t = ticks_us()
+        n = stats.full + stats.part + stats.fast
+        r = fn(*args)
+        if stats.full + stats.part + stats.fast == n:
+            _count_refresh(epd, stats, hook, kind, ticks_diff(ticks_us(), t))
+        return r
+    return refresh
+
+def _wrap_refresh_async(epd, fn, stats, hook):
+    async def refresh(*args):
+        if hasattr(epd, '_refresh_area'):
+            mode = args[0] if args and args[0] is not None else epd.update_mode
+            kind = _D67_KINDS[mode]
+            if mode == 3 and epd._refresh_area is None:
+                kind = None # nothing written, no refresh
+            elif kind == 'part' and epd._initial_refresh:
+                kind = 'full'
+        else:
+            kind = 'part' if epd._using_partial_mode else 'full'
+        t = ticks_us()
+        await fn(*args)
+        if kind:
+            _count_refresh(epd, stats, hook, kind, ticks_diff(ticks_us(), t))
+    return refresh
+
+# instrument an EPD instance, returns its Stats, already instrumented
+# instances return their existing Stats
+def instrument(epd, stats=None, hook=None):
+    if isinstance(epd.spi, _SPI):
+        return epd.spi.stats
+    if stats is None:
+        stats = Stats()
+    cls = type(epd)
+    depth = [0]
+    epd.spi = _SPI(epd.spi, stats, hook)
+    for name in _INIT:
+        if hasattr(cls, name):
+            setattr(epd, name, _wrap_init(getattr(epd, name), stats, hook, depth))
+    epd.reset = _wrap_reset(epd.reset, stats)
+    epd.wait_until_idle = _wrap_wait(epd.wait_until_idle, stats, hook)
+    epd.wait_idle_async = _wrap_wait_async(epd.wait_idle_async, stats, hook)
+    for name, kind in _REFRESH:
+        if hasattr(cls, name):
+            setattr(epd, name, _wrap_refresh(epd, getattr(epd, name), stats, hook, kind))
+    epd.display_frame_async = _wrap_refresh_async(epd, epd.display_frame_async, stats, hook)
+    # rebind init, set_frame_memory and display_frame to the wrappers
+    epd.set_update_mode(epd.update_mode)
+    return stats
+
+# remove the instrumentation of an EPD instance
+def uninstrument(epd):
+    if not isinstance(epd.spi, _SPI):
+        return
+    epd.spi = epd.spi.spi
+    cls = type(epd)
+    for name in _INIT + _WAIT + ('reset',) + tuple(r[0] for r in _REFRESH) + ('display_frame_async',):
+        if hasattr(cls, name) and name in epd.__dict__:
+            delattr(epd, name)
+    epd.set_update_mode(epd.update_mode)
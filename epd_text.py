@@ -0,0 +1,235 @@
+"""
+Text for the EPD drivers, drawn straight into panel RAM
+
+    import epd_text, font6x8
+    font = epd_text.Font(font6x8.font6x8)          # or a path to a .epf
+    box = epd_text.TextBox(epd, font, 8, 8, 184, 48)
+    box.show('Temperature 21.5 C, humidity 40 %')
+    box.show('Temperature 21.6 C, humidity 40 %')  # sends one line
+
+Fonts are written by epd_pack.py --font from a glyph sheet:
+
+    0   4  magic b'EPF1'
+    4   1  glyph height
+    5   1  first character
+    6   1  last character
+    7   1  spacing, blank columns after each glyph
+    8   2  atlas width
+    10  2  per glyph and one past the last: x of the glyph in the atlas
+    ... atlas, height rows of MONO_HLSB, 1 = ink
+
+Integers are little endian, characters missing from the font are drawn
+as '?', or as the first glyph if there is no '?'. A TextBox remembers the
+lines it has in panel RAM and rewrites only the lines a new text changes,
+streamed row by row through the RAM window of the lines, never as a whole
+frame. x and w of a box must be multiples of 8.
+"""
+from micropython import const
+import ustruct
+import epd_cache
+
+MAGIC = b'EPF1'
+HEADER_SIZE = const(10)
+
+# OR n bits of src from bit sx into dst from bit dx, 8 bits at a time
+def _blit_bits(dst, dx, src, sx, n):
+    end = len(src)
+    last = len(dst) - 1
+    while n > 0:
+        k = 8 if n > 8 else n
+        i = sx >> 3
+        v = src[i] << 8
+        if i + 1 < end:
+            v |= src[i + 1]
+        bits = (v << (sx & 7) >> 8) & (0xFF00 >> k) & 0xFF
+        j = dx >> 3
+        s = dx & 7
+        dst[j] |= bits >> s
+        if s and j < last:
+            dst[j + 1] |= (bits << (8 - s)) & 0xFF
+        sx += k
+        dx += k
+        n -= k
+
+class Font:
+    # source is the font bytes or a path to a font file
+    def __init__(self, source):
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                source = f.read()
+        data = memoryview(source)
+        if bytes(data[:4]) != MAGIC:
+            raise ValueError('not an EPF1 font')
+        self.height, self.first, self.last, self.spacing, width = ustruct.unpack_from('<BBBBH', data, 4)
+        n = self.last - self.first + 1
+        self._offsets = data[HEADER_SIZE:HEADER_SIZE + 2 * (n + 1)]
+        self.stride = (width + 7) // 8
+        self._atlas = data[HEADER_SIZE + 2 * (n + 1):]
+        q = ord('?') - self.first
+        self._missing = q if 0 <= q < n else 0
+
+    # (x, w) of the glyph of character c in the atlas
+    def glyph(self, c):
+        i = ord(c) - self.first
+        if not 0 <= i <= self.last - self.first:
+            i = self._missing
+        x, end = ustruct.unpack_from('<HH', self._offsets, 2 * i)
+        return x, end - x
+
+    # width of text in pixels
+    def width(self, text):
+        n = 0
+        for c in text:
+            n += self.glyph(c)[1] + self.spacing
+        return n - self.spacing if n else 0
+
+    # lines of text wrapped at spaces to width pixels, words wider than
+    # that are broken, newlines start a new line
+    def wrap(self, text, width):
+        lines = []
+        for para in text.split('\n'):
+            line = ''
+            for word in para.split(' '):
+                joined = line + ' ' + word if line else word
+                if self.width(joined) <= width:
+                    line = joined
+                    continue
+                if line:
+                    lines.append(line)
+                while self.width(word) > width:
+                    k = 1
+                    while k < len(word) and self.width(word[:k + 1]) <= width:
+                        k += 1
+                    lines.append(word[:k])
+                    word = word[k:]
+                line = word
+            lines.append(line)
+        return lines
+
+    # (atlas x, pen x, w) of each glyph of text drawn from pen x, clipped
+    # to width pixels
+    def _layout(self, text, x, width):
+        run = []
+        for c in text:
+            if x >= width:
+                break
+            ax, w = self.glyph(c)
+            run.append((ax, x, min(w, width - x)))
+            x += w + self.spacing
+        return run
+
+    # OR the ink of row row of text, drawn from pixel x, into buf
+    def ink_row(self, text, row, buf, x=0):
+        atlas = self._atlas[row * self.stride:(row + 1) * self.stride]
+        for ax, px, w in self._layout(text, x, len(buf) * 8):
+            _blit_bits(buf, px, atlas, ax, w)
+
+    # generator of the rows of text drawn from pixel x of a w pixels wide
+    # band, rows of w // 8 bytes, 1 = white, or black when inverted. The row
+    # buffer is reused, each row is only valid until the next
+    def rows(self, text, w, invert=False, x=0):
+        row = bytearray(w // 8)
+        run = self._layout(text, x, w)
+        flip = 0 if invert else 0xFF
+        for r in range(self.height):
+            for i in range(len(row)):
+                row[i] = 0
+            atlas = self._atlas[r * self.stride:(r + 1) * self.stride]
+            for ax, px, gw in run:
+                _blit_bits(row, px, atlas, ax, gw)
+            if flip:
+                for i in range(len(row)):
+                    row[i] ^= flip
+            yield row
+
+    # the band of text drawn w pixels wide, height rows of w // 8 bytes
+    def render(self, text, w, invert=False):
+        band = bytearray()
+        for row in self.rows(text, w, invert):
+            band += row
+        return band
+
+class TextBox:
+    # a box of lines of text at x, y on the display, runs is the budget in
+    # bytes of a cache of rendered lines, for texts that come back often
+    def __init__(self, epd, font, x, y, w, h, invert=False, runs=0):
+        self.epd = epd
+        self.font = font
+        self.x = x & 0xF8
+        self.y = y
+        self.w = w & 0xF8
+        self.lines = h // font.height
+        self.invert = invert
+        self.text = None
+        self._drawn = None  # lines in panel RAM, None if unknown
+        self._ram = None    # epd.ram_generation of the drawn lines
+        self._runs = epd_cache.TileCache(epd, runs) if runs else None
+        self._box = None
+
+    # forget what the box shows, the next text is written whole
+    def invalidate(self):
+        self._drawn = None
+
+    # write the lines of text that differ from the ones in panel RAM,
+    # returns the number of lines written
+    def set(self, text):
+        lines = self.font.wrap(text, self.w)[:self.lines]
+        lines += [''] * (self.lines - len(lines))
+        drawn = self._drawn
+        self.text = text
+        ram = getattr(self.epd, 'ram_generation', 0)
+        if ram != self._ram:
+            drawn = None
+        written = 0
+        i = 0
+        while i < self.lines:
+            if drawn is not None and drawn[i] == lines[i]:
+                i += 1
+                continue
+            j = i + 1
+            while j < self.lines and (drawn is None or drawn[j] != lines[j]):
+                j += 1
+            self._write(lines, i, j)
+            written += j - i
+            i = j
+        self._drawn = lines
+        self._ram = getattr(self.epd, 'ram_generation', 0)
+        if self._ram != ram and drawn is not None:
+            # a write reset the controller, the lines skipped are gone
+            self._drawn = None
+            return self.set(text)
+        return written
+
+    # write lines i to j - 1 as one window
+    def _write(self, lines, i, j):
+        h = self.font.height
+        y = self.y + i * h
+        area = (self.x, y, self.w, (j - i) * h)
+        epd = self.epd
+        if self._runs is None:
+            source = lambda: self._rows(lines, i, j)
+        else:
+            source = lambda: (self._band(lines[k]) for k in range(i, j))
+        epd_cache.write_rows(epd, source, *area)
+        b = self._box
+        self._box = area if b is None else epd_cache.union_area(b, area)
+
+    def _rows(self, lines, i, j):
+        for k in range(i, j):
+            for row in self.font.rows(lines[k], self.w, self.invert):
+                yield row
+
+    # the rendered band of a line from the run cache
+    def _band(self, line):
+        return self._runs.get(line, lambda: self.font.render(line, self.w, self.invert))
+
+    # refresh the lines written since the last call
+    def display(self):
+        box = self._box
+        self._box = None
+        epd_cache.refresh_area(self.epd, box)
+
+    # set the text and show it
+    def show(self, text):
+        self.set(text)
+        self.display()
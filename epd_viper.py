@@ -0,0 +1,206 @@
+"""
+Viper kernels of epd_bitmap, imported by it on MicroPython ports with a
+native code emitter
+
+Viper functions take at most four arguments, the integer parameters of
+the larger kernels come in an array('i') p, which also receives results.
+Stores to ptr8 keep the low 8 bits, every value stored here is masked to
+a byte anyway so the kernels behave the same run as plain python.
+"""
+import micropython
+
+# invert the bytes from start to end
+@micropython.viper
+def invert(buf, start: int, end: int):
+    b = ptr8(buf)
+    i = start
+    while i < end:
+        b[i] = b[i] ^ 0xFF
+        i += 1
+
+# p = [stride, height, top, bottom]: find the first and one past the last
+# rows that differ, returns top, -1 if none do
+@micropython.viper
+def diff_rows(a, b, p) -> int:
+    pa = ptr8(a)
+    pb = ptr8(b)
+    q = ptr32(p)
+    stride = q[0]
+    n = q[1] * stride
+    i = 0
+    while i < n and pa[i] == pb[i]:
+        i += 1
+    if i == n:
+        q[2] = -1
+        return -1
+    top = i // stride
+    i = n - 1
+    while pa[i] == pb[i]:
+        i -= 1
+    q[2] = top
+    q[3] = i // stride + 1
+    return top
+
+# p = [stride, height, write, top, bottom, left, right]: out = a ^ b when
+# write is set, and the rows and byte columns that differ, returns top, -1
+# if nothing does
+@micropython.viper
+def xor_diff(a, b, out, p) -> int:
+    pa = ptr8(a)
+    pb = ptr8(b)
+    po = ptr8(out)
+    q = ptr32(p)
+    stride = q[0]
+    height = q[1]
+    write = q[2]
+    top = -1
+    bottom = 0
+    left = stride
+    right = 0
+    y = 0
+    while y < height:
+        i = y * stride
+        c = 0
+        while c < stride:
+            v = pa[i + c] ^ pb[i + c]
+            if write:
+                po[i + c] = v
+            if v:
+                if c < left:
+                    left = c
+                if c >= right:
+                    right = c + 1
+                if top < 0:
+                    top = y
+                bottom = y + 1
+            c += 1
+        y += 1
+    q[3] = top
+    q[4] = bottom
+    q[5] = left
+    q[6] = right
+    return top
+
+# p = [dx, dy, dstride, sx, sy, sstride, w, h, op]: combine the w x h
+# pixels of src at sx, sy into dst at dx, dy, any bit alignment, op 0 copy,
+# 1 and, 2 or, 3 xor. The area must lie within both buffers
+@micropython.viper
+def blit(dst, src, p):
+    d = ptr8(dst)
+    s = ptr8(src)
+    q = ptr32(p)
+    dx = q[0]
+    dy = q[1]
+    dstride = q[2]
+    sx = q[3]
+    sy = q[4]
+    sstride = q[5]
+    w = q[6]
+    h = q[7]
+    op = q[8]
+    first = dx >> 3
+    last = (dx + w - 1) >> 3
+    row = 0
+    while row < h:
+        drow = (dy + row) * dstride
+        srow = (sy + row) * sstride
+        c = first
+        while c <= last:
+            x0 = c << 3
+            m = 0xFF
+            if x0 < dx:
+                m = 0xFF >> (dx - x0)
+            if x0 + 8 > dx + w:
+                m = m & (0xFF << (x0 + 8 - dx - w))
+            # 8 source bits lined up with this destination byte, bytes
+            # outside the source row read as 0 and are masked out
+            sb = sx + x0 - dx
+            bi = sb >> 3
+            v = 0
+            if bi >= 0 and bi < sstride:
+                v = s[srow + bi] << 8
+            if bi + 1 >= 0 and bi + 1 < sstride:
+                v = v | s[srow + bi + 1]
+            v = (v << (sb & 7)) >> 8 & m
+            i = drow + c
+            if op == 0:
+                d[i] = (d[i] & (m ^ 0xFF)) | v
+            elif op == 1:
+                d[i] = d[i] & (v | (m ^ 0xFF))
+            elif op == 2:
+                d[i] = d[i] | v
+            else:
+                d[i] = d[i] ^ v
+            c += 1
+        row += 1
+
+# p = [stride, height, dx, fill]: move every row dx pixels right, left
+# when negative, the uncovered pixels from fill bytes
+@micropython.viper
+def scroll_h(buf, p):
+    b = ptr8(buf)
+    q = ptr32(p)
+    stride = q[0]
+    height = q[1]
+    dx = q[2]
+    fill = q[3]
+    n = dx
+    if dx < 0:
+        n = 0 - dx
+    k = n >> 3
+    r = n & 7
+    row = 0
+    while row < height:
+        base = row * stride
+        if dx >= 0:
+            c = stride - 1
+            while c >= 0:
+                hi = fill
+                lo = fill
+                if c - k - 1 >= 0:
+                    hi = b[base + c - k - 1]
+                if c - k >= 0:
+                    lo = b[base + c - k]
+                b[base + c] = ((hi << 8) | lo) >> r & 0xFF
+                c -= 1
+        else:
+            c = 0
+            while c < stride:
+                hi = fill
+                lo = fill
+                if c + k < stride:
+                    hi = b[base + c + k]
+                if c + k + 1 < stride:
+                    lo = b[base + c + k + 1]
+                b[base + c] = ((hi << 8) | lo) << r >> 8 & 0xFF
+                c += 1
+        row += 1
+
+# p = [stride, height, dy, fill]: move the rows dy rows down, up when
+# negative, the uncovered rows filled with fill
+@micropython.viper
+def scroll_v(buf, p):
+    b = ptr8(buf)
+    q = ptr32(p)
+    stride = q[0]
+    height = q[1]
+    dy = q[2]
+    fill = q[3]
+    size = height * stride
+    shift = dy * stride
+    if dy >= 0:
+        i = size - 1
+        while i >= shift:
+            b[i] = b[i - shift]
+            i -= 1
+        while i >= 0:
+            b[i] = fill
+            i -= 1
+    else:
+        i = 0
+        while i < size + shift:
+            b[i] = b[i - shift]
+            i += 1
+        while i < size:
+            b[i] = fill
+            i += 1
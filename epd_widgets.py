@@ -0,0 +1,180 @@
+"""
+Retained widgets for the EPD drivers, redrawn only when they change
+
+    import epd_widgets as ui, epd_text, font6x8
+    font = epd_text.Font(font6x8.font6x8)
+    temp = ui.Readout(font, 8, 8, 64, '{:.1f} C')
+    bar = ui.ProgressBar(8, 24, 184, 12, maximum=100)
+    screen = ui.Screen(epd, [ui.Label(font, 80, 8, 112, 'living room'), temp, bar])
+    screen.render()                  # draws every widget
+    temp.set(21.53)
+    bar.set(40)
+    screen.render()                  # sends and refreshes these two only
+
+Each widget owns a box on the display, x and w widened to multiples of 8,
+and draws itself row by row. set() invalidates a widget only when what it
+shows changes, Screen.render() streams the invalidated widgets into their
+RAM windows and refreshes the area they cover, so an update costs what
+changed, not the whole screen. Widgets must not overlap.
+"""
+import epd_cache
+
+# clear the bits of row from pixel x0 up to x1 to black
+def _ink(row, x0, x1):
+    while x0 < x1:
+        s = x0 & 7
+        n = min(8 - s, x1 - x0)
+        row[x0 >> 3] &= ~(((0xFF00 >> n) & 0xFF) >> s) & 0xFF
+        x0 += n
+
+class Widget:
+    def __init__(self, x, y, w, h):
+        self.x = x & 0xF8
+        self.y = y
+        self.w = ((x + w + 7) & ~7) - self.x
+        self.h = h
+        self.dirty = True
+
+    # (x, y, w, h) of the widget on the display
+    def area(self):
+        return self.x, self.y, self.w, self.h
+
+    # draw the widget again at the next render
+    def invalidate(self):
+        self.dirty = True
+
+    # generator of the h rows of w // 8 bytes of the widget, 1 = white
+    def rows(self):
+        row = bytearray(b'\xff' * (self.w // 8))
+        for r in range(self.h):
+            yield row
+
+# a line of text, aligned 'left', 'right' or 'center' in its box
+class Label(Widget):
+    def __init__(self, font, x, y, w, text='', align='left', invert=False):
+        Widget.__init__(self, x, y, w, font.height)
+        self.font = font
+        self.text = text
+        self.align = align
+        self.invert = invert
+
+    def set(self, text):
+        if text != self.text:
+            self.text = text
+            self.dirty = True
+
+    def rows(self):
+        x = 0
+        if self.align != 'left':
+            x = max(0, self.w - self.font.width(self.text))
+            if self.align == 'center':
+                x //= 2
+        return self.font.rows(self.text, self.w, self.invert, x)
+
+# a value shown through a format string, right aligned, only redrawn when
+# the formatted text changes
+class Readout(Label):
+    def __init__(self, font, x, y, w, fmt='{}', value=None, align='right', invert=False):
+        Label.__init__(self, font, x, y, w, '' if value is None else fmt.format(value), align, invert)
+        self.fmt = fmt
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+        Label.set(self, self.fmt.format(value))
+
+# a bar filled from the left in proportion to value, with a border
+class ProgressBar(Widget):
+    def __init__(self, x, y, w, h, value=0, maximum=100):
+        Widget.__init__(self, x, y, w, h)
+        self.maximum = maximum
+        self.value = value
+        self._fill = self._pixels(value)
+
+    # filled pixels inside the border and a one pixel gap
+    def _pixels(self, value):
+        inner = self.w - 4
+        value = min(max(value, 0), self.maximum)
+        return inner * value // self.maximum if self.maximum else 0
+
+    def set(self, value):
+        self.value = value
+        fill = self._pixels(value)
+        if fill != self._fill:
+            self._fill = fill
+            self.dirty = True
+
+    def rows(self):
+        w = self.w
+        border = bytearray(w // 8)
+        edge = bytearray(b'\xff' * (w // 8))
+        _ink(edge, 0, 1)
+        _ink(edge, w - 1, w)
+        bar = bytearray(edge)
+        _ink(bar, 2, 2 + self._fill)
+        for r in range(self.h):
+            if r == 0 or r == self.h - 1:
+                yield border
+            elif r == 1 or r == self.h - 2:
+                yield edge
+            else:
+                yield bar
+
+# an image of w x h pixels, rows of w // 8 bytes, x and w multiples of 8,
+# redrawn when another image is set
+class Icon(Widget):
+    def __init__(self, x, y, w, h, image=None):
+        Widget.__init__(self, x, y, w, h)
+        self.image = image
+
+    def set(self, image):
+        if image is not self.image:
+            self.image = image
+            self.dirty = True
+
+    def rows(self):
+        if self.image is None:
+            return Widget.rows(self)
+        bw = self.w // 8
+        mv = memoryview(self.image)
+        return (mv[i:i + bw] for i in range(0, bw * self.h, bw))
+
+class Screen:
+    def __init__(self, epd, widgets=()):
+        self.epd = epd
+        self.widgets = list(widgets)
+        self._ram = None # epd.ram_generation of the drawn widgets
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        return widget
+
+    # draw every widget at the next render
+    def invalidate(self):
+        for w in self.widgets:
+            w.dirty = True
+
+    # write the invalidated widgets to panel RAM and refresh the area they
+    # cover, returns the number of widgets written
+    def render(self):
+        epd = self.epd
+        ram = getattr(epd, 'ram_generation', 0)
+        if ram != self._ram:
+            self.invalidate()
+        box = None
+        n = 0
+        for w in self.widgets:
+            if not w.dirty:
+                continue
+            area = w.area()
+            epd_cache.write_rows(epd, w.rows, *area)
+            w.dirty = False
+            box = area if box is None else epd_cache.union_area(box, area)
+            n += 1
+        self._ram = getattr(epd, 'ram_generation', 0)
+        if self._ram != ram:
+            # a write reset the controller, the widgets skipped are gone
+            self.invalidate()
+            return self.render()
+        epd_cache.refresh_area(epd, box)
+        return n
@@ -0,0 +1,28 @@
+# packed by epd_pack.py, load with epd_text.Font(font6x8)
+font6x8 = (
+    b'EPF1\x08 ~\x00:\x02\x00\x00\x06\x00\x0c\x00\x12\x00\x18\x00\x1e\x00$\x00*\x000\x006\x00<\x00'
+    b'B\x00H\x00N\x00T\x00Z\x00`\x00f\x00l\x00r\x00x\x00~\x00\x84\x00\x8a\x00\x90\x00\x96\x00\x9c\x00'
+    b'\xa2\x00\xa8\x00\xae\x00\xb4\x00\xba\x00\xc0\x00\xc6\x00\xcc\x00\xd2\x00\xd8\x00\xde\x00\xe4\x00\xea\x00\xf0\x00\xf6\x00\xfc\x00'
+    b'\x02\x01\x08\x01\x0e\x01\x14\x01\x1a\x01 \x01&\x01,\x012\x018\x01>\x01D\x01J\x01P\x01V\x01\\\x01'
+    b'b\x01h\x01n\x01t\x01z\x01\x80\x01\x86\x01\x8c\x01\x92\x01\x98\x01\x9e\x01\xa4\x01\xaa\x01\xb0\x01\xb6\x01\xbc\x01'
+    b'\xc2\x01\xc8\x01\xce\x01\xd4\x01\xda\x01\xe0\x01\xe6\x01\xec\x01\xf2\x01\xf8\x01\xfe\x01\x04\x02\n\x02\x10\x02\x16\x02\x1c\x02'
+    b'"\x02(\x02.\x024\x02:\x02\x00\x85\x14#\x06\x08\x11\x00\x00\x00\x00\x00p\x87>\x13\xe3>q\xc0\x00\x10'
+    b'\x04\x1cq\xcf\x1c\xe3\xef\x9c\x89\xc3\xa2\x82(\x9c\xf1\xcf\x1e\xfa(\xa2\x8a/\x9c\x01\xc2\x00@\x08\x00\x08\x03\x00'
+    b'\x80\x81 `\x00\x00\x00\x00\x00@\x00\x00\x00\x00\x04!\x00\x00\x00\x85\x14{)\x08 \x82\x08\x00\x00\x02\x89\x88'
+    b'\x842\x04\x02\x8a&\x18 \x02"\x8a(\xa2\x92\x08"\x88\x81$\x83h\xa2\x8a(\xa0"(\xa2\x8a \x90\x80'
+    b'E\x00 \x08\x00\x08\x04\x9e\x80\x00  \x00\x00\x00\x00\x00@\x00\x00\x00\x00\x08 \x80\x00\x00\x85>\xa0J\x10'
+    b'@J\x88\x00\x00\x04\x98\x80\x88S\xc8\x04\x8a&\x18C\xe1\x02\n(\xa0\x8a\x08 \x88\x81(\x82\xac\xa2\x8a('
+    b'\xa0"(\xa2R!\x10@H\x80\x11\xcb\x1ci\xc4"\xb1\x83$#K\x1c\xf1\xab\x1c\xe2(\xa2\x8a/\x88 '
+    b'\x84\x00\x00\x80\x14p\x84\x00@G>\x03\xe0\x08\xa8\x81\x04\x90/\x08q\xe0\x00\x80\x00\x84k\xef \x8b\xcf.'
+    b'\xf8\x810\x82\xaa\xa2\xf2/\x1c"(\xaa!B\x10 @\x00\x00,\xa0\x9a."\xc8\x81("\xac\xa2\x8al'
+    b'\xa0B(\xa2R!\x10 J\x80\x00\x80>)\n\x80@J\x88`\x00\x10\xc8\x82\x02\xf8(\x90\x88&\x18C'
+    b'\xe1\x08\xaa(\xa0\x8a\x08"\x88\x81(\x82)\xa2\x82\xaa\x02"(\xaaP\x84\x10\x10@\x00\x01\xe8\xa0\x8b\xe4\x1e'
+    b'\x88\x810"\xa8\xa2\xf1\xe8\x1cB(\xaa!\xe2\x08 \x81\x00\x00\x00\x14\xf2i\x00 \x82\x08 \x06 \x88\x84'
+    b'"\x12(\x90\x88F\x08 \x02\x00\xaa(\xa2\x92\x08"\x88\x89$\x82(\xa2\x82I\x02"%*\x88\x88\x10\x08'
+    b'@\x00\x02(\xa2\x8a\x04\x02\x88\x89("(\xa2\x80(\x02Je*P$\x08 \x80\x00\x00\x80\x14 f\x80'
+    b'\x11\x00\x00@\x06\x00q\xcf\x9c\x11\xc7\x10q\x80\x10\x10\x04\x08r/\x1c\xe3\xe8\x1e\x89\xc6"\xfa(\x9c\x81\xa8'
+    b'\xbc!\xc2\x14\x88\x8f\x9c\x01\xc0>\x01\xef\x1cy\xc4\x1c\x89\xc6$r(\x9c\x80(<1\xa2\x14\x89\xcf\x84!'
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+)
@@ -0,0 +1,78 @@
+# checks that the command and RAM window path of both drivers does not
+# allocate, using a mock SPI and mock pins
+# run on a board or with the MicroPython unix port: micropython test_alloc.py,
+# skipped under CPython, which has no gc.mem_alloc
+import sys
+if sys.implementation.name != 'micropython':
+    import pytest
+    pytest.skip('needs MicroPython gc.mem_alloc', allow_module_level=True)
+import gc
+import EPD_154_D67
+import EPD_154_M09
+
+class MockPin:
+    OUT = 1
+    IN = 0
+    def __init__(self, value=0):
+        self._value = value
+    def init(self, mode, value=None):
+        if value is not None:
+            self._value = value
+    def __call__(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+    def value(self, value=None):
+        return self(value)
+
+class MockSPI:
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+    def write(self, buf):
+        self.bytes += len(buf)
+        self.writes += 1
+
+# bytes allocated by one call of fn, after a first call to warm up
+def allocated(fn):
+    fn()
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    fn()
+    after = gc.mem_alloc()
+    gc.enable()
+    return after - before
+
+def make(module, **kw):
+    return module.EPD(MockSPI(), cs=MockPin(), dc=MockPin(), rst=MockPin(1), **kw)
+
+image = bytearray(EPD_154_D67.EPD_ARRAY)
+
+def check(checks):
+    for name, fn in checks:
+        n = allocated(fn)
+        print(name, n, 'bytes')
+        assert n == 0, name
+
+def test_d67_no_alloc():
+    e = make(EPD_154_D67, refresh=EPD_154_D67.UPDATE_PART)
+    e.init()
+    check([
+        ('D67 command', lambda: e._command(EPD_154_D67.WRITE_RAM, image)),
+        ('D67 window normal', lambda: e.set_ram_area_normal(8, 16, 64, 32)),
+        ('D67 window inverted', lambda: e.set_ram_area_inverted(8, 16, 64, 32)),
+        ('D67 partial frame write', lambda: e.set_frame_memory_part(image, 0, 0, 200, 200)),
+    ])
+
+def test_m09_no_alloc():
+    m = make(EPD_154_M09)
+    check([
+        ('M09 command', lambda: m._command(0x13, image)),
+        ('M09 window', lambda: m.set_ram_area_normal(8, 16, 64, 32)),
+    ])
+
+if __name__ == '__main__':
+    test_d67_no_alloc()
+    test_m09_no_alloc()
+    print('ok')
@@ -0,0 +1,693 @@
+# host tests of both drivers against the emulated controllers
+# run with: python test_emulator.py (or pytest test_emulator.py)
+import emulator
+emulator.install()
+
+import EPD_154_D67
+import EPD_154_M09
+import epd_stats
+import epd_scheduler
+import epd_coalesce
+import epd_buffer
+import epd_asset
+import epd_pack
+import epd_cache
+import epd_text
+import epd_widgets
+import epd_bitmap
+import epd_viper
+import font6x8
+import asyncio
+import cat
+
+def make(module, controller, **kw):
+    panel = emulator.Panel(controller)
+    e = module.EPD(panel.spi, cs=panel.cs, dc=panel.dc, rst=panel.rst, busy=panel.busy, **kw)
+    return e, panel
+
+# frame rotated clockwise by rotation degrees, then mirrored left to right
+def rotated(buf, rotation, mirror=False):
+    out = bytearray(b'\xff' * len(buf))
+    n = 200
+    for y in range(n):
+        for x in range(n):
+            if (buf[y * 25 + x // 8] >> (7 - x % 8)) & 1:
+                continue
+            X, Y = {0: (x, y), 90: (n - 1 - y, x), 180: (n - 1 - x, n - 1 - y), 270: (y, n - 1 - x)}[rotation]
+            if mirror:
+                X = n - 1 - X
+            out[Y * 25 + X // 8] &= ~(0x80 >> (X % 8))
+    return bytes(out)
+
+def pattern():
+    buf = bytearray(b'\xff' * EPD_154_D67.EPD_ARRAY)
+    for y in range(40, 80):
+        for i in range(5, 12):
+            buf[y * 25 + i] = 0x0F
+    return buf
+
+def test_d67_full_frame():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.image() == bytes(buf)
+    assert panel.stats()['refreshes'] == {'full': 1}
+    assert panel.stats()['writes_while_busy'] == 0
+
+def test_d67_fast_frame():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_FAST)
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.image() == bytes(buf)
+    assert panel.stats()['refreshes'] == {'fast': 1}
+    assert panel.stats()['writes_while_busy'] == 0
+
+def test_d67_fast_after_partial_reloads_fast_lut():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    buf = pattern()
+    for mode in (EPD_154_D67.UPDATE_FAST, EPD_154_D67.UPDATE_PART, EPD_154_D67.UPDATE_FAST):
+        e.set_update_mode(mode)
+        buf[100 * 25 + 4] ^= 0xFF
+        e.set_frame_memory(buf, 0, 0, 200, 200)
+        e.display_frame()
+        assert panel.image() == bytes(buf)
+    assert panel.controller.refreshes == {'fast': 2, 'part': 1}
+
+def test_d67_old_image_only_kept_for_partial_updates():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.stats()['bytes'] < 5000 + 200
+    # the first partial refresh runs full, RED RAM follows from then on
+    e.set_update_mode(EPD_154_D67.UPDATE_PART)
+    for n in range(3):
+        buf[60 * 25 + n] ^= 0xFF
+        e.set_frame_memory(buf, 0, 0, 200, 200)
+        e.display_frame()
+        assert panel.image() == bytes(buf)
+    assert panel.controller.refreshes == {'full': 2, 'part': 2}
+    assert panel.controller.red == panel.controller.bw
+
+def test_d67_plan_areas():
+    plan = EPD_154_D67.plan_areas
+    assert EPD_154_D67.union_area((0, 0, 8, 8), (16, 10, 8, 4)) == (0, 0, 24, 14)
+    # overlapping and nearly adjacent areas merge
+    assert plan([(0, 0, 16, 8), (8, 4, 16, 8)]) == [(0, 0, 24, 12)]
+    assert plan([(0, 0, 8, 8), (16, 0, 8, 8)]) == [(0, 0, 24, 8)]
+    # one window costs less than two for short rows far apart
+    assert plan([(0, 0, 8, 1), (96, 0, 8, 1)]) == [(0, 0, 104, 1)]
+    # distant areas stay split
+    assert plan([(0, 0, 8, 8), (192, 192, 8, 8)]) == [(0, 0, 8, 8), (192, 192, 8, 8)]
+    assert plan([(0, 0, 200, 2), (0, 20, 200, 2), (0, 40, 8, 8)]) == [(0, 0, 200, 2), (0, 20, 200, 2), (0, 40, 8, 8)]
+
+def test_d67_diff_sends_changed_area_only():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_DIFF)
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    buf[150 * 25 + 3] = 0x00
+    panel.reset_stats()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.stats()['bytes'] < 60
+    assert panel.controller.bw == panel.controller.red == buf
+    assert panel.image() == bytes(buf)
+    panel.reset_stats()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.stats()['bytes'] == 0
+    assert panel.controller.writes_while_busy == 0
+
+def test_d67_diff_keeps_frame_through_partial_window():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_DIFF)
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    sub = bytes(range(32))
+    e.set_frame_memory(sub, 16, 100, 16, 16)
+    e.display_frame()
+    for r in range(16):
+        buf[(100 + r) * 25 + 2:(100 + r) * 25 + 4] = sub[r * 2:r * 2 + 2]
+    assert panel.image() == bytes(buf)
+    buf[150 * 25 + 3] = 0x00
+    panel.reset_stats()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.stats()['bytes'] < 60
+    assert panel.image() == bytes(buf)
+    assert panel.controller.red == panel.controller.bw
+
+def test_d67_partial_updates_keep_old_image():
+    for mode in (EPD_154_D67.UPDATE_PART, EPD_154_D67.UPDATE_DIFF):
+        e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=mode)
+        buf = pattern()
+        e.set_frame_memory(buf, 0, 0, 200, 200)
+        e.display_frame()
+        for y in (20, 100, 180):
+            buf[y * 25 + 5:y * 25 + 9] = b'\x00\x0f\xf0\x55'
+            e.set_frame_memory(buf, 0, 0, 200, 200)
+            e.display_frame()
+            assert panel.image() == bytes(buf)
+        assert panel.controller.red == panel.controller.bw
+        assert panel.controller.refreshes == {'full': 1, 'part': 3}
+        assert panel.controller.writes_while_busy == 0
+
+def test_d67_busy_time_is_modelled():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    e.set_frame_memory(pattern(), 0, 0, 200, 200)
+    start = emulator.clock.ticks_ms()
+    e.display_frame()
+    elapsed = emulator.clock.ticks_ms() - start
+    assert panel.controller.full_ms <= elapsed < panel.controller.full_ms + 100
+
+def test_d67_partial_refresh_waits_for_idle():
+    for mode in (EPD_154_D67.UPDATE_PART, EPD_154_D67.UPDATE_DIFF):
+        e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=mode)
+        buf = pattern()
+        for i in range(4):
+            buf[i * 25] ^= 0xFF
+            e.set_frame_memory(buf, 0, 0, 200, 200)
+            e.display_frame()
+            assert not panel.controller.busy()
+        assert e.busy_time[EPD_154_D67.UPDATE_PART] >= panel.controller.part_ms
+        assert panel.controller.writes_while_busy == 0
+
+def test_d67_timed_out_refresh_skips_old_image():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    e.busy_timeout = 0
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    panel.controller.part_ms = 1000
+    red = bytes(panel.controller.red)
+    buf[0] = 0
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.controller.busy()
+    assert bytes(panel.controller.red) == red
+    e.wait_until_idle(2000)
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.controller.refreshes == {'full': 2, 'part': 1}
+    assert panel.controller.red == panel.controller.bw
+
+def test_d67_stats():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    stats = epd_stats.instrument(e)
+    buf = pattern()
+    for i in range(3):
+        buf[i] = 0
+        e.set_frame_memory(buf, 0, 0, 200, 200)
+        e.display_frame()
+    assert (stats.part, stats.full, stats.part_since_full) == (2, 1, 2)
+    assert stats.inits == 1 and stats.wait_us > 0
+    assert stats.bytes == panel.stats()['bytes']
+    e.set_update_mode(EPD_154_D67.UPDATE_FULL)
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    assert (stats.full, stats.part_since_full) == (2, 0)
+    epd_stats.uninstrument(e)
+    e.display_frame()
+    assert stats.full == 2
+
+def test_d67_scheduler_promotes_on_ghosting():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    sched = epd_scheduler.Scheduler(e, budget=2.0, max_fast=1)
+    buf = pattern()
+    modes = [sched.show(buf)]
+    buf[0] = 0
+    modes.append(sched.show(buf))
+    modes.append(sched.show(buf))
+    for i in range(4):
+        for j in range(len(buf)):
+            buf[j] ^= 0xFF
+        modes.append(sched.show(buf))
+    F, P, S = EPD_154_D67.UPDATE_FULL, EPD_154_D67.UPDATE_PART, EPD_154_D67.UPDATE_FAST
+    assert modes == [F, P, None, P, S, P, F]
+    assert panel.stats()['refreshes'] == {'full': 2, 'part': 3, 'fast': 1}
+
+def test_d67_coalescer_latest_wins():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_DIFF)
+    frames = epd_coalesce.Coalescer(e, max_rate=0)
+    async def main():
+        task = asyncio.create_task(frames.run())
+        frames.submit(pattern())
+        await asyncio.sleep(0)
+        for i in range(5):
+            buf = pattern()
+            buf[120 * 25 + i] = 0
+            frames.submit(buf, 0, 120, 200, 1)
+        for i in range(10000):
+            if frames.sent == 2 and not e.busy.value():
+                break
+            await asyncio.sleep(0)
+        task.cancel()
+        return buf
+    buf = asyncio.run(main())
+    assert (frames.sent, frames.dropped) == (2, 4)
+    assert panel.controller.bw == buf
+    assert panel.stats()['refreshes'] == {'full': 1, 'part': 1}
+
+def test_d67_double_buffer_sends_marked_rows():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    frames = epd_buffer.DoubleBuffer(e)
+    frames.back[:] = pattern()
+    drawn = frames.back
+    frames.present()
+    assert frames.front is drawn and frames.back == drawn
+    frames.back[150 * 25 + 3] = 0x00
+    frames.mark(24, 150, 8, 1)
+    panel.reset_stats()
+    frames.present()
+    assert panel.stats()['bytes'] < 120
+    assert panel.controller.bw == panel.controller.red == frames.front == frames.back
+    assert panel.image() == bytes(frames.front)
+
+def test_d67_rotation():
+    buf = pattern()
+    buf[3] = 0x35
+    for rotation in (0, 90, 180, 270):
+        for mirror in (False, True):
+            e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_FAST)
+            e.set_rotation(rotation, mirror)
+            e.set_frame_memory(buf, 0, 0, 200, 200)
+            e.display_frame()
+            assert panel.image() == rotated(buf, rotation, mirror), (rotation, mirror)
+
+def test_d67_stream():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    e.set_frame_memory_stream(cat.stream(), 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.image() == cat.image()
+    # bg_cat is decompressed once and kept
+    assert cat.bg_cat == cat.image() and cat.bg_cat is cat.bg_cat
+    buf = pattern()
+    rows = (buf[i:i + 25] for i in range(0, len(buf), 25))
+    e.set_update_mode(EPD_154_D67.UPDATE_FAST)
+    e.set_frame_memory_stream(rows, 0, 0, 200, 200)
+    e.display_frame()
+    assert panel.image() == bytes(buf)
+
+def test_d67_asset():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    img = cat.image()
+    asset = epd_asset.Asset(epd_pack.pack(epd_pack.Bitmap(200, 200, img), 48, 40))
+    asset.show(e)
+    assert panel.image() == bytes(img)
+    e.set_frame_memory(bytearray(b'\xff' * 5000), 0, 0, 200, 200)
+    for i in range(asset.count):
+        asset.show_tile(e, i)
+    assert panel.image() == bytes(img)
+
+def test_d67_ram_retained_through_sleep():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    e.keep_frame = True
+    a = pattern()
+    b = bytearray(a)
+    b[2000] ^= 0xFF
+    sent = []
+    for image, retain in ((a, True), (a, True), (b, True), (b, False), (a, False)):
+        panel.reset_stats()
+        e.set_frame_memory(image, 0, 0, 200, 200)
+        e.display_frame()
+        assert panel.image() == bytes(image)
+        sent.append(panel.stats()['bytes'])
+        e.hibernate(retain)
+    assert sent[0] > 5000 and sent[4] > 5000
+    assert sent[1] < 50 and sent[2] < 100 and sent[3] < 50
+
+def test_d67_tile_cache_skips_tiles_in_ram():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    img = cat.image()
+    asset = epd_asset.Asset(epd_pack.pack(epd_pack.Bitmap(200, 200, img), 40, 40))
+    tiles = epd_cache.TileCache(e, budget=4000)
+    assert tiles.show_asset(asset) == 25
+    assert panel.image() == bytes(img)
+    assert tiles.used == 4000
+    panel.reset_stats()
+    assert tiles.show_asset(asset) == 0
+    assert panel.stats()['bytes'] == 0
+    tiles.invalidate(160, 160, 1, 1)
+    assert tiles.show_asset(asset) == 1
+    assert tiles.hits == 1
+    assert panel.image() == bytes(img)
+    e.hibernate(retain=False)
+    assert tiles.show_asset(asset) == 25
+
+def test_d67_ram_generation():
+    font = epd_text.Font(font6x8.font6x8)
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    asset = epd_asset.Asset(epd_pack.pack(epd_pack.Bitmap(200, 200, cat.image()), 40, 40))
+    tiles = epd_cache.TileCache(e, budget=4000)
+    box = epd_text.TextBox(e, font, 16, 0, 120, 16)
+    screen = epd_widgets.Screen(e, [epd_widgets.Label(font, 16, 40, 64, 'label')])
+    assert tiles.show_asset(asset) == 25
+    assert box.set('two lines of text here') == 2
+    assert screen.render() == 1
+    # RAM kept through deep sleep mode 1 and the reset waking from it
+    e.hibernate()
+    e.init()
+    assert tiles.show_asset(asset) == 0
+    assert box.set('two lines of text here') == 0
+    assert screen.render() == 0
+    # lost in mode 2, also when woken before the next write
+    e.hibernate(retain=False)
+    e.init()
+    assert not e._hibernating
+    assert tiles.show_asset(asset) == 25
+    assert box.set('two lines of text here') == 2
+    assert screen.render() == 1
+    e.reset()
+    assert box.set('two lines of text here') == 2
+
+def test_d67_old_image_queue_overflow():
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    for i in range(EPD_154_D67.OLD_SLOTS + 1):
+        e.set_frame_memory(bytes(8), 8 * i, 0, 8, 8)
+        for r in range(8):
+            buf[r * 25 + i] = 0
+    e.display_frame()
+    assert panel.image() == bytes(buf)
+    # RED RAM misses an area until the next full frame, refresh fully
+    e.display_frame()
+    assert panel.controller.refreshes == {'full': 2, 'part': 1}
+    buf[100] = 0
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.display_frame()
+    e.set_frame_memory(bytes(8), 0, 100, 8, 8)
+    e.display_frame()
+    assert panel.controller.refreshes == {'full': 3, 'part': 2}
+
+# a panel variant is a subclass replacing the controller profile
+class _SlowResetD67(EPD_154_D67.EPD):
+    reset_ms = (50, 50)
+
+def test_core_profiles():
+    e, panel = make(EPD_154_D67, emulator.SSD1681())
+    v = _SlowResetD67(panel.spi, cs=panel.cs, dc=panel.dc, rst=panel.rst, busy=panel.busy)
+    start = emulator.clock.ticks_ms()
+    v.reset()
+    assert emulator.clock.ticks_ms() - start == 100
+    v.set_frame_memory(pattern(), 0, 0, 200, 200)
+    v.display_frame()
+    assert panel.image() == bytes(pattern())
+    m, panel = make(EPD_154_M09, emulator.UC8151())
+    m.set_frame_memory(pattern(), 0, 0, 200, 200)
+    assert m.busy_time[EPD_154_M09.UPDATE_FULL] > 0
+    # power waits poll BUSY past power_ms until the panel is ready
+    m.power_off()
+    panel.controller.power_on_ms = 400
+    m.power_on()
+    assert not panel.controller.busy()
+    start = emulator.clock.ticks_ms()
+    m.hibernate()
+    assert emulator.clock.ticks_ms() - start >= 300
+
+def test_text_font_packing():
+    sheet = epd_pack.Bitmap(16, 8)
+    for y in range(2, 6):
+        sheet.data[y * 2 + 1] = 0b11100111   # '!' inked in columns 3 and 4
+    font = epd_text.Font(epd_pack.pack_font(sheet, 8, 8, first=32, proportional=True))
+    assert (font.first, font.last, font.height) == (32, 33, 8)
+    assert font.glyph(' ') == (0, 4) and font.glyph('!') == (4, 2)
+    assert font.glyph('x') == font.glyph(' ')  # no '?' in the font
+    assert font.width('! !') == 2 + 1 + 4 + 1 + 2
+    font = epd_text.Font(font6x8.font6x8)
+    assert font.wrap('the quick brown fox', 60) == ['the quick', 'brown fox']
+    assert font.wrap('abcdefghijkl\nz', 30) == ['abcde', 'fghij', 'kl', 'z']
+
+def test_d67_text_box_writes_changed_lines():
+    font = epd_text.Font(font6x8.font6x8)
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    blank = bytearray(b'\xff' * 5000)
+    e.set_frame_memory(blank, 0, 0, 200, 200)
+    e.display_frame()
+    box = epd_text.TextBox(e, font, 16, 40, 120, 32)
+    text = 'Temperature 21.5 C humidity 40 % wind 3 m/s'
+    assert box.set(text) == 4
+    box.display()
+    lines = font.wrap(text, 120)
+    expected = bytearray(blank)
+    for i, line in enumerate(lines):
+        band = font.render(line, 120)
+        for r in range(8):
+            row = (40 + i * 8 + r) * 25 + 2
+            expected[row:row + 15] = band[r * 15:(r + 1) * 15]
+    assert panel.image() == bytes(expected)
+    panel.reset_stats()
+    assert box.set(text.replace('40', '41')) == 1
+    box.display()
+    assert panel.stats()['refreshes'] == {'part': 1}
+    assert panel.stats()['bytes'] < 2 * 120 + 100
+    assert box.set(text.replace('40', '41')) == 0
+    cached = epd_text.TextBox(e, font, 16, 40, 120, 32, runs=2000)
+    cached.show(text)
+    assert panel.image() == bytes(expected)
+
+def test_d67_widgets_render_changed_only():
+    font = epd_text.Font(font6x8.font6x8)
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    e.set_frame_memory(bytearray(b'\xff' * 5000), 0, 0, 200, 200)
+    e.display_frame()
+    temp = epd_widgets.Readout(font, 8, 8, 64, '{:.1f} C', 21.5)
+    bar = epd_widgets.ProgressBar(8, 24, 184, 12, 25)
+    icon = epd_widgets.Icon(176, 176, 16, 16, bytes(32))
+    screen = epd_widgets.Screen(e, [epd_widgets.Label(font, 80, 8, 112, 'living room'), temp, bar, icon])
+    assert screen.render() == 4
+    assert screen.render() == 0
+    temp.set(21.53)
+    assert not temp.dirty
+    img = panel.image()
+    assert img[176 * 25 + 22:176 * 25 + 24] == b'\x00\x00'
+    # bar: border, gap, 45 of 180 inner pixels filled
+    row = 30 * 25
+    assert img[24 * 25 + 1:24 * 25 + 24] == bytes(23)
+    assert img[row + 1] == 0x40 and img[row + 6] == 0x01 and img[row + 23] == 0xFE
+    panel.reset_stats()
+    temp.set(22.0)
+    bar.set(26)
+    assert screen.render() == 2
+    assert panel.stats()['refreshes'] == {'part': 1}
+    assert panel.stats()['bytes'] < 2 * (8 * 8 + 24 * 12) + 200
+    assert panel.image()[row + 6] == 0x00
+    lines = [bytes(r) for r in temp.rows()]
+    assert panel.image()[8 * 25 + 1:8 * 25 + 9] == lines[0]
+
+def _px(buf, stride, x, y):
+    return buf[y * stride + (x >> 3)] >> (7 - (x & 7)) & 1
+
+def test_bitmap_ops():
+    # the viper kernels run as python with identity pointers
+    pointers = [(name, getattr(epd_viper, name, None)) for name in ('ptr8', 'ptr32')]
+    kernels = [(name, getattr(epd_bitmap, name)) for name in ('_blit', '_scroll_h', '_scroll_v', '_xor_diff', '_diff_rows')]
+    epd_viper.ptr8 = epd_viper.ptr32 = lambda b: b
+    try:
+        _bitmap_ops()
+    finally:
+        for name, value in pointers:
+            if value is None:
+                delattr(epd_viper, name)
+            else:
+                setattr(epd_viper, name, value)
+        for name, value in kernels:
+            setattr(epd_bitmap, name, value)
+
+def _bitmap_ops():
+    kernels = [(epd_bitmap._py_blit, epd_bitmap._py_scroll_h, epd_bitmap._py_scroll_v),
+               (epd_viper.blit, epd_viper.scroll_h, epd_viper.scroll_v)]
+    src = bytes((i * 73 + 11) & 0xFF for i in range(3 * 20))
+    base = bytes((i * 29 + 5) & 0xFF for i in range(4 * 12))
+    for blit, scroll_h, scroll_v in kernels:
+        epd_bitmap._blit, epd_bitmap._scroll_h, epd_bitmap._scroll_v = blit, scroll_h, scroll_v
+        for op in (epd_bitmap.COPY, epd_bitmap.AND, epd_bitmap.OR, epd_bitmap.XOR):
+            for dx, sx, w in ((0, 0, 24), (3, 0, 21), (5, 7, 13), (-2, 1, 20), (26, 0, 20)):
+                dst = bytearray(base)
+                epd_bitmap.blit(dst, 4, dx, 2, src, 3, w, 8, sx, 1, op)
+                for y in range(12):
+                    for x in range(32):
+                        v = _px(base, 4, x, y)
+                        if 0 <= x - dx < w and x - dx + sx < 24 and 2 <= y < 10:
+                            s = _px(src, 3, x - dx + sx, y - 1)
+                            v = (s, v & s, v | s, v ^ s)[op]
+                        assert _px(dst, 4, x, y) == v, (op, dx, sx, w, x, y)
+        for dx in (1, 7, 8, 13, -3, -8, -17, 40):
+            buf = bytearray(base)
+            epd_bitmap.scroll_h(buf, 4, 12, dx, fill=0)
+            for y in range(12):
+                for x in range(32):
+                    v = _px(base, 4, x - dx, y) if 0 <= x - dx < 32 else 0
+                    assert _px(buf, 4, x, y) == v, (dx, x, y)
+        for dy in (3, -5, 20):
+            buf = bytearray(base)
+            epd_bitmap.scroll_v(buf, 4, 12, dy)
+            for y in range(12):
+                row = base[(y - dy) * 4:(y - dy + 1) * 4] if 0 <= y - dy < 12 else b'\xff' * 4
+                assert buf[y * 4:y * 4 + 4] == row
+    epd_bitmap._blit, epd_bitmap._scroll_h, epd_bitmap._scroll_v = (
+        epd_bitmap._py_blit, epd_bitmap._py_scroll_h, epd_bitmap._py_scroll_v)
+    a = bytearray(base)
+    b = bytearray(base)
+    assert epd_bitmap.diff_rows(a, b, 4, 12) is None
+    assert epd_bitmap.xor_diff(a, b, 4, 12) is None
+    b[5 * 4 + 2] ^= 0x10
+    b[8 * 4 + 1] ^= 0x01
+    out = bytearray(48)
+    for xor_diff, diff_rows in ((epd_bitmap._py_xor_diff, epd_bitmap._py_diff_rows),
+                                (epd_viper.xor_diff, epd_viper.diff_rows)):
+        epd_bitmap._xor_diff, epd_bitmap._diff_rows = xor_diff, diff_rows
+        assert epd_bitmap.diff_rows(a, b, 4, 12) == (5, 9)
+        assert epd_bitmap.xor_diff(a, b, 4, 12, out) == (8, 5, 16, 4)
+        assert out == bytes(a[i] ^ b[i] for i in range(48))
+    epd_bitmap._xor_diff, epd_bitmap._diff_rows = epd_bitmap._py_xor_diff, epd_bitmap._py_diff_rows
+    epd_bitmap.invert(a, 4, 8)
+    assert a[4:8] == bytes(v ^ 0xFF for v in base[4:8]) and a[8:] == base[8:]
+
+def test_d67_ticker():
+    font = epd_text.Font(font6x8.font6x8)
+    e, panel = make(EPD_154_D67, emulator.SSD1681(), refresh=EPD_154_D67.UPDATE_PART)
+    blank = bytearray(b'\xff' * 5000)
+    e.set_frame_memory(blank, 0, 0, 200, 200)
+    e.display_frame()
+    ticker = EPD_154_D67.Ticker(e, 0, 184, 200, 8, step=3)
+    ticker.set_text(font, 'breaking news', gap=13)
+    length = ticker._length
+    tape = ticker._tape
+    ticker.start()
+    for n in range(1, 40):
+        panel.reset_stats()
+        ticker.step()
+        img = panel.image()
+        for y in range(8):
+            for x in range(200):
+                assert _px(img, 25, x, 184 + y) == _px(tape, length // 8, (x + 3 * n) % length, y)
+    assert panel.stats()['refreshes'] == {'part': 1}
+    assert panel.stats()['bytes'] < 2 * 25 * 8 + 100
+    assert img[:184 * 25] == blank[:184 * 25]
+    # sweep: only the strip at the cursor is sent
+    sweep = EPD_154_D67.Ticker(e, 16, 40, 64, 32, step=8, vertical=True, sweep=True)
+    sweep.set_text(font, 'one two three four five six seven', gap=8)
+    sweep.start()
+    rows = sweep._length
+    for n in range(1, 7):
+        panel.reset_stats()
+        sweep.step()
+        assert panel.stats()['bytes'] < 2 * 8 * 8 + 100
+    img = panel.image()
+    for y in range(32):
+        # rows above the cursor hold the third pass, the others the second
+        k = 64 + y if y < 16 else 32 + y
+        row = (40 + y) * 25 + 2
+        assert img[row:row + 8] == sweep._tape[(k % rows) * 8:(k % rows + 1) * 8]
+    # a step that does not divide the band stops the last strip at its edge
+    frame = bytearray(b'\xff' * 100 * 25 + b'\x00' * 100 * 25)
+    e.set_frame_memory(frame, 0, 0, 200, 200)
+    e.display_frame()
+    for vertical, size in ((True, 20), (False, 40)):
+        sweep = EPD_154_D67.Ticker(e, 0, 80, 40 if vertical else size, 20, step=16, vertical=vertical, sweep=True)
+        sweep.set_text(font, 'abc def ghi jkl', gap=5)
+        sweep.start()
+        band = [[_px(panel.image(), 25, x, 80 + y) for x in range(40)] for y in range(20)]
+        pos = size
+        for n in range(5):
+            c = sweep._cursor
+            m = min(16, size - c)
+            sweep.step()
+            for k in range(m):
+                for j in range(40 if vertical else 20):
+                    if vertical:
+                        band[c + k][j] = _px(sweep._tape, 5, j, (pos + k) % sweep._length)
+                    else:
+                        band[j][c + k] = _px(sweep._tape, sweep._length // 8, (pos + k) % sweep._length, j)
+            pos += m
+        img = panel.image()
+        assert [[_px(img, 25, x, 80 + y) for x in range(40)] for y in range(20)] == band
+        assert img[100 * 25:] == frame[100 * 25:]
+        assert all(img[y * 25 + 5:y * 25 + 25] == frame[y * 25 + 5:y * 25 + 25] for y in range(80, 100))
+
+def test_m09_full_frame():
+    e, panel = make(EPD_154_M09, emulator.UC8151())
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    assert panel.image() == bytes(buf)
+    assert panel.controller.writes_while_busy == 0
+
+def test_m09_partial_frame():
+    e, panel = make(EPD_154_M09, emulator.UC8151())
+    e.set_frame_memory(bytearray(b'\xff' * 5000), 0, 0, 200, 200)
+    e.set_update_mode(EPD_154_M09.UPDATE_PART)
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    assert panel.image() == bytes(buf)
+    assert panel.controller.writes_while_busy == 0
+
+def test_m09_partial_window():
+    e, panel = make(EPD_154_M09, emulator.UC8151())
+    buf = pattern()
+    e.set_frame_memory(buf, 0, 0, 200, 200)
+    e.set_update_mode(EPD_154_M09.UPDATE_PART)
+    e.set_frame_memory(bytearray(buf), 0, 0, 200, 200)
+    panel.reset_stats()
+    sub = bytes(range(48))
+    e.set_frame_memory(sub, 16, 184, 24, 16)
+    for r in range(16):
+        buf[(184 + r) * 25 + 2:(184 + r) * 25 + 5] = sub[r * 3:r * 3 + 3]
+    assert panel.image() == bytes(buf)
+    assert panel.stats()['bytes'] < 150
+    buf[199 * 25 + 24] = 0x00
+    e.write_area(buf, 192, 192, 8, 8)
+    assert panel.image() == bytes(buf)
+    assert panel.controller.writes_while_busy == 0
+
+def test_m09_rotation():
+    buf = pattern()
+    buf[3] = 0x35
+    for rotation in (90, 180):
+        for mirror in (False, True):
+            e, panel = make(EPD_154_M09, emulator.UC8151())
+            e.set_rotation(rotation, mirror)
+            e.set_frame_memory(buf, 0, 0, 200, 200)
+            assert panel.image() == rotated(buf, rotation, mirror), (rotation, mirror)
+
+def test_m09_stream():
+    e, panel = make(EPD_154_M09, emulator.UC8151())
+    e.set_frame_memory_stream(cat.stream, 0, 0, 200, 200)
+    assert panel.image() == cat.image()
+    try:
+        e.set_frame_memory_stream(iter([bytes(5000)]), 0, 0, 200, 200)
+    except ValueError:
+        pass
+    else:
+        assert False, 'one-shot stream accepted'
+
+def test_m09_stats():
+    e, panel = make(EPD_154_M09, emulator.UC8151(), refresh=EPD_154_M09.UPDATE_PART)
+    stats = epd_stats.instrument(e)
+    e.set_frame_memory(pattern(), 0, 0, 200, 200)
+    e.set_frame_memory(pattern(), 0, 0, 200, 200)
+    assert stats.full == 1 and stats.part >= 1
+    assert stats.part_since_full == e._part_update_counter
+    assert stats.bytes == panel.stats()['bytes']
+
+def test_m09_scheduler():
+    e, panel = make(EPD_154_M09, emulator.UC8151())
+    sched = epd_scheduler.Scheduler(e, budget=1.0)
+    buf = pattern()
+    assert sched.show(buf) == EPD_154_M09.UPDATE_FULL
+    buf[100] = 0
+    assert sched.show(buf) == EPD_154_M09.UPDATE_PART
+    assert panel.image() == bytes(buf)
+    for j in range(len(buf)):
+        buf[j] ^= 0xFF
+    assert sched.show(buf) == EPD_154_M09.UPDATE_FULL
+
+if __name__ == '__main__':
+    for name, fn in sorted(globals().items()):
+        if name.startswith('test_'):
+            fn()
+            print(name, 'ok')